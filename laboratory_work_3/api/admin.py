@@ -41,8 +41,18 @@ class GradeAdmin(admin.ModelAdmin):
     list_filter = ('subject', 'quarter', 'grade')
     search_fields = ('student__last_name', 'subject__subject_name')
 
+@admin.register(GradeSummary)
+class GradeSummaryAdmin(admin.ModelAdmin):
+    list_display = ('school_class', 'subject', 'quarter', 'grade_sum', 'grade_count')
+    list_filter = ('school_class', 'subject', 'quarter')
+
 @admin.register(Schedule)
 class ScheduleAdmin(admin.ModelAdmin):
     list_display = ('school_class', 'subject', 'teacher', 'classroom', 'day_of_week', 'lesson_number')
     list_filter = ('school_class', 'day_of_week', 'subject')
-    search_fields = ('school_class__class_name', 'subject__subject_name', 'teacher__last_name')
\ No newline at end of file
+    search_fields = ('school_class__class_name', 'subject__subject_name', 'teacher__last_name')
+
+@admin.register(BackgroundJob)
+class BackgroundJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'status', 'created_by', 'created_at', 'started_at', 'finished_at')
+    list_filter = ('kind', 'status')
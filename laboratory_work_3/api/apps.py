@@ -4,4 +4,7 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
-    verbose_name = 'API школьной системы'
\ No newline at end of file
+    verbose_name = 'API школьной системы'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,180 @@
+import csv
+
+from django.db import transaction
+from rest_framework import serializers
+
+from . import grade_summary, versions
+from .models import Grade, Subject
+
+BATCH_SIZE = 1000
+
+GRADE_FIELDS = ('student', 'subject', 'quarter', 'grade')
+# Те же правила и сообщения, что у GradeSerializer: true, 4.9 и т.п. не приводятся к числу
+GRADE_FIELD_VALIDATORS = {
+    'student': serializers.IntegerField(),
+    'subject': serializers.IntegerField(),
+    'quarter': serializers.IntegerField(min_value=1, max_value=4),
+    'grade': serializers.IntegerField(min_value=2, max_value=5),
+}
+
+
+class InvalidRow:
+    """Строка CSV, которую не удалось прочитать (не UTF-8 или ошибка синтаксиса CSV)"""
+
+    def __init__(self, message):
+        self.message = message
+
+
+def _parse_csv_line(line):
+    return next(csv.reader([line.decode('utf-8-sig')], strict=True), [])
+
+
+def iter_csv_rows(stream):
+    """Построчное чтение CSV из потока запроса без загрузки тела целиком.
+
+    Строки разбираются по отдельности (в полях оценок нет переводов строк), поэтому
+    ошибка кодировки или синтаксиса портит только свою строку: вместо нее выдается
+    InvalidRow, и строка попадает в отчет об ошибках. ValueError, если не читается заголовок.
+    """
+    lines = iter(stream.readline, b'')
+    for line in lines:
+        try:
+            header = _parse_csv_line(line)
+        except (UnicodeDecodeError, csv.Error) as exc:
+            raise ValueError(f"Не удалось прочитать заголовок CSV: {exc}") from exc
+        if header:
+            return _iter_csv_values(header, lines)
+    return iter(())
+
+
+def _iter_csv_values(header, lines):
+    for line in lines:
+        try:
+            values = _parse_csv_line(line)
+        except UnicodeDecodeError:
+            yield InvalidRow("Строка не в кодировке UTF-8.")
+            continue
+        except csv.Error as exc:
+            yield InvalidRow(f"Ошибка формата CSV: {exc}")
+            continue
+        # Пустые строки пропускаются, как в csv.DictReader
+        if values:
+            yield dict(zip(header, values))
+
+
+def _parse_row(row):
+    """Проверка одной строки; возвращает (значения, ошибки)"""
+    if isinstance(row, InvalidRow):
+        return None, {'non_field_errors': [row.message]}
+    if not isinstance(row, dict):
+        return None, {'non_field_errors': ["Ожидается объект с полями student, subject, quarter, grade"]}
+
+    values = {}
+    errors = {}
+    for field in GRADE_FIELDS:
+        raw = row.get(field)
+        if raw in (None, ''):
+            errors[field] = ["Обязательное поле."]
+            continue
+        try:
+            values[field] = GRADE_FIELD_VALIDATORS[field].run_validation(raw)
+        except serializers.ValidationError as exc:
+            errors[field] = [str(detail) for detail in exc.detail]
+
+    return (None, errors) if errors else (values, None)
+
+
+def _upsert_batch(batch, result):
+    """Проверяет и сохраняет одну пачку строк [(номер строки, данные), ...]"""
+    parsed = []
+    for row_number, row in batch:
+        values, errors = _parse_row(row)
+        if errors:
+            result['errors'].append({'row': row_number, 'errors': errors})
+        else:
+            parsed.append((row_number, values))
+
+    if not parsed:
+        return
+
+    # Ученики и предметы пачки проверяются двумя запросами
+    student_classes = grade_summary.student_class_ids(values['student'] for _, values in parsed)
+    subject_ids = set(Subject.objects.filter(
+        id__in={values['subject'] for _, values in parsed}
+    ).values_list('id', flat=True))
+
+    rows = {}
+    for row_number, values in parsed:
+        errors = {}
+        if values['student'] not in student_classes:
+            errors['student'] = [f"Ученик с id={values['student']} не найден."]
+        if values['subject'] not in subject_ids:
+            errors['subject'] = [f"Предмет с id={values['subject']} не найден."]
+        if errors:
+            result['errors'].append({'row': row_number, 'errors': errors})
+            continue
+        # Повтор ключа в пачке: побеждает последняя строка
+        rows[(values['student'], values['subject'], values['quarter'])] = values['grade']
+
+    if not rows:
+        return
+
+    with transaction.atomic():
+        existing = {}
+        for student_id, subject_id, quarter, grade in Grade.objects.filter(
+            student_id__in={key[0] for key in rows},
+            subject_id__in={key[1] for key in rows},
+            quarter__in={key[2] for key in rows}
+        ).values_list('student_id', 'subject_id', 'quarter', 'grade'):
+            if (student_id, subject_id, quarter) in rows:
+                existing[(student_id, subject_id, quarter)] = grade
+
+        Grade.objects.bulk_create(
+            [
+                Grade(student_id=student_id, subject_id=subject_id, quarter=quarter, grade=grade)
+                for (student_id, subject_id, quarter), grade in rows.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['student', 'subject', 'quarter'],
+            update_fields=['grade', 'date_modified']
+        )
+
+        # bulk_create не отправляет сигналы - сводку оценок обновляем сами
+        deltas = {}
+        for (student_id, subject_id, quarter), grade in rows.items():
+            school_class_id = student_classes[student_id]
+            if (student_id, subject_id, quarter) in existing:
+                grade_summary.add_grade(deltas, school_class_id, subject_id, quarter,
+                                        existing[(student_id, subject_id, quarter)], sign=-1)
+            grade_summary.add_grade(deltas, school_class_id, subject_id, quarter, grade)
+        grade_summary.apply_deltas(deltas)
+
+    result['updated'] += len(existing)
+    result['created'] += len(rows) - len(existing)
+
+
+def upsert_grades(rows, batch_size=BATCH_SIZE):
+    """Массовая загрузка оценок с обновлением по (student, subject, quarter).
+
+    Строки обрабатываются пачками, каждая пачка - в своей транзакции; ошибочные
+    строки попадают в отчет и не мешают сохранению остальных.
+    """
+    result = {'created': 0, 'updated': 0, 'errors': []}
+    batch = []
+
+    for row_number, row in enumerate(rows, start=1):
+        batch.append((row_number, row))
+        if len(batch) >= batch_size:
+            _upsert_batch(batch, result)
+            batch = []
+
+    if batch:
+        _upsert_batch(batch, result)
+
+    if result['created'] or result['updated']:
+        # bulk_create не отправляет сигналы - версию таблицы оценок увеличиваем сами
+        versions.bump(versions.label_for(Grade))
+
+    result['errors'].sort(key=lambda error: error['row'])
+    result['failed'] = len(result['errors'])
+    return result
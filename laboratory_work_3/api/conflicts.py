@@ -0,0 +1,136 @@
+from collections import defaultdict
+
+from rest_framework import serializers
+
+from .models import Schedule
+
+# Ресурсы, которые не могут быть заняты дважды в один и тот же (день, урок)
+RESOURCES = {
+    'school_class': 'Класс',
+    'teacher': 'Учитель',
+    'classroom': 'Кабинет',
+}
+ENTRY_FIELDS = ('id', 'school_class', 'teacher', 'classroom', 'day_of_week', 'lesson_number')
+# Проверка значений пакета изменений: true, 2.7 и т.п. не приводятся к числу
+ENTRY_FIELD_VALIDATORS = {
+    'id': serializers.IntegerField(),
+    'school_class': serializers.IntegerField(),
+    'teacher': serializers.IntegerField(),
+    'classroom': serializers.IntegerField(),
+    'day_of_week': serializers.IntegerField(min_value=1, max_value=len(Schedule.DAYS_OF_WEEK)),
+    'lesson_number': serializers.IntegerField(min_value=1, max_value=8),
+}
+
+
+def load_entries(queryset=None):
+    """Уроки расписания в виде словарей с полями ENTRY_FIELDS (один запрос)"""
+    queryset = Schedule.objects.all() if queryset is None else queryset
+    return [
+        {
+            'id': row['id'],
+            'school_class': row['school_class_id'],
+            'teacher': row['teacher_id'],
+            'classroom': row['classroom_id'],
+            'day_of_week': row['day_of_week'],
+            'lesson_number': row['lesson_number'],
+        }
+        for row in queryset.order_by().values(
+            'id', 'school_class_id', 'teacher_id', 'classroom_id', 'day_of_week', 'lesson_number'
+        )
+    ]
+
+
+def find_conflicts(entries, only_ids=None):
+    """Конфликты расписания за один проход по хэш-таблицам слотов.
+
+    Возвращает список {'type', 'resource_id', 'day_of_week', 'lesson_number', 'schedule_ids'}.
+    Если задан only_ids, возвращаются только конфликты с участием этих уроков.
+    """
+    slots = defaultdict(list)
+    for entry in entries:
+        for resource in RESOURCES:
+            slots[(resource, entry[resource], entry['day_of_week'], entry['lesson_number'])].append(entry['id'])
+
+    conflicts = []
+    for (resource, resource_id, day_of_week, lesson_number), ids in slots.items():
+        if resource_id is None or len(ids) < 2:
+            continue
+        if only_ids is not None and not only_ids.intersection(ids):
+            continue
+        conflicts.append({
+            'type': resource,
+            'resource_id': resource_id,
+            'day_of_week': day_of_week,
+            'lesson_number': lesson_number,
+            'schedule_ids': ids,
+        })
+
+    conflicts.sort(key=lambda conflict: (conflict['day_of_week'], conflict['lesson_number'], conflict['type']))
+    return conflicts
+
+
+def parse_changes(changes, existing_ids):
+    """Проверка пакета изменений; возвращает (уроки, ошибки [{'row', 'errors'}]).
+
+    Значения приводятся к int по правилам IntegerField: иначе "1" и 1 считались бы
+    разными ресурсами и конфликт не находился бы. Для нового урока обязательны все
+    поля, кроме id; урок с существующим id может содержать только изменяемые поля.
+    """
+    parsed = []
+    errors = []
+    for number, change in enumerate(changes, start=1):
+        if not isinstance(change, dict):
+            errors.append({'row': number, 'errors': {'non_field_errors': ["Ожидается объект урока."]}})
+            continue
+
+        values = {}
+        change_errors = {}
+        for field in ENTRY_FIELDS:
+            raw = change.get(field)
+            if raw in (None, ''):
+                continue
+            try:
+                values[field] = ENTRY_FIELD_VALIDATORS[field].run_validation(raw)
+            except serializers.ValidationError as exc:
+                change_errors[field] = [str(detail) for detail in exc.detail]
+
+        if 'id' not in change_errors and values.get('id') not in existing_ids:
+            for field in ENTRY_FIELDS[1:]:
+                if field not in values and field not in change_errors:
+                    change_errors[field] = ["Обязательное поле."]
+
+        if change_errors:
+            errors.append({'row': number, 'errors': change_errors})
+        else:
+            parsed.append(values)
+
+    return parsed, errors
+
+
+def check_changes(changes, entries=None):
+    """Конфликты, которые появятся после применения пакета изменений.
+
+    changes - список уроков; урок с существующим id заменяет текущий, без id - добавляется
+    (такие уроки получают идентификаторы вида 'new-1', 'new-2', ...).
+    """
+    entries = {entry['id']: entry for entry in (load_entries() if entries is None else entries)}
+    proposed_ids = set()
+
+    for number, change in enumerate(changes, start=1):
+        entry_id = change.get('id')
+        if entry_id in entries:
+            entries[entry_id] = {**entries[entry_id], **change}
+        else:
+            entry_id = f"new-{number}"
+            entries[entry_id] = {**change, 'id': entry_id}
+        proposed_ids.add(entry_id)
+
+    return find_conflicts(entries.values(), only_ids=proposed_ids)
+
+
+def describe(conflict):
+    """Человекочитаемое описание конфликта"""
+    return (
+        f"{RESOURCES[conflict['type']]} id={conflict['resource_id']} занят несколькими уроками "
+        f"(день {conflict['day_of_week']}, урок {conflict['lesson_number']})"
+    )
@@ -0,0 +1,116 @@
+"""Быстрое чтение списков: строки values() вместо объектов моделей и сериализаторов.
+
+Схема вывода задается во viewset словарем fast_list_fields: ключ ответа -> путь
+для values() или кортеж (функция, путь, ...). Значения форматируются теми же
+полями DRF, что и в сериализаторах, поэтому ответ совпадает побайтно.
+"""
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+
+_datetime_field = serializers.DateTimeField()
+_date_field = serializers.DateField()
+
+
+def datetime_value(value):
+    """Дата и время как в DateTimeField: локальный часовой пояс, 'Z' для UTC"""
+    return _datetime_field.to_representation(value) if value is not None else None
+
+
+def _bind_datetime_value():
+    # Часовой пояс определяется один раз на запрос, а не для каждого значения;
+    # для ISO 8601 повторяем DateTimeField.to_representation без лишних вызовов
+    field_timezone = _datetime_field.default_timezone()
+    if field_timezone is None or str(api_settings.DATETIME_FORMAT).lower() != ISO_8601:
+        return datetime_value
+
+    def format_value(value):
+        if value is None or value.tzinfo is None:
+            return datetime_value(value)
+        value = value.astimezone(field_timezone).isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+
+    return format_value
+
+
+datetime_value.bind = _bind_datetime_value
+
+
+def date_value(value):
+    return _date_field.to_representation(value) if value is not None else None
+
+
+def choice_display(choices):
+    """Функция, возвращающая подпись значения из choices (как get_FOO_display)"""
+    labels = dict(choices)
+    return lambda value: labels.get(value, value)
+
+
+def person_name(last_name, first_name):
+    """Как Teacher.__str__"""
+    return f"{last_name} {first_name}"
+
+
+def student_name(last_name, first_name, class_name):
+    """Как Student.__str__"""
+    return f"{last_name} {first_name} ({class_name})"
+
+
+class FastRows:
+    """Преобразование строк values() в словари ответа.
+
+    Функции с атрибутом bind (например, datetime_value) подготавливаются один раз
+    при создании - под текущие настройки запроса.
+    """
+
+    def __init__(self, spec, keys):
+        self.keys = list(keys)
+        self.paths = []
+        self.builders = []
+        for key in self.keys:
+            source = spec[key]
+            if isinstance(source, str):
+                source = (None, source)
+            func, *paths = source
+            if hasattr(func, 'bind'):
+                func = func.bind()
+            self.builders.append((key, func, paths))
+            for path in paths:
+                if path not in self.paths:
+                    self.paths.append(path)
+
+    def build(self, row):
+        result = {}
+        for key, func, paths in self.builders:
+            if func is None:
+                result[key] = row[paths[0]]
+            else:
+                result[key] = func(*(row[path] for path in paths))
+        return result
+
+
+class CountedRows:
+    """Строки values() для пагинатора, количество которых считается по базовому queryset.
+
+    У values() с путями через связи COUNT(*) выполняется со всеми соединениями;
+    количество строк от них не зависит, поэтому считаем по отфильтрованной таблице.
+    Остальное (срезы, сортировка для курсорной пагинации) - как у строк values().
+    """
+
+    def __init__(self, rows, base):
+        self.rows = rows
+        self.base = base
+
+    def count(self):
+        return self.base.count()
+
+    def __getattr__(self, name):
+        return getattr(self.rows, name)
+
+    def __getitem__(self, key):
+        return self.rows[key]
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
@@ -1,5 +1,15 @@
 import django_filters
 from .models import *
+from . import search
+
+
+class PersonSearchFilter(django_filters.CharFilter):
+    """?search= - поиск по началу фамилии и имени через поисковый индекс (см. api/search.py)"""
+
+    def filter(self, qs, value):
+        if not value:
+            return qs
+        return search.filter_queryset(qs, value)
 
 
 class ClassroomFilter(django_filters.FilterSet):
@@ -20,6 +30,7 @@ class SchoolClassFilter(django_filters.FilterSet):
 
 
 class TeacherFilter(django_filters.FilterSet):
+    search = PersonSearchFilter()
     last_name = django_filters.CharFilter(lookup_expr='icontains')
     first_name = django_filters.CharFilter(lookup_expr='icontains')
     gender = django_filters.ChoiceFilter(choices=Teacher.GENDER_CHOICES)
@@ -50,6 +61,7 @@ class TeachingPeriodFilter(django_filters.FilterSet):
 
 
 class StudentFilter(django_filters.FilterSet):
+    search = PersonSearchFilter()
     last_name = django_filters.CharFilter(lookup_expr='icontains')
     first_name = django_filters.CharFilter(lookup_expr='icontains')
     gender = django_filters.ChoiceFilter(choices=Student.GENDER_CHOICES)
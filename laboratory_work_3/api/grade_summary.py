@@ -0,0 +1,158 @@
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+
+from . import versions
+from .models import Grade, GradeSummary, Student
+
+
+def student_class_ids(student_ids):
+    """Текущие классы учеников: {id ученика: id класса}"""
+    return dict(Student.objects.filter(id__in=set(student_ids)).values_list('id', 'school_class_id'))
+
+
+def _bump_versions(class_ids):
+    """Версии сводки целиком и затронутых классов (после фиксации транзакции).
+
+    Обновления через F() не отправляют сигналы, поэтому версии увеличиваются здесь.
+    """
+    labels = [versions.label_for(GradeSummary)]
+    labels += [versions.class_label(GradeSummary, school_class_id) for school_class_id in class_ids]
+    transaction.on_commit(lambda: versions.bump(*labels))
+
+
+def apply_deltas(deltas):
+    """Применяет изменения к сводке.
+
+    deltas - словарь {(id класса, id предмета, четверть): (изменение суммы, изменение количества)}.
+    """
+    deltas = {key: value for key, value in deltas.items() if value != (0, 0)}
+    if not deltas:
+        return
+
+    with transaction.atomic():
+        for (school_class_id, subject_id, quarter), (sum_delta, count_delta) in deltas.items():
+            rows = GradeSummary.objects.filter(
+                school_class_id=school_class_id,
+                subject_id=subject_id,
+                quarter=quarter
+            )
+            updated = rows.update(
+                grade_sum=F('grade_sum') + sum_delta,
+                grade_count=F('grade_count') + count_delta
+            )
+            # Строку создаем только при добавлении оценок: при каскадном удалении
+            # класса или предмета сводка уже удалена и восстанавливать ее не нужно
+            if not updated and count_delta > 0:
+                try:
+                    with transaction.atomic():
+                        GradeSummary.objects.create(
+                            school_class_id=school_class_id,
+                            subject_id=subject_id,
+                            quarter=quarter,
+                            grade_sum=sum_delta,
+                            grade_count=count_delta
+                        )
+                except IntegrityError:
+                    # Строку успел создать параллельный запрос
+                    rows.update(
+                        grade_sum=F('grade_sum') + sum_delta,
+                        grade_count=F('grade_count') + count_delta
+                    )
+
+        GradeSummary.objects.filter(
+            school_class_id__in={key[0] for key in deltas},
+            grade_count__lte=0
+        ).delete()
+
+        _bump_versions({key[0] for key in deltas})
+
+
+def add_grade(deltas, school_class_id, subject_id, quarter, grade, sign=1):
+    """Добавляет (sign=1) или вычитает (sign=-1) одну оценку в накапливаемые изменения"""
+    if school_class_id is None:
+        return
+    key = (school_class_id, subject_id, quarter)
+    grade_sum, grade_count = deltas.get(key, (0, 0))
+    deltas[key] = (grade_sum + sign * grade, grade_count + sign)
+
+
+def expected_rows(class_ids=None):
+    """Сводка, посчитанная заново по таблице оценок"""
+    grades = Grade.objects.all()
+    if class_ids is not None:
+        grades = grades.filter(student__school_class_id__in=class_ids)
+
+    rows = grades.values('student__school_class_id', 'subject_id', 'quarter').annotate(
+        grade_sum=Sum('grade'),
+        grade_count=Count('id')
+    )
+    return {
+        (row['student__school_class_id'], row['subject_id'], row['quarter']): (row['grade_sum'], row['grade_count'])
+        for row in rows
+    }
+
+
+def find_drift(class_ids=None):
+    """Расхождения между сводкой и таблицей оценок: {ключ: (в сводке, ожидается)}"""
+    stored_rows = GradeSummary.objects.all()
+    if class_ids is not None:
+        stored_rows = stored_rows.filter(school_class_id__in=class_ids)
+
+    stored = {
+        (row.school_class_id, row.subject_id, row.quarter): (row.grade_sum, row.grade_count)
+        for row in stored_rows
+    }
+    expected = expected_rows(class_ids)
+
+    drift = {}
+    for key in stored.keys() | expected.keys():
+        if stored.get(key) != expected.get(key):
+            drift[key] = (stored.get(key), expected.get(key))
+    return drift
+
+
+def rebuild(class_ids=None):
+    """Полностью пересчитывает сводку (для всех классов или для заданных)"""
+    expected = expected_rows(class_ids)
+
+    with transaction.atomic():
+        stored_rows = GradeSummary.objects.all()
+        if class_ids is not None:
+            stored_rows = stored_rows.filter(school_class_id__in=class_ids)
+        stored_rows.delete()
+
+        GradeSummary.objects.bulk_create([
+            GradeSummary(
+                school_class_id=school_class_id,
+                subject_id=subject_id,
+                quarter=quarter,
+                grade_sum=grade_sum,
+                grade_count=grade_count
+            )
+            for (school_class_id, subject_id, quarter), (grade_sum, grade_count) in expected.items()
+        ], batch_size=1000)
+
+        _bump_versions(['*'] if class_ids is None else class_ids)
+
+    return len(expected)
+
+
+def move_student_grades(student_id, old_class_id, new_class_id):
+    """Переносит оценки ученика из сводки старого класса в сводку нового"""
+    rows = Grade.objects.filter(student_id=student_id).values('subject_id', 'quarter').annotate(
+        grade_sum=Sum('grade'),
+        grade_count=Count('id')
+    )
+
+    deltas = defaultdict(lambda: (0, 0))
+    for row in rows:
+        for school_class_id, sign in ((old_class_id, -1), (new_class_id, 1)):
+            if school_class_id is None:
+                continue
+            key = (school_class_id, row['subject_id'], row['quarter'])
+            grade_sum, grade_count = deltas[key]
+            deltas[key] = (grade_sum + sign * row['grade_sum'], grade_count + sign * row['grade_count'])
+
+    apply_deltas(dict(deltas))
@@ -0,0 +1,111 @@
+"""Замеры запроса: число и время SQL, сериализация, рендеринг, генерация PDF.
+
+RequestTimingMiddleware создает RequestTimings на время запроса и подключает его
+к соединениям через connection.execute_wrapper (track_queries). Код, который
+выполняет запросы в других потоках, вызывает track_queries() сам. Этапы
+отмечаются через stage('serialize') и т.п.; вне запроса stage() ничего не замеряет.
+"""
+import contextvars
+import heapq
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+
+_current = contextvars.ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    def __init__(self, top_sql=5):
+        self.started = time.perf_counter()
+        self.finished = None
+        self.sql_count = 0
+        self.sql_ms = 0.0
+        self.stages = {}
+        self._active_stages = set()
+        self._top_sql = top_sql
+        self._lock = threading.Lock()
+        # Куча (мс, номер, sql) самых медленных запросов
+        self._slowest = []
+
+    def __call__(self, execute, sql, params, many, context):
+        """Обертка для connection.execute_wrapper"""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = (time.perf_counter() - started) * 1000
+            # Запросы одного HTTP-запроса могут идти из нескольких потоков (асинхронные отчеты)
+            with self._lock:
+                self.sql_count += 1
+                self.sql_ms += duration
+                if self._top_sql:
+                    item = (duration, self.sql_count, sql)
+                    if len(self._slowest) < self._top_sql:
+                        heapq.heappush(self._slowest, item)
+                    elif duration > self._slowest[0][0]:
+                        heapq.heapreplace(self._slowest, item)
+
+    def finish(self):
+        self.finished = time.perf_counter()
+
+    @property
+    def total_ms(self):
+        return ((self.finished or time.perf_counter()) - self.started) * 1000
+
+    def slowest_sql(self):
+        return [
+            {'ms': round(duration, 3), 'sql': sql}
+            for duration, _, sql in sorted(self._slowest, reverse=True)
+        ]
+
+    def server_timing(self):
+        """Значение заголовка Server-Timing"""
+        metrics = [f'db;dur={self.sql_ms:.1f};desc="{self.sql_count} queries"']
+        metrics += [f"{name};dur={duration:.1f}" for name, duration in self.stages.items()]
+        metrics.append(f"total;dur={self.total_ms:.1f}")
+        return ', '.join(metrics)
+
+
+def activate(timings):
+    return _current.set(timings)
+
+
+def deactivate(token):
+    _current.reset(token)
+
+
+def get_current():
+    return _current.get()
+
+
+@contextmanager
+def track_queries():
+    """Замер SQL текущего запроса на соединениях текущего потока"""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(timings))
+        yield
+
+
+@contextmanager
+def stage(name):
+    """Замер этапа текущего запроса; вложенные замеры одного этапа не суммируются"""
+    timings = _current.get()
+    if timings is None or name in timings._active_stages:
+        yield
+        return
+
+    timings._active_stages.add(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings._active_stages.discard(name)
+        timings.stages[name] = timings.stages.get(name, 0.0) + (time.perf_counter() - started) * 1000
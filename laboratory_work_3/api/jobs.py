@@ -0,0 +1,101 @@
+import logging
+import threading
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Пул потоков процесса; его размер ограничивает число одновременных генераций"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.BACKGROUND_JOBS_MAX_WORKERS,
+                thread_name_prefix='background-job'
+            )
+        return _executor
+
+
+def _run(job_id, func):
+    try:
+        # Задача, которую уже пометили ошибкой (expire_stale_jobs), не запускается
+        started = BackgroundJob.objects.filter(pk=job_id, status='pending').update(
+            status='running',
+            started_at=timezone.now()
+        )
+        if not started:
+            return
+        job = BackgroundJob.objects.get(pk=job_id)
+        try:
+            func(job)
+        except Exception as exc:
+            logger.exception("Фоновая задача %s завершилась с ошибкой", job_id)
+            job.status = 'failed'
+            job.error = str(exc)
+        else:
+            job.status = 'done'
+        # Только из running: задача, которую за это время признали зависшей, так и остается ошибкой
+        BackgroundJob.objects.filter(pk=job_id, status='running').update(
+            status=job.status,
+            result=job.result,
+            error=job.error,
+            file_name=job.file_name,
+            finished_at=timezone.now()
+        )
+    finally:
+        # Потоки пула не проходят через обработчик запросов - закрываем соединения сами
+        connections.close_all()
+
+
+def expire_stale_jobs():
+    """Помечает ошибкой зависшие задачи: выполняются дольше BACKGROUND_JOBS_TIMEOUT
+    или ждут в очереди дольше BACKGROUND_JOBS_QUEUE_TIMEOUT.
+
+    Очередь живет в памяти процесса: если процесс перезапущен или упал, его задачи
+    остаются в статусе pending/running навсегда, и повторные запросы получали бы
+    задачу, которая уже никогда не выполнится. Время выполнения считается от
+    started_at, поэтому задача, которая просто долго ждет в очереди живого процесса,
+    не считается зависшей, пока не истечет срок ожидания.
+    """
+    now = timezone.now()
+    timeout = settings.BACKGROUND_JOBS_TIMEOUT
+    queue_timeout = settings.BACKGROUND_JOBS_QUEUE_TIMEOUT
+    running_cutoff = now - timedelta(seconds=timeout)
+    stale_running = BackgroundJob.objects.filter(
+        # started_at нет у задач, запущенных до появления поля
+        Q(started_at__lt=running_cutoff) | Q(started_at__isnull=True, created_at__lt=running_cutoff),
+        status='running'
+    ).update(
+        status='failed',
+        error=f"Задача не завершилась за {timeout} с (процесс сервера был остановлен?)",
+        finished_at=now
+    )
+    stale_pending = BackgroundJob.objects.filter(
+        status='pending',
+        created_at__lt=now - timedelta(seconds=queue_timeout)
+    ).update(
+        status='failed',
+        error=f"Задача не запустилась за {queue_timeout} с (процесс сервера был остановлен?)",
+        finished_at=now
+    )
+    return stale_running + stale_pending
+
+
+def submit(job, func):
+    """Ставит задачу в очередь после фиксации транзакции, в которой она создана.
+
+    func(job) выполняется в потоке пула и может заполнить job.file_name и job.result.
+    """
+    transaction.on_commit(lambda: get_executor().submit(_run, job.pk, func))
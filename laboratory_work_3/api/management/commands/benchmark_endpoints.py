@@ -0,0 +1,223 @@
+import json
+import statistics
+import tempfile
+import time
+from urllib.parse import quote
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries
+from django.test.utils import CaptureQueriesContext, override_settings, setup_test_environment, teardown_test_environment
+from rest_framework.test import APIClient
+
+from api.models import Classroom, SchoolClass, Student, Subject, Teacher
+from api.synthetic import clear_school, seed_school
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def build_endpoints(ids):
+    """Все точки входа API: списки и объекты роутера, действия viewset и типы отчетов"""
+    return [
+        ('classrooms.list', '/api/classrooms/'),
+        ('classrooms.retrieve', f"/api/classrooms/{ids['classroom']}/"),
+        ('school_classes.list', '/api/school-classes/'),
+        ('school_classes.retrieve', f"/api/school-classes/{ids['school_class']}/"),
+        ('school_classes.ranking', f"/api/school-classes/{ids['school_class']}/ranking/?quarter=2"),
+        ('teachers.list', '/api/teachers/'),
+        ('teachers.retrieve', f"/api/teachers/{ids['teacher']}/"),
+        ('teachers.same_subject_teachers', f"/api/teachers/{ids['teacher']}/same_subject_teachers/"),
+        ('teachers.subject_overlap', f"/api/teachers/{ids['teacher']}/subject_overlap/"),
+        ('teachers.substitutes', f"/api/teachers/substitutes/?subject_id={ids['subject']}&class_id={ids['school_class']}"),
+        ('subjects.list', '/api/subjects/'),
+        ('subjects.teachers_count', '/api/subjects/teachers_count/'),
+        ('teaching_periods.list', '/api/teaching-periods/'),
+        ('students.list', '/api/students/'),
+        ('students.list_filtered', f"/api/students/?school_class={ids['school_class']}"),
+        ('students.retrieve', f"/api/students/{ids['student']}/"),
+        ('students.at_risk', '/api/students/at_risk/?pagination=cursor'),
+        ('students.search', f"/api/students/?search={quote('петр')}"),
+        ('grades.list', '/api/grades/'),
+        ('grades.list_filtered', f"/api/grades/?student={ids['student']}"),
+        ('schedules.list', '/api/schedules/'),
+        ('schedules.get_lesson', f"/api/schedules/get_lesson/?class_id={ids['school_class']}&day_of_week=2&lesson_number=3"),
+        ('schedules.teacher_current_lesson',
+         f"/api/schedules/teacher_current_lesson/?teacher_id={ids['teacher']}&day_of_week=2&lesson_number=3"),
+        ('schedules.classroom_current_lesson',
+         f"/api/schedules/classroom_current_lesson/?classroom_id={ids['classroom']}&day_of_week=2&lesson_number=3"),
+        ('schedules.conflicts', '/api/schedules/conflicts/'),
+        ('schedules.feed_grid', f"/api/schedules/feed/class/{ids['school_class']}/"),
+        ('schedules.feed_ics', f"/api/schedules/feed/teacher/{ids['teacher']}.ics"),
+        ('reports.class_performance', f"/api/reports/?type=class_performance&class_id={ids['school_class']}"),
+        ('reports.class_performance_all', '/api/reports/?type=class_performance&class_id=all'),
+        ('reports.class_performance_pdf', f"/api/reports/?type=class_performance&class_id={ids['school_class']}&format=pdf"),
+        ('reports.gender_statistics', '/api/reports/?type=gender_statistics'),
+        ('reports.classroom_statistics', '/api/reports/?type=classroom_statistics'),
+        ('reports.grade_analytics', '/api/reports/analytics/'),
+        ('search.typeahead', f"/api/search/?q={quote('иван ал')}"),
+        # Асинхронные отчеты выполняют SQL в других потоках - в счетчик запросов они не попадают
+        ('reports_async.class_performance_all', '/api/reports/async/?type=class_performance&class_id=all'),
+        ('reports_async.gender_statistics', '/api/reports/async/?type=gender_statistics'),
+    ]
+
+
+def percentile(timings, value):
+    if len(timings) < 2:
+        return timings[0]
+    return statistics.quantiles(timings, n=100, method='inclusive')[value - 1]
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет задержку (перцентили) и число SQL-запросов всех точек входа API на синтетической "
+        "школе нескольких размеров; результаты сохраняются в JSON и сравниваются с прошлым замером"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            default='5,20,60',
+            help="Размеры школы - количество классов через запятую (по умолчанию 5,20,60)"
+        )
+        parser.add_argument('--students-per-class', type=int, default=25, help="Учеников в классе (по умолчанию 25)")
+        parser.add_argument('--repeat', type=int, default=20, help="Повторов каждого запроса (по умолчанию 20)")
+        parser.add_argument('--seed', type=int, default=0, help="Зерно генератора данных")
+        parser.add_argument('--only', action='append', help="Замерять только точки входа с этим префиксом имени")
+        parser.add_argument('--output', help="Сохранить результаты в JSON-файл (базовый замер)")
+        parser.add_argument('--compare', help="Сравнить с базовым замером из JSON-файла")
+        parser.add_argument(
+            '--max-slowdown',
+            type=float,
+            default=1.5,
+            help="Допустимый рост p50 относительно базового замера (по умолчанию 1.5 раза)"
+        )
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',')]
+        except ValueError:
+            raise CommandError("--sizes - числа через запятую, например 5,20,60")
+        if not sizes or min(sizes) < 1:
+            raise CommandError("Размеры школы должны быть не меньше 1")
+
+        baseline = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as file:
+                baseline = json.load(file)
+
+        results = {
+            'students_per_class': options['students_per_class'],
+            'repeat': options['repeat'],
+            'seed': options['seed'],
+            'sizes': {},
+        }
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        # Кэш ответов выключен: замеряется построение ответа; PDF пишутся во временный каталог
+        try:
+            with tempfile.TemporaryDirectory() as artifacts_dir, \
+                    override_settings(RESPONSE_CACHE_ENABLED=False, REPORT_ARTIFACTS_DIR=artifacts_dir):
+                client = APIClient()
+                client.force_authenticate(User.objects.create_superuser('benchmark', password=None))
+                for size in sizes:
+                    clear_school()
+                    counts = seed_school(
+                        classes=size,
+                        students_per_class=options['students_per_class'],
+                        seed=options['seed']
+                    )
+                    self.stdout.write(self.style.SUCCESS(
+                        f"\nКлассов: {size}, учеников: {counts['students']}, оценок: {counts['grades']}"
+                    ))
+                    results['sizes'][str(size)] = {
+                        'counts': counts,
+                        'endpoints': self.run_size(client, options),
+                    }
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, ensure_ascii=False, indent=2, sort_keys=True)
+            self.stdout.write(f"\nРезультаты сохранены в {options['output']}")
+
+        if baseline is not None:
+            regressions = self.compare(baseline, results, options['max_slowdown'])
+            if regressions:
+                raise CommandError(f"Регрессии относительно {options['compare']}: {regressions}")
+
+    def run_size(self, client, options):
+        ids = {
+            'school_class': SchoolClass.objects.order_by('id').values_list('id', flat=True).first(),
+            'student': Student.objects.order_by('id').values_list('id', flat=True).first(),
+            'teacher': Teacher.objects.filter(classroom__isnull=False).order_by('id').values_list('id', flat=True).first(),
+            'classroom': Classroom.objects.order_by('id').values_list('id', flat=True).first(),
+            'subject': Subject.objects.order_by('id').values_list('id', flat=True).first(),
+        }
+        measured = {}
+        for name, url in build_endpoints(ids):
+            if options['only'] and not any(name.startswith(prefix) for prefix in options['only']):
+                continue
+            measured[name] = result = self.measure(client, url, options['repeat'])
+            self.stdout.write(
+                f"  {name}: p50 {result['p50_ms']} мс, p95 {result['p95_ms']} мс, "
+                f"запросов {result['queries']}, код {result['status']}"
+            )
+        return measured
+
+    def measure(self, client, url, repeat):
+        # Клиент очищает журнал запросов в начале каждого запроса - считаем сразу
+        reset_queries()
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        queries_count = len(queries)
+        if response.status_code >= 500:
+            raise CommandError(f"{url}: код ответа {response.status_code}")
+        size = len(b''.join(response.streaming_content) if response.streaming else response.content)
+
+        timings = []
+        for _ in range(max(repeat, 1)):
+            started = time.perf_counter()
+            response = client.get(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            timings.append((time.perf_counter() - started) * 1000)
+
+        result = {
+            'url': url,
+            'status': response.status_code,
+            'size': size,
+            'queries': queries_count,
+            'max_ms': round(max(timings), 3),
+        }
+        for value in PERCENTILES:
+            result[f'p{value}_ms'] = round(percentile(timings, value), 3)
+        return result
+
+    def compare(self, baseline, results, max_slowdown):
+        """Печатает изменения относительно базового замера и возвращает число регрессий"""
+        self.stdout.write(self.style.SUCCESS("\nСравнение с базовым замером:"))
+        regressions = 0
+        for size, current in results['sizes'].items():
+            previous = baseline.get('sizes', {}).get(size)
+            if previous is None:
+                self.stdout.write(f"  классов {size}: нет в базовом замере")
+                continue
+            for name, new in current['endpoints'].items():
+                old = previous['endpoints'].get(name)
+                if old is None:
+                    continue
+                slowdown = new['p50_ms'] / old['p50_ms'] if old['p50_ms'] else 1
+                more_queries = new['queries'] > old['queries']
+                if slowdown <= max_slowdown and not more_queries:
+                    continue
+                regressions += 1
+                self.stdout.write(self.style.ERROR(
+                    f"  классов {size}, {name}: p50 {old['p50_ms']} -> {new['p50_ms']} мс (x{slowdown:.2f}), "
+                    f"запросов {old['queries']} -> {new['queries']}"
+                ))
+        if not regressions:
+            self.stdout.write("  регрессий нет")
+        return regressions
@@ -0,0 +1,179 @@
+import json
+import re
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from api.models import Grade, GradeSummary, Schedule, Student, Teacher, TeachingPeriod
+from api.synthetic import seed_school
+
+# Модели, индексы и ограничения которых снимаются для замера "до"
+INDEXED_MODELS = (Grade, Schedule, Student, Teacher, TeachingPeriod)
+
+FULL_SCAN_PATTERNS = (
+    re.compile(r'\bSCAN (?:TABLE )?(\w+)\b(?! USING)'),  # SQLite
+    re.compile(r'Seq Scan on (\w+)'),                  # PostgreSQL
+)
+
+
+def full_scans(plan):
+    """Таблицы, которые план читает целиком"""
+    return sorted({match for pattern in FULL_SCAN_PATTERNS for match in pattern.findall(plan)})
+
+
+class Command(BaseCommand):
+    help = (
+        "Создает тестовую БД, заполняет ее синтетической школой и печатает планы (EXPLAIN) "
+        "и время основных запросов API без составных индексов и с ними"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--classes', type=int, default=60, help="Количество классов (по умолчанию 60)")
+        parser.add_argument('--students-per-class', type=int, default=30, help="Учеников в классе (по умолчанию 30)")
+        parser.add_argument('--repeat', type=int, default=20, help="Повторов каждого запроса (по умолчанию 20)")
+        parser.add_argument('--seed', type=int, default=0, help="Зерно генератора данных")
+        parser.add_argument('--json', dest='json_path', help="Сохранить результаты в JSON-файл")
+        parser.add_argument(
+            '--fail-on-scan',
+            action='store_true',
+            help="Код возврата 1, если с индексами какой-либо запрос читает таблицу целиком"
+        )
+
+    def handle(self, *args, **options):
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.stdout.write(f"Тестовая БД: {connection.settings_dict['NAME']}")
+            seed_school(
+                classes=options['classes'],
+                students_per_class=options['students_per_class'],
+                seed=options['seed'],
+                log=self.stdout.write
+            )
+            queries = self.build_queries()
+
+            self.set_indexes(enabled=False)
+            before = self.measure(queries, options['repeat'])
+            self.set_indexes(enabled=True)
+            after = self.measure(queries, options['repeat'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        results = self.report(queries, before, after)
+
+        if options['json_path']:
+            with open(options['json_path'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
+            self.stdout.write(f"Результаты сохранены в {options['json_path']}")
+
+        regressions = [result['name'] for result in results if result['regression']]
+        if regressions and options['fail_on_scan']:
+            raise CommandError(f"Полное чтение таблиц в запросах: {', '.join(regressions)}")
+
+    def build_queries(self):
+        """Запросы, которые выполняют представления и отчеты: (имя, queryset, допустим ли полный проход)"""
+        student = Student.objects.order_by('id')[Student.objects.count() // 2]
+        teacher = Teacher.objects.filter(classroom__isnull=False).order_by('id').first()
+        subject_id = Grade.objects.values_list('subject_id', flat=True).order_by('subject_id').last()
+        today = timezone.localdate()
+
+        return [
+            ('schedule_class_slot', Schedule.objects.filter(
+                school_class_id=student.school_class_id, day_of_week=2, lesson_number=3
+            ), False),
+            ('schedule_teacher_slot', Schedule.objects.filter(
+                teacher_id=teacher.id, day_of_week=2, lesson_number=3
+            ), False),
+            ('schedule_classroom_slot', Schedule.objects.filter(
+                classroom_id=teacher.classroom_id, day_of_week=2, lesson_number=3
+            ), False),
+            ('schedule_slot_validation', Schedule.objects.filter(day_of_week=2, lesson_number=3), False),
+            ('schedule_list_page', Schedule.objects.all()[:100], False),
+            ('grades_subject_quarter', Grade.objects.filter(subject_id=subject_id, quarter=2), False),
+            ('grades_student_quarter', Grade.objects.filter(student_id=student.id, quarter=2), False),
+            ('grade_summary_class', GradeSummary.objects.filter(school_class_id=student.school_class_id), False),
+            ('students_last_name', Student.objects.filter(last_name=student.last_name), False),
+            ('students_sorted_page', Student.objects.order_by('last_name', 'first_name')[:100], False),
+            ('teachers_last_name', Teacher.objects.filter(last_name=teacher.last_name), False),
+            ('periods_active', TeachingPeriod.objects.filter(start_date__lte=today, end_date__gte=today), False),
+            ('periods_subject_teachers', TeachingPeriod.objects.filter(
+                subject_id=subject_id
+            ).values('teacher_id').distinct(), False),
+            # Подстрока в середине слова B-tree индексом не ищется - полный проход ожидаем
+            ('students_last_name_icontains', Student.objects.filter(last_name__icontains=student.last_name[1:4]), True),
+        ]
+
+    def set_indexes(self, enabled):
+        # Ограничения - первыми: в SQLite их изменение пересоздает таблицу вместе с индексами
+        for model in INDEXED_MODELS:
+            constraints = model._meta.constraints
+            try:
+                for constraint in constraints:
+                    with connection.schema_editor() as editor:
+                        if enabled:
+                            editor.add_constraint(model, constraint)
+                        else:
+                            # Пересоздаваемая таблица берет ограничения из _meta модели
+                            model._meta.constraints = []
+                            editor.remove_constraint(model, constraint)
+            finally:
+                model._meta.constraints = constraints
+
+            with connection.cursor() as cursor:
+                existing = connection.introspection.get_constraints(cursor, model._meta.db_table)
+            with connection.schema_editor() as editor:
+                for index in model._meta.indexes:
+                    if enabled and index.name not in existing:
+                        editor.add_index(model, index)
+                    elif not enabled and index.name in existing:
+                        editor.remove_index(model, index)
+
+    def measure(self, queries, repeat):
+        measured = {}
+        for name, queryset, _ in queries:
+            plan = queryset.explain()
+            timings = []
+            for _ in range(max(repeat, 1)):
+                started = time.perf_counter()
+                rows = len(list(queryset.all()))
+                timings.append((time.perf_counter() - started) * 1000)
+            measured[name] = {
+                'plan': plan,
+                'full_scans': full_scans(plan),
+                'rows': rows,
+                'median_ms': round(statistics.median(timings), 3),
+            }
+        return measured
+
+    def report(self, queries, before, after):
+        results = []
+        for name, _, allow_scan in queries:
+            old, new = before[name], after[name]
+            regression = bool(new['full_scans']) and not allow_scan
+            results.append({
+                'name': name,
+                'rows': new['rows'],
+                'before': old,
+                'after': new,
+                'allow_scan': allow_scan,
+                'regression': regression,
+            })
+
+            speedup = old['median_ms'] / new['median_ms'] if new['median_ms'] else 0
+            style = self.style.ERROR if regression else self.style.SUCCESS
+            self.stdout.write(style(
+                f"\n{name}: строк {new['rows']}, {old['median_ms']} мс -> {new['median_ms']} мс (x{speedup:.1f})"
+            ))
+            self.stdout.write("  без индексов:")
+            for line in old['plan'].splitlines():
+                self.stdout.write(f"    {line}")
+            self.stdout.write("  с индексами:")
+            for line in new['plan'].splitlines():
+                self.stdout.write(f"    {line}")
+            if new['full_scans']:
+                note = " (ожидаемо)" if allow_scan else ""
+                self.stdout.write(f"  полный проход: {', '.join(new['full_scans'])}{note}")
+
+        return results
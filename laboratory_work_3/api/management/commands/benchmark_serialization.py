@@ -0,0 +1,100 @@
+import statistics
+import time
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries
+from django.test.utils import CaptureQueriesContext, override_settings, setup_test_environment, teardown_test_environment
+from rest_framework.test import APIClient
+
+from api import renderers
+from api.synthetic import seed_school
+
+ENDPOINTS = [
+    '/api/grades/',
+    '/api/students/',
+    '/api/schedules/',
+    '/api/teaching-periods/',
+    '/api/classrooms/',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает списки API на сериализаторах и JSONRenderer с быстрым путем "
+        "(values() и orjson) на синтетических данных; ответы должны совпадать побайтно"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--classes', type=int, default=40, help="Количество классов (по умолчанию 40)")
+        parser.add_argument('--page-size', type=int, default=1000, help="Размер страницы (по умолчанию 1000)")
+        parser.add_argument('--repeat', type=int, default=10, help="Повторов каждого запроса (по умолчанию 10)")
+        parser.add_argument(
+            '--min-speedup',
+            type=float,
+            default=0,
+            help="Код возврата 1, если ускорение списка оценок меньше заданного"
+        )
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            seed_school(classes=options['classes'], timetable=True, log=self.stdout.write)
+            client = APIClient()
+            client.force_authenticate(User.objects.create_superuser('benchmark', password=None))
+            results = [
+                self.compare(client, f"{url}?page_size={options['page_size']}", options['repeat'])
+                for url in ENDPOINTS
+            ]
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        if renderers.orjson is None:
+            self.stdout.write(self.style.WARNING("orjson не установлен - используется стандартный json"))
+
+        for url, slow, fast in results:
+            self.stdout.write(
+                f"{url}: {slow['median_ms']:.1f} мс ({slow['queries']} запр.) -> "
+                f"{fast['median_ms']:.1f} мс ({fast['queries']} запр.), "
+                f"x{slow['median_ms'] / fast['median_ms']:.1f}, {fast['size']} байт"
+            )
+
+        grades_speedup = results[0][1]['median_ms'] / results[0][2]['median_ms']
+        if grades_speedup < options['min_speedup']:
+            raise CommandError(f"Ускорение списка оценок x{grades_speedup:.1f} меньше x{options['min_speedup']}")
+
+    def measure(self, client, url, repeat):
+        # Клиент очищает журнал запросов в начале каждого запроса - считаем сразу
+        reset_queries()
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        queries_count = len(queries)
+        if response.status_code != 200:
+            raise CommandError(f"{url}: код ответа {response.status_code}")
+
+        timings = []
+        for _ in range(max(repeat, 1)):
+            started = time.perf_counter()
+            client.get(url)
+            timings.append((time.perf_counter() - started) * 1000)
+
+        return {
+            'content': response.content,
+            'size': len(response.content),
+            'queries': queries_count,
+            'median_ms': statistics.median(timings),
+        }
+
+    def compare(self, client, url, repeat):
+        # Без кэша ответов: сравнивается построение ответа, а не чтение из кэша
+        with override_settings(RESPONSE_CACHE_ENABLED=False):
+            with override_settings(FAST_LIST_ENABLED=False), mock.patch.object(renderers, 'orjson', None):
+                slow = self.measure(client, url, repeat)
+            fast = self.measure(client, url, repeat)
+
+        if slow['content'] != fast['content']:
+            raise CommandError(f"{url}: быстрый путь вернул другой ответ")
+        return url, slow, fast
@@ -0,0 +1,174 @@
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, OperationalError, connection, connections, transaction
+from django.db.models import Sum
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from api import grade_summary
+from api.models import Grade, GradeSummary, Student, Subject
+from api.synthetic import seed_school
+
+QUARTERS = (1, 2, 3, 4)
+# Оценки заполняются за первые четверти: записи в остальные - вставки, в заполненные - обновления
+SEEDED_QUARTERS = 2
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет конкурентную запись оценок через ORM (сохранение Grade и сигналы сводки) "
+        "с профилем БД из settings: DATABASE_ENGINE, CONN_MAX_AGE, параметры SQLite или пул PostgreSQL. "
+        "Чтобы сравнить профили, запустите команду с разными переменными окружения "
+        "(например, SQLITE_TUNING=0). Замер идет на тестовой БД, рабочая БД не затрагивается"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8, help="Потоков записи (по умолчанию 8)")
+        parser.add_argument('--readers', type=int, default=2, help="Потоков чтения сводки (по умолчанию 2)")
+        parser.add_argument('--transactions', type=int, default=200, help="Транзакций на поток записи (по умолчанию 200)")
+        parser.add_argument('--classes', type=int, default=20, help="Классов в тестовой БД (по умолчанию 20)")
+        parser.add_argument('--students-per-class', type=int, default=30, help="Учеников в классе (по умолчанию 30)")
+        parser.add_argument('--seed', type=int, default=0, help="Зерно генератора данных")
+
+    def handle(self, *args, **options):
+        if options['writers'] < 1 or options['transactions'] < 1 or options['readers'] < 0:
+            raise CommandError("--writers и --transactions должны быть не меньше 1, --readers - не меньше 0")
+
+        settings_dict = connection.settings_dict
+        self.stdout.write(
+            f"СУБД: {connection.vendor}, CONN_MAX_AGE={settings_dict['CONN_MAX_AGE']}, "
+            f"OPTIONS: {', '.join(sorted(settings_dict['OPTIONS'])) or '-'}"
+        )
+
+        setup_test_environment()
+        with tempfile.TemporaryDirectory() as directory:
+            if connection.vendor == 'sqlite':
+                # Тестовая БД SQLite по умолчанию в памяти - блокировки и WAL там другие
+                settings_dict['TEST']['NAME'] = os.path.join(directory, 'benchmark.sqlite3')
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                counts = seed_school(
+                    classes=options['classes'],
+                    students_per_class=options['students_per_class'],
+                    quarters=SEEDED_QUARTERS,
+                    timetable=False,
+                    seed=options['seed']
+                )
+                self.stdout.write(f"Учеников: {counts['students']}, оценок: {counts['grades']}")
+                stats = self.run_benchmark(options)
+                drift = grade_summary.find_drift()
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+                teardown_test_environment()
+
+        self.stdout.write(self.style.SUCCESS("\nРезультаты:"))
+        self.stdout.write(
+            f"  записи: {stats['commits']} транзакций за {stats['seconds']:.2f} с "
+            f"({stats['commits'] / stats['seconds']:.0f} в секунду), "
+            f"ошибок блокировки: {stats['locked']}, других ошибок БД: {stats['failed']}"
+        )
+        self.stdout.write(
+            f"  время транзакции: медиана {stats['median_ms']:.2f} мс, p95 {stats['p95_ms']:.2f} мс"
+        )
+        self.stdout.write(
+            f"  чтения сводки: {stats['reads']} ({stats['reads'] / stats['seconds']:.0f} в секунду), "
+            f"ошибок: {stats['read_failed']}"
+        )
+        if drift:
+            self.stdout.write(self.style.ERROR(f"  расхождений сводки с оценками: {len(drift)}"))
+        else:
+            self.stdout.write("  сводка совпадает с оценками")
+
+    def run_benchmark(self, options):
+        student_ids = list(Student.objects.values_list('id', flat=True))
+        subject_ids = list(Subject.objects.values_list('id', flat=True))
+
+        writers_done = threading.Event()
+        start = threading.Barrier(options['writers'] + options['readers'] + 1)
+        lock = threading.Lock()
+        stats = {'commits': 0, 'locked': 0, 'failed': 0, 'reads': 0, 'read_failed': 0, 'timings': []}
+
+        def writer(number):
+            # Соединение потока открывается по настройкам DATABASES (init_command, transaction_mode, пул)
+            rng = random.Random(options['seed'] * 1000 + number)
+            commits, locked, failed, timings = 0, 0, 0, []
+            start.wait()
+            try:
+                for _ in range(options['transactions']):
+                    key = {
+                        'student_id': rng.choice(student_ids),
+                        'subject_id': rng.choice(subject_ids),
+                        'quarter': rng.choice(QUARTERS),
+                    }
+                    started = time.perf_counter()
+                    try:
+                        # Как при сохранении оценки через API: прочитать, записать, обновить сводку сигналом
+                        with transaction.atomic():
+                            grade = Grade.objects.filter(**key).first() or Grade(**key)
+                            grade.grade = rng.randint(2, 5)
+                            grade.save()
+                    except OperationalError:
+                        locked += 1
+                    except DatabaseError:
+                        # Например, одновременная вставка той же оценки из другого потока
+                        failed += 1
+                    else:
+                        commits += 1
+                        timings.append((time.perf_counter() - started) * 1000)
+            finally:
+                connections.close_all()
+            with lock:
+                stats['commits'] += commits
+                stats['locked'] += locked
+                stats['failed'] += failed
+                stats['timings'].extend(timings)
+
+        def reader():
+            reads, failed = 0, 0
+            start.wait()
+            try:
+                while not writers_done.is_set():
+                    try:
+                        list(GradeSummary.objects.values('school_class_id').annotate(
+                            grade_sum=Sum('grade_sum'),
+                            grade_count=Sum('grade_count')
+                        ))
+                        reads += 1
+                    except DatabaseError:
+                        failed += 1
+            finally:
+                connections.close_all()
+            with lock:
+                stats['reads'] += reads
+                stats['read_failed'] += failed
+
+        writers = [threading.Thread(target=writer, args=(number,)) for number in range(options['writers'])]
+        readers = [threading.Thread(target=reader) for _ in range(options['readers'])]
+        for thread in writers + readers:
+            thread.start()
+
+        start.wait()
+        started = time.perf_counter()
+        for thread in writers:
+            thread.join()
+        seconds = time.perf_counter() - started
+        writers_done.set()
+        for thread in readers:
+            thread.join()
+
+        timings = sorted(stats['timings']) or [0]
+        return {
+            'commits': stats['commits'],
+            'locked': stats['locked'],
+            'failed': stats['failed'],
+            'reads': stats['reads'],
+            'read_failed': stats['read_failed'],
+            'seconds': seconds,
+            'median_ms': statistics.median(timings),
+            'p95_ms': timings[int(len(timings) * 0.95) - 1] if len(timings) > 1 else timings[0],
+        }
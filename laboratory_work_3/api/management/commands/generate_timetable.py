@@ -0,0 +1,39 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.timetable_generator import generate_timetable, save_timetable
+
+
+class Command(BaseCommand):
+    help = "Генерирует расписание без конфликтов по действующим периодам преподавания"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=date.fromisoformat, help="Дата, на которую берутся периоды преподавания (ГГГГ-ММ-ДД)")
+        parser.add_argument('--seed', type=int, default=0, help="Начальное значение генератора случайных чисел")
+        parser.add_argument('--attempts', type=int, default=20, help="Число попыток раскладки")
+        parser.add_argument('--dry-run', action='store_true', help="Только сгенерировать, не сохраняя")
+        parser.add_argument('--allow-partial', action='store_true', help="Сохранить, даже если часть уроков не удалось разместить")
+
+    def handle(self, *args, **options):
+        if options['attempts'] < 1:
+            raise CommandError("--attempts должно быть не меньше 1")
+
+        result = generate_timetable(options['date'], seed=options['seed'], attempts=options['attempts'])
+
+        self.stdout.write(
+            f"Размещено уроков: {len(result['lessons'])}, не размещено: {len(result['unplaced'])}, "
+            f"попыток: {result['attempts']}, время: {result['seconds']} с"
+        )
+        for lesson in result['unplaced']:
+            self.stdout.write(
+                f"  не размещен: класс {lesson['school_class']}, предмет {lesson['subject']}, учитель {lesson['teacher']}"
+            )
+
+        if options['dry_run']:
+            return
+        if result['unplaced'] and not options['allow_partial']:
+            raise CommandError("Расписание не сохранено: есть неразмещенные уроки (см. --allow-partial)")
+
+        save_timetable(result['lessons'])
+        self.stdout.write(self.style.SUCCESS("Расписание сохранено"))
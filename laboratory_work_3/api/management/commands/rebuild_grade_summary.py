@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api import grade_summary
+
+
+class Command(BaseCommand):
+    help = "Проверяет сводку оценок на расхождения с таблицей оценок и пересчитывает ее"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help="Только проверить расхождения, не пересчитывая сводку (код возврата 1 при расхождениях)"
+        )
+        parser.add_argument(
+            '--class-id',
+            type=int,
+            action='append',
+            dest='class_ids',
+            help="Ограничить проверку и пересчет заданными классами (можно указать несколько раз)"
+        )
+
+    def handle(self, *args, **options):
+        class_ids = options['class_ids']
+        drift = grade_summary.find_drift(class_ids)
+
+        for (school_class_id, subject_id, quarter), (stored, expected) in sorted(drift.items()):
+            self.stdout.write(
+                f"класс {school_class_id}, предмет {subject_id}, {quarter} четверть: "
+                f"в сводке {stored}, ожидается {expected}"
+            )
+
+        if options['check']:
+            if drift:
+                raise CommandError(f"Найдено расхождений: {len(drift)}")
+            self.stdout.write(self.style.SUCCESS("Сводка оценок актуальна"))
+            return
+
+        rows_count = grade_summary.rebuild(class_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f"Сводка оценок пересчитана: {rows_count} строк, исправлено расхождений: {len(drift)}"
+        ))
@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.models import SchoolClass
+from api.synthetic import SUBJECTS, clear_school, seed_school
+
+COUNT_LABELS = {
+    'classes': "классов",
+    'subjects': "предметов",
+    'classrooms': "кабинетов",
+    'teachers': "учителей",
+    'students': "учеников",
+    'grades': "оценок",
+    'lessons': "уроков в расписании",
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Заполняет БД синтетической школой: классы, ученики, учителя, предметы, периоды преподавания, "
+        "расписание и оценки за четверти (bulk-операциями)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--classes', type=int, default=30, help="Количество классов (по умолчанию 30)")
+        parser.add_argument('--students-per-class', type=int, default=25, help="Учеников в классе (по умолчанию 25)")
+        parser.add_argument('--teachers', type=int, help="Количество учителей (по умолчанию - вдвое больше классов)")
+        parser.add_argument(
+            '--subjects',
+            type=int,
+            default=len(SUBJECTS),
+            help=f"Количество предметов (по умолчанию {len(SUBJECTS)})"
+        )
+        parser.add_argument('--quarters', type=int, default=4, help="Четвертей с оценками (по умолчанию 4)")
+        parser.add_argument('--seed', type=int, default=0, help="Начальное значение генератора случайных чисел")
+        parser.add_argument('--no-timetable', action='store_true', help="Не генерировать расписание")
+        parser.add_argument('--flush', action='store_true', help="Предварительно удалить все данные школы")
+
+    def handle(self, *args, **options):
+        if options['classes'] < 1 or options['subjects'] < 1:
+            raise CommandError("--classes и --subjects должны быть не меньше 1")
+        if not 0 <= options['quarters'] <= 4:
+            raise CommandError("--quarters должно быть от 0 до 4")
+
+        if options['flush']:
+            clear_school()
+            self.stdout.write("Данные школы удалены")
+        elif SchoolClass.objects.exists():
+            raise CommandError("В БД уже есть данные школы (см. --flush)")
+
+        counts = seed_school(
+            classes=options['classes'],
+            students_per_class=options['students_per_class'],
+            teachers=options['teachers'],
+            subjects=options['subjects'],
+            quarters=options['quarters'],
+            timetable=not options['no_timetable'],
+            seed=options['seed'],
+            log=self.stdout.write
+        )
+        self.stdout.write(self.style.SUCCESS(
+            "Школа создана: " + ", ".join(f"{COUNT_LABELS[name]}: {count}" for name, count in counts.items())
+        ))
@@ -0,0 +1,205 @@
+"""Метрики в формате Prometheus, общие для всех процессов сервера.
+
+Каждый процесс копит счетчики и гистограммы в памяти и не чаще раза
+в METRICS_FLUSH_SECONDS сохраняет их в METRICS_DIR/<pid>.json. /metrics
+складывает файлы всех процессов, поэтому показывает сумму по серверу.
+"""
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+PDF_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Имя -> (тип, описание, границы гистограммы)
+METRICS = {
+    'school_http_requests_total': ('counter', "Запросы к API по обработчику, методу и коду ответа", None),
+    'school_http_request_errors_total': ('counter', "Ответы API с кодом 5xx", None),
+    'school_http_request_duration_seconds': ('histogram', "Время обработки запроса к API", LATENCY_BUCKETS),
+    'school_db_queries_total': ('counter', "SQL-запросы, выполненные при обработке запросов к API", None),
+    'school_db_query_duration_seconds_total': ('counter', "Суммарное время SQL-запросов", None),
+    'school_response_cache_requests_total': ('counter', "Обращения к кэшу ответов (result=hit|miss)", None),
+    'school_pdf_render_duration_seconds': ('histogram', "Время генерации PDF отчета", PDF_BUCKETS),
+}
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_last_flush = 0.0
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, labels=None, value=1):
+    key = _key(name, labels or {})
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, value, labels=None):
+    buckets = METRICS[name][2]
+    key = _key(name, labels or {})
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {'buckets': [0] * len(buckets), 'sum': 0.0, 'count': 0}
+        for index, bound in enumerate(buckets):
+            if value <= bound:
+                histogram['buckets'][index] += 1
+                break
+        histogram['sum'] += value
+        histogram['count'] += 1
+
+
+def handler_label(view_func, request):
+    """Обработчик для меток: 'TeacherViewSet.same_subject_teachers', 'ReportView:class_performance';
+    None - представление-функция.
+
+    Представление может задать metrics_label_param и metrics_label_choices: значение
+    параметра запроса из этого списка добавляется к имени через двоеточие.
+    """
+    # cls - у представлений DRF, view_class - у View из Django
+    view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+    if view_class is None:
+        return None
+
+    label = view_class.__name__
+    actions = getattr(view_func, 'actions', None)
+    if actions:
+        return f"{label}.{actions.get(request.method.lower(), request.method.lower())}"
+
+    param = getattr(view_class, 'metrics_label_param', None)
+    if param:
+        value = request.GET.get(param)
+        return f"{label}:{value if value in view_class.metrics_label_choices else 'other'}"
+    return label
+
+
+def observe_request(handler, method, status_code, seconds, timings=None):
+    inc('school_http_requests_total', {'handler': handler, 'method': method, 'status': str(status_code)})
+    if status_code >= 500:
+        inc('school_http_request_errors_total', {'handler': handler})
+    observe('school_http_request_duration_seconds', seconds, {'handler': handler})
+    if timings is not None:
+        inc('school_db_queries_total', {'handler': handler}, timings.sql_count)
+        inc('school_db_query_duration_seconds_total', {'handler': handler}, timings.sql_ms / 1000)
+    maybe_flush()
+
+
+def _process_path():
+    return Path(settings.METRICS_DIR) / f"{os.getpid()}.json"
+
+
+def _snapshot():
+    with _lock:
+        return {
+            'counters': [[name, dict(labels), value] for (name, labels), value in _counters.items()],
+            'histograms': [
+                [name, dict(labels), {**histogram, 'buckets': list(histogram['buckets'])}]
+                for (name, labels), histogram in _histograms.items()
+            ],
+        }
+
+
+def flush():
+    """Сохраняет метрики процесса в общий каталог (атомарной заменой файла)"""
+    global _last_flush
+    _last_flush = time.monotonic()
+    path = _process_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as tmp_file:
+            json.dump(_snapshot(), tmp_file, ensure_ascii=False)
+        os.replace(tmp_name, path)
+    except BaseException:
+        os.unlink(tmp_name)
+        raise
+
+
+def maybe_flush():
+    if time.monotonic() - _last_flush >= settings.METRICS_FLUSH_SECONDS:
+        flush()
+
+
+def _flush_at_exit():
+    if _counters or _histograms:
+        try:
+            flush()
+        except Exception:
+            pass
+
+
+atexit.register(_flush_at_exit)
+
+
+def collect():
+    """Метрики всех процессов: {(имя, метки): значение или гистограмма}"""
+    flush()
+    counters, histograms = {}, {}
+    for path in Path(settings.METRICS_DIR).glob('*.json'):
+        try:
+            with open(path, encoding='utf-8') as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            # Файл процесса мог быть удален или заменен во время чтения
+            continue
+        for name, labels, value in data['counters']:
+            key = _key(name, labels)
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, histogram in data['histograms']:
+            key = _key(name, labels)
+            total = histograms.setdefault(key, {'buckets': [0] * len(histogram['buckets']), 'sum': 0.0, 'count': 0})
+            total['buckets'] = [a + b for a, b in zip(total['buckets'], histogram['buckets'])]
+            total['sum'] += histogram['sum']
+            total['count'] += histogram['count']
+    return counters, histograms
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """Текстовый формат Prometheus (version 0.0.4)"""
+    counters, histograms = collect()
+    lines = []
+    for name, (metric_type, description, buckets) in METRICS.items():
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        if metric_type == 'counter':
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_number(value)}")
+            continue
+
+        for (metric, labels), histogram in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets, histogram['buckets']):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(labels, le=bound)} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(labels, le='+Inf')} {histogram['count']}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_number(histogram['sum'])}")
+            lines.append(f"{name}_count{_format_labels(labels)} {histogram['count']}")
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,118 @@
+import json
+import logging
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from . import instrumentation, metrics
+
+logger = logging.getLogger(__name__)
+
+
+class RequestTimingMiddleware:
+    """Число и время SQL-запросов, время сериализации, рендеринга и PDF для каждого запроса.
+
+    Результат отдается в заголовке Server-Timing; запросы дольше SLOW_REQUEST_MS
+    или с числом SQL больше SLOW_REQUEST_QUERIES пишутся в журнал одной JSON-строкой
+    вместе с самыми медленными SQL. Потоковые выгрузки замеряются до начала выдачи.
+    Отключается REQUEST_TIMING_ENABLED=0.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_TIMING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        timings = instrumentation.RequestTimings(top_sql=settings.SLOW_REQUEST_TOP_SQL)
+        token = instrumentation.activate(timings)
+        try:
+            with instrumentation.track_queries():
+                response = self.get_response(request)
+        finally:
+            instrumentation.deactivate(token)
+        return self.process_timings(request, response, timings)
+
+    async def __acall__(self, request):
+        timings = instrumentation.RequestTimings(top_sql=settings.SLOW_REQUEST_TOP_SQL)
+        token = instrumentation.activate(timings)
+        try:
+            with ExitStack() as stack:
+                # Синхронные представления и ORM под ASGI работают в отдельном потоке запроса -
+                # замер подключается к соединениям этого потока
+                await sync_to_async(stack.enter_context)(instrumentation.track_queries())
+                response = await self.get_response(request)
+        finally:
+            instrumentation.deactivate(token)
+        return self.process_timings(request, response, timings)
+
+    def process_timings(self, request, response, timings):
+        timings.finish()
+        response['Server-Timing'] = timings.server_timing()
+        if timings.total_ms >= settings.SLOW_REQUEST_MS or timings.sql_count > settings.SLOW_REQUEST_QUERIES:
+            self.log_slow_request(request, response, timings)
+        return response
+
+    def log_slow_request(self, request, response, timings):
+        resolver_match = getattr(request, 'resolver_match', None)
+        record = {
+            'method': request.method,
+            'path': request.get_full_path(),
+            'view': resolver_match.view_name if resolver_match else None,
+            'status': response.status_code,
+            'total_ms': round(timings.total_ms, 3),
+            'sql_count': timings.sql_count,
+            'sql_ms': round(timings.sql_ms, 3),
+            'stages': {name: round(duration, 3) for name, duration in timings.stages.items()},
+            'slowest_sql': timings.slowest_sql(),
+        }
+        logger.warning("Медленный запрос: %s", json.dumps(record, ensure_ascii=False))
+
+
+class MetricsMiddleware:
+    """Счетчики и гистограммы запросов к представлениям DRF для /metrics (см. api/metrics.py).
+
+    Ставится после RequestTimingMiddleware, чтобы взять из его замеров число
+    и время SQL. Отключается METRICS_ENABLED=0.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self.observe(request, response, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self.observe(request, response, time.perf_counter() - started)
+        return response
+
+    def observe(self, request, response, seconds):
+        resolver_match = getattr(request, 'resolver_match', None)
+        handler = metrics.handler_label(resolver_match.func, request) if resolver_match else None
+        if handler is not None:
+            metrics.observe_request(handler, request.method, response.status_code, seconds, instrumentation.get_current())
@@ -0,0 +1,53 @@
+# Generated by Django 6.0 on 2026-10-18 02:48
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def fill_grade_summary(apps, schema_editor):
+    Grade = apps.get_model('api', 'Grade')
+    GradeSummary = apps.get_model('api', 'GradeSummary')
+
+    rows = Grade.objects.values('student__school_class_id', 'subject_id', 'quarter').annotate(
+        grade_sum=Sum('grade'),
+        grade_count=Count('id')
+    )
+    GradeSummary.objects.bulk_create([
+        GradeSummary(
+            school_class_id=row['student__school_class_id'],
+            subject_id=row['subject_id'],
+            quarter=row['quarter'],
+            grade_sum=row['grade_sum'],
+            grade_count=row['grade_count']
+        )
+        for row in rows
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GradeSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quarter', models.IntegerField(validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(4)], verbose_name='Четверть')),
+                ('grade_sum', models.IntegerField(default=0, verbose_name='Сумма оценок')),
+                ('grade_count', models.IntegerField(default=0, verbose_name='Количество оценок')),
+                ('school_class', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='grade_summaries', to='api.schoolclass')),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='grade_summaries', to='api.subject')),
+            ],
+            options={
+                'verbose_name': 'Сводка оценок',
+                'verbose_name_plural': 'Сводки оценок',
+                'unique_together': {('school_class', 'subject', 'quarter')},
+            },
+        ),
+        migrations.RunPython(fill_grade_summary, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 6.0 on 2026-10-18 02:54
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_background_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='backgroundjob',
+            name='result',
+            field=models.JSONField(blank=True, null=True, verbose_name='Результат'),
+        ),
+        migrations.AddField(
+            model_name='subject',
+            name='weekly_lessons',
+            field=models.PositiveSmallIntegerField(default=2, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(8)], verbose_name='Уроков в неделю'),
+        ),
+        migrations.AlterField(
+            model_name='backgroundjob',
+            name='kind',
+            field=models.CharField(choices=[('class_performance_pdf', 'PDF отчет об успеваемости класса'), ('timetable', 'Генерация расписания')], max_length=50, verbose_name='Тип задачи'),
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 6.0 on 2026-10-18 02:57
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def check_schedule_slots(apps, schema_editor):
+    """Уникальность слота класса нельзя включить, пока в расписании есть дубли"""
+    Schedule = apps.get_model('api', 'Schedule')
+    duplicates = list(
+        Schedule.objects.values('school_class_id', 'day_of_week', 'lesson_number')
+        .annotate(lessons=Count('id'))
+        .filter(lessons__gt=1)
+        .order_by('school_class_id', 'day_of_week', 'lesson_number')[:10]
+    )
+    if duplicates:
+        slots = ', '.join(
+            f"класс {row['school_class_id']}: день {row['day_of_week']}, урок {row['lesson_number']}"
+            for row in duplicates
+        )
+        raise RuntimeError(
+            f"В расписании есть несколько уроков класса в одном слоте ({slots}). "
+            "Исправьте их (GET /api/schedules/conflicts/) и повторите миграцию."
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_timetable_generation'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='grade',
+            index=models.Index(fields=['subject', 'quarter'], name='grade_subject_quarter_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='grade',
+            index=models.Index(fields=['student', 'quarter'], name='grade_student_quarter_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='schedule',
+            index=models.Index(fields=['teacher', 'day_of_week', 'lesson_number'], name='schedule_teacher_slot_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='schedule',
+            index=models.Index(fields=['classroom', 'day_of_week', 'lesson_number'], name='schedule_classroom_slot_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='schedule',
+            index=models.Index(fields=['day_of_week', 'lesson_number'], name='schedule_slot_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['last_name', 'first_name'], name='student_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='teacher',
+            index=models.Index(fields=['last_name', 'first_name'], name='teacher_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='teachingperiod',
+            index=models.Index(fields=['start_date', 'end_date'], name='period_dates_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='teachingperiod',
+            index=models.Index(fields=['subject', 'teacher'], name='period_subject_teacher_idx'),
+        ),
+        migrations.RunPython(check_schedule_slots, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='schedule',
+            constraint=models.UniqueConstraint(fields=('school_class', 'day_of_week', 'lesson_number'), name='schedule_class_slot_unique'),
+        ),
+    ]
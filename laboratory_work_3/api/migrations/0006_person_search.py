@@ -0,0 +1,102 @@
+# Generated by Django 6.0 on 2026-10-18 03:21
+
+from django.db import migrations
+
+# Таблицы людей и их поисковые индексы (см. api/search.py)
+PERSON_TABLES = {
+    'api_student': 'api_student_search',
+    'api_teacher': 'api_teacher_search',
+}
+
+
+def _fold(column):
+    # "ё" и "е" при поиске не различаются (unicode61 снимает диакритику только с латиницы)
+    return f"replace(replace({column}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+# SQLite: FTS5 по фамилии и имени. unicode61 приводит к нижнему регистру любые буквы,
+# включая кириллицу; prefix - индексы для быстрого поиска по первым буквам. Индекс
+# поддерживается триггерами, поэтому учитываются и массовые операции (bulk_create,
+# update), которые не отправляют сигналы
+SQLITE_CREATE = [
+    """
+    CREATE VIRTUAL TABLE {index} USING fts5(
+        last_name, first_name, tokenize = 'unicode61 remove_diacritics 2', prefix = '1 2 3'
+    )
+    """,
+    f"""
+    INSERT INTO {{index}}(rowid, last_name, first_name)
+    SELECT id, {_fold('last_name')}, {_fold('first_name')} FROM {{table}}
+    """,
+    f"""
+    CREATE TRIGGER {{index}}_insert AFTER INSERT ON {{table}} BEGIN
+        INSERT INTO {{index}}(rowid, last_name, first_name)
+        VALUES (new.id, {_fold('new.last_name')}, {_fold('new.first_name')});
+    END
+    """,
+    f"""
+    CREATE TRIGGER {{index}}_update AFTER UPDATE OF id, last_name, first_name ON {{table}} BEGIN
+        DELETE FROM {{index}} WHERE rowid = old.id;
+        INSERT INTO {{index}}(rowid, last_name, first_name)
+        VALUES (new.id, {_fold('new.last_name')}, {_fold('new.first_name')});
+    END
+    """,
+    """
+    CREATE TRIGGER {index}_delete AFTER DELETE ON {table} BEGIN
+        DELETE FROM {index} WHERE rowid = old.id;
+    END
+    """,
+]
+SQLITE_DROP = [
+    "DROP TRIGGER IF EXISTS {index}_insert",
+    "DROP TRIGGER IF EXISTS {index}_update",
+    "DROP TRIGGER IF EXISTS {index}_delete",
+    "DROP TABLE IF EXISTS {index}",
+]
+
+# PostgreSQL: GIN-индекс по выражению tsvector (конфигурация simple - без стемминга,
+# только нижний регистр). Выражение должно совпадать с api/search.py, иначе индекс
+# не используется; синхронизация не нужна - индекс обновляет сама СУБД
+POSTGRESQL_CREATE = [
+    """
+    CREATE INDEX {index}_idx ON {table}
+    USING GIN (to_tsvector('simple', translate(last_name || ' ' || first_name, 'Ёё', 'Ее')))
+    """,
+]
+POSTGRESQL_DROP = [
+    "DROP INDEX IF EXISTS {index}_idx",
+]
+
+STATEMENTS = {
+    'sqlite': (SQLITE_CREATE, SQLITE_DROP),
+    'postgresql': (POSTGRESQL_CREATE, POSTGRESQL_DROP),
+}
+
+
+def _execute(schema_editor, create):
+    # Для остальных СУБД индекса нет - поиск работает через icontains
+    statements = STATEMENTS.get(schema_editor.connection.vendor)
+    if statements is None:
+        return
+    for table, index in PERSON_TABLES.items():
+        for sql in statements[0 if create else 1]:
+            schema_editor.execute(sql.format(table=table, index=index))
+
+
+def create_search_index(apps, schema_editor):
+    _execute(schema_editor, create=True)
+
+
+def drop_search_index(apps, schema_editor):
+    _execute(schema_editor, create=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,345 @@
+import csv
+import hashlib
+import json
+import re
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from rest_framework import serializers, status
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from . import instrumentation, response_cache, versions
+from .fastpath import CountedRows, FastRows
+from .renderers import CSVRenderer, NDJSONRenderer
+
+
+class _Echo:
+    """Псевдо-файл для csv.writer: возвращает строку вместо записи"""
+
+    def write(self, value):
+        return value
+
+
+class StreamingExportMixin:
+    """Потоковая выгрузка списка в CSV или NDJSON (?format=csv / ?format=ndjson).
+
+    Учитывает фильтры viewset, читает строки через values().iterator(),
+    поэтому расход памяти не зависит от объема выгрузки.
+    """
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES + [CSVRenderer, NDJSONRenderer]
+    export_fields = ()
+    export_chunk_size = 2000
+    export_formats = ('csv', 'ndjson')
+
+    def list(self, request, *args, **kwargs):
+        export_format = getattr(request.accepted_renderer, 'format', None)
+        if export_format in self.export_formats:
+            return self.export(export_format)
+        return super().list(request, *args, **kwargs)
+
+    def get_export_rows(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        if not queryset.ordered:
+            queryset = queryset.order_by('pk')
+        return queryset.values(*self.export_fields).iterator(chunk_size=self.export_chunk_size)
+
+    def export(self, export_format):
+        rows = self.get_export_rows()
+        basename = self.basename if getattr(self, 'basename', None) else self.get_queryset().model._meta.model_name
+
+        if export_format == 'csv':
+            content = self._stream_csv(rows)
+            content_type = 'text/csv; charset=utf-8'
+        else:
+            content = self._stream_ndjson(rows)
+            content_type = 'application/x-ndjson; charset=utf-8'
+
+        response = StreamingHttpResponse(content, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{basename}.{export_format}"'
+        return response
+
+    def _stream_csv(self, rows):
+        writer = csv.writer(_Echo())
+        yield writer.writerow(self.export_fields)
+        for row in rows:
+            yield writer.writerow([
+                value.isoformat() if hasattr(value, 'isoformat') else value
+                for value in (row[field] for field in self.export_fields)
+            ])
+
+    def _stream_ndjson(self, rows):
+        for row in rows:
+            yield json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+class NotModified(Exception):
+    """Данные не изменились с версии, которая уже есть у клиента"""
+
+
+class ConditionalGetMixin:
+    """ETag и Last-Modified для GET-запросов по версиям таблиц (см. versions.py).
+
+    ETag строится из версий таблиц etag_models, пути, параметров запроса и формата
+    ответа, поэтому проверка If-None-Match / If-Modified-Since выполняется после
+    аутентификации и проверки прав, но до запроса к БД и сериализации.
+    """
+    # Модели, от которых зависит ответ; по умолчанию - модель queryset
+    etag_models = ()
+    # Действия, ответ которых зависит не только от данных (например, от текущего времени)
+    etag_exempt_actions = ()
+    # Модели для отдельных действий: {действие: модели}
+    etag_action_models = {}
+
+    def get_etag_models(self):
+        return self.etag_action_models.get(self.action) or self.etag_models or (self.get_queryset().model,)
+
+    def get_conditional_state(self, request):
+        """(ETag, Last-Modified в секундах) или None, если ответ не кэшируется клиентом"""
+        if request.method not in ('GET', 'HEAD') or self.action in self.etag_exempt_actions:
+            return None
+
+        table_versions = versions.get_versions(*(versions.label_for(model) for model in self.get_etag_models()))
+        params = urlencode(sorted(request.query_params.lists()), doseq=True)
+        media_type = getattr(request, 'accepted_media_type', '')
+        key = '|'.join([*map(str, table_versions), request.path, params, media_type])
+        etag = f'W/"{hashlib.sha1(key.encode()).hexdigest()}"'
+        # Версия - время изменения в наносекундах
+        return etag, max(table_versions) // 10 ** 9
+
+    def is_not_modified(self, request, etag, last_modified):
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match:
+            # Слабое сравнение: W/"x" и "x" совпадают
+            client_etags = {value.removeprefix('W/') for value in parse_etags(if_none_match)}
+            return '*' in client_etags or etag.removeprefix('W/') in client_etags
+
+        if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+        return if_modified_since is not None and last_modified <= if_modified_since
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.conditional_state = self.get_conditional_state(request)
+        if self.conditional_state and self.is_not_modified(request, *self.conditional_state):
+            raise NotModified()
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return Response(status=status.HTTP_304_NOT_MODIFIED)
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        state = getattr(self, 'conditional_state', None)
+        if state and response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            etag, last_modified = state
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+            # Клиент может хранить ответ, но должен перепроверять его по ETag
+            response['Cache-Control'] = 'private, no-cache'
+            patch_vary_headers(response, ('Accept', 'Authorization', 'Cookie'))
+        return response
+
+
+class CachedResponse(Exception):
+    """Готовый ответ из кэша"""
+
+    def __init__(self, response):
+        super().__init__()
+        self.response = response
+
+
+class ResponseCacheMixin:
+    """Кэш отрендеренных GET-ответов (включается настройкой RESPONSE_CACHE_ENABLED).
+
+    Ключ - точка входа, путь, отсортированные параметры, формат, область прав
+    пользователя и версии меток данных из get_cache_tags(). Сигналы моделей
+    увеличивают версии, поэтому записи с устаревшими данными больше не находятся.
+    В цепочке миксинов ставится перед ConditionalGetMixin: 304 дешевле кэша.
+    """
+    # Модели, от которых зависит ответ; по умолчанию - etag_models или модель queryset
+    cache_models = ()
+    cache_exempt_actions = ()
+    # Браузерный API содержит данные пользователя, потоковые выгрузки не кэшируются
+    cache_formats = ('json',)
+
+    def get_cache_endpoint(self, request):
+        return f"{self.__class__.__name__}.{getattr(self, 'action', None) or request.method.lower()}"
+
+    def get_cache_tags(self, request):
+        """Метки версий, от которых зависит ответ; None - ответ не кэшируется"""
+        action = getattr(self, 'action', None)
+        if action in self.cache_exempt_actions or action in getattr(self, 'etag_exempt_actions', ()):
+            return None
+        models = self.cache_models or getattr(self, 'etag_models', ()) or (self.get_queryset().model,)
+        return [versions.label_for(model) for model in models]
+
+    def get_cache_scope(self, request):
+        """Область прав пользователя: ответы для разных ролей не смешиваются"""
+        user = request.user
+        if user.is_superuser:
+            return 'superuser'
+        if user.is_staff:
+            return 'staff'
+        return 'user'
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.response_cache_key = None
+        if (
+            request.method not in ('GET', 'HEAD')
+            or not response_cache.is_enabled()
+            or getattr(request.accepted_renderer, 'format', None) not in self.cache_formats
+        ):
+            return
+
+        tags = self.get_cache_tags(request)
+        if tags is None:
+            return
+
+        endpoint = self.get_cache_endpoint(request)
+        params = urlencode(sorted(request.query_params.lists()), doseq=True)
+        key = response_cache.make_key(
+            endpoint,
+            [request.path, params, request.accepted_media_type, self.get_cache_scope(request)],
+            tags
+        )
+        cached = response_cache.get_cache().get(key)
+        response_cache.record(endpoint, hit=cached is not None)
+
+        if cached is not None:
+            raise CachedResponse(HttpResponse(
+                cached['content'],
+                status=cached['status'],
+                content_type=cached['content_type']
+            ))
+        self.response_cache_key = key
+
+    def handle_exception(self, exc):
+        if isinstance(exc, CachedResponse):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        key = getattr(self, 'response_cache_key', None)
+        if key and isinstance(response, Response) and response.status_code == status.HTTP_200_OK:
+            response.render()
+            response_cache.get_cache().set(key, {
+                'content': response.content,
+                'status': response.status_code,
+                'content_type': response['Content-Type'],
+            })
+        return response
+
+
+class FastListMixin:
+    """Быстрый список в JSON: строки values() вместо объектов моделей и сериализатора.
+
+    Включается настройкой FAST_LIST_ENABLED и используется, только если все поля
+    сериализатора описаны в fast_list_fields (см. fastpath.py); иначе - обычный list().
+    Фильтры и пагинация те же, что у обычного списка.
+    """
+    fast_list_fields = {}
+    fast_list_formats = ('json',)
+
+    def get_fast_rows(self, request):
+        if (
+            not settings.FAST_LIST_ENABLED
+            or getattr(request.accepted_renderer, 'format', None) not in self.fast_list_formats
+        ):
+            return None
+
+        fields = self.get_serializer().fields
+        keys = list(fields)
+        if not set(keys) <= self.fast_list_fields.keys():
+            return None
+        # Вложенные объекты (?expand=) строками values() не описываются
+        if any(isinstance(field, serializers.BaseSerializer) for field in fields.values()):
+            return None
+        return FastRows(self.fast_list_fields, keys)
+
+    def list(self, request, *args, **kwargs):
+        rows = self.get_fast_rows(request)
+        if rows is None:
+            return super().list(request, *args, **kwargs)
+
+        base = self.filter_queryset(self.get_queryset()).prefetch_related(None)
+        queryset = base.values(*rows.paths)
+        page = self.paginate_queryset(CountedRows(queryset, base))
+        with instrumentation.stage('serialize'):
+            data = [rows.build(row) for row in (page if page is not None else queryset)]
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+
+class SparseFieldsMixin:
+    """Запрос под набор полей ответа (?fields=, ?omit=, ?expand=, см. DynamicFieldsModelSerializer).
+
+    Связи, Prefetch и аннотации описываются словарями "поле ответа -> что нужно"
+    и добавляются в queryset, только если поле выводится. При ?fields= и ?omit=
+    столбцы модели ограничиваются через only(). Для действий вне sparse_actions
+    queryset строится со всеми связями.
+    """
+    field_select_related = {}
+    field_prefetch_related = {}
+    field_annotations = {}
+    # Связи для ?expand=, если нужно больше, чем сама связь
+    expand_select_related = {}
+    sparse_actions = ('list', 'retrieve')
+
+    def get_output_fields(self):
+        """Выводимые поля сериализатора; None - все поля"""
+        if self.request is None or self.action not in self.sparse_actions:
+            return None
+        return self.get_serializer().fields
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields = self.get_output_fields()
+        names = self.field_select_related.keys() | self.field_prefetch_related.keys() | self.field_annotations.keys()
+        if fields is not None:
+            names &= fields.keys()
+
+        select_related = set()
+        prefetch_related = []
+        annotations = {}
+        for name in sorted(names):
+            select_related.update(self.field_select_related.get(name, ()))
+            prefetch_related.extend(self.field_prefetch_related.get(name, ()))
+            annotations.update(self.field_annotations.get(name, {}))
+        for name, field in (fields or {}).items():
+            if isinstance(field, serializers.BaseSerializer):
+                select_related.update(self.expand_select_related.get(name, [field.source]))
+
+        queryset = queryset.select_related(None).prefetch_related(None)
+        if select_related:
+            queryset = queryset.select_related(*sorted(select_related))
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        if annotations:
+            queryset = queryset.annotate(**annotations)
+
+        query_params = self.request.query_params if self.request is not None else {}
+        if fields is not None and ('fields' in query_params or 'omit' in query_params):
+            queryset = queryset.only(*self.get_only_columns(queryset.model, fields, select_related))
+        return queryset
+
+    def get_only_columns(self, model, fields, select_related):
+        """Столбцы модели, которые читают выводимые поля и выбранные связи"""
+        concrete = {field.name for field in model._meta.concrete_fields}
+        columns = {model._meta.pk.name}
+        for field in fields.values():
+            source = field.source.split('.')[0]
+            display = re.fullmatch(r'get_(\w+)_display', source)
+            if display:
+                source = display.group(1)
+            if source in concrete:
+                columns.add(source)
+        columns.update(path.split('__')[0] for path in select_related)
+        return sorted(columns)
@@ -1,8 +1,23 @@
-from django.db import models
+import uuid
+
+from django.db import models, router, transaction
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
 
 
+class AtomicSaveMixin:
+    """Сохранение вместе с сигналами post_save в одной транзакции.
+
+    Сигналы обновляют сводку оценок классов: если это не удалось, не сохраняется
+    и сама запись. Удаление Django и так выполняет в транзакции вместе с post_delete.
+    """
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
+
+
 class Classroom(models.Model):
     """Кабинет"""
     SUBJECT_TYPES = [
@@ -65,11 +80,19 @@ class Teacher(models.Model):
     class Meta:
         verbose_name = "Учитель"
         verbose_name_plural = "Учителя"
+        indexes = [
+            models.Index(fields=['last_name', 'first_name'], name='teacher_name_idx'),
+        ]
 
 
 class Subject(models.Model):
     """Предмет"""
     subject_name = models.CharField(max_length=100, unique=True)
+    weekly_lessons = models.PositiveSmallIntegerField(
+        default=2,
+        validators=[MinValueValidator(1), MaxValueValidator(8)],
+        verbose_name="Уроков в неделю"
+    )
 
     def __str__(self):
         return self.subject_name
@@ -93,9 +116,15 @@ class TeachingPeriod(models.Model):
     class Meta:
         verbose_name = "Период преподавания"
         verbose_name_plural = "Периоды преподавания"
+        indexes = [
+            # Действующие назначения на дату (генератор расписания, справочники)
+            models.Index(fields=['start_date', 'end_date'], name='period_dates_idx'),
+            # Учителя одного предмета и количество учителей по предмету
+            models.Index(fields=['subject', 'teacher'], name='period_subject_teacher_idx'),
+        ]
 
 
-class Student(models.Model):
+class Student(AtomicSaveMixin, models.Model):
     """Ученик"""
     GENDER_CHOICES = [
         ('M', 'Мужской'),
@@ -110,12 +139,22 @@ class Student(models.Model):
     def __str__(self):
         return f"{self.last_name} {self.first_name} ({self.school_class})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Значения из БД нужны сигналам, чтобы переносить сводку оценок при смене класса
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
     class Meta:
         verbose_name = "Ученик"
         verbose_name_plural = "Ученики"
+        indexes = [
+            models.Index(fields=['last_name', 'first_name'], name='student_name_idx'),
+        ]
 
 
-class Grade(models.Model):
+class Grade(AtomicSaveMixin, models.Model):
     """Оценка ученика по предмету"""
     student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='grades')
     subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name='grades')
@@ -134,10 +173,42 @@ class Grade(models.Model):
         verbose_name = "Оценка"
         verbose_name_plural = "Оценки"
         unique_together = ['student', 'subject', 'quarter']
+        indexes = [
+            # Фильтр оценок по предмету и четверти; (student, ...) покрывает unique_together
+            models.Index(fields=['subject', 'quarter'], name='grade_subject_quarter_idx'),
+            models.Index(fields=['student', 'quarter'], name='grade_student_quarter_idx'),
+        ]
 
     def __str__(self):
         return f"{self.student} - {self.subject} - {self.quarter} четверть: {self.grade}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Значения из БД нужны сигналам, чтобы вычесть старую оценку из сводки
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+
+class GradeSummary(models.Model):
+    """Сводка оценок класса по предмету за четверть (поддерживается сигналами)"""
+    school_class = models.ForeignKey(SchoolClass, on_delete=models.CASCADE, related_name='grade_summaries')
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name='grade_summaries')
+    quarter = models.IntegerField(
+        validators=[MinValueValidator(1), MaxValueValidator(4)],
+        verbose_name="Четверть"
+    )
+    grade_sum = models.IntegerField(default=0, verbose_name="Сумма оценок")
+    grade_count = models.IntegerField(default=0, verbose_name="Количество оценок")
+
+    class Meta:
+        verbose_name = "Сводка оценок"
+        verbose_name_plural = "Сводки оценок"
+        unique_together = ['school_class', 'subject', 'quarter']
+
+    def __str__(self):
+        return f"{self.school_class} - {self.subject} - {self.quarter} четверть: {self.grade_sum}/{self.grade_count}"
+
 
 class Schedule(models.Model):
     """Расписание"""
@@ -161,6 +232,53 @@ class Schedule(models.Model):
         verbose_name = "Расписание"
         verbose_name_plural = "Расписание"
         ordering = ['day_of_week', 'lesson_number']
+        constraints = [
+            # У класса не может быть двух уроков в один слот
+            models.UniqueConstraint(
+                fields=['school_class', 'day_of_week', 'lesson_number'],
+                name='schedule_class_slot_unique'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['teacher', 'day_of_week', 'lesson_number'], name='schedule_teacher_slot_idx'),
+            models.Index(fields=['classroom', 'day_of_week', 'lesson_number'], name='schedule_classroom_slot_idx'),
+            models.Index(fields=['day_of_week', 'lesson_number'], name='schedule_slot_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_day_of_week_display()} - {self.lesson_number} урок: {self.subject} ({self.school_class})"
+
+
+class BackgroundJob(models.Model):
+    """Фоновая задача (например, генерация PDF отчета)"""
+    KIND_CHOICES = [
+        ('class_performance_pdf', 'PDF отчет об успеваемости класса'),
+        ('timetable', 'Генерация расписания'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'В очереди'),
+        ('running', 'Выполняется'),
+        ('done', 'Готово'),
+        ('failed', 'Ошибка'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(max_length=50, choices=KIND_CHOICES, verbose_name="Тип задачи")
+    params = models.JSONField(default=dict, blank=True, verbose_name="Параметры")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending', verbose_name="Статус")
+    data_hash = models.CharField(max_length=64, blank=True, db_index=True, verbose_name="Хэш данных")
+    file_name = models.CharField(max_length=255, blank=True, verbose_name="Имя файла")
+    result = models.JSONField(null=True, blank=True, verbose_name="Результат")
+    error = models.TextField(blank=True, verbose_name="Ошибка")
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='background_jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Фоновая задача"
+        verbose_name_plural = "Фоновые задачи"
+        ordering = ['-created_at']
 
     def __str__(self):
-        return f"{self.get_day_of_week_display()} - {self.lesson_number} урок: {self.subject} ({self.school_class})"
\ No newline at end of file
+        return f"{self.get_kind_display()} ({self.get_status_display()})"
@@ -0,0 +1,64 @@
+from django.conf import settings
+from rest_framework.pagination import BasePagination, CursorPagination, PageNumberPagination
+
+
+class StandardPagination(PageNumberPagination):
+    """Постраничная пагинация с ?page_size= и ограничением сверху"""
+    page_size_query_param = 'page_size'
+    max_page_size = settings.API_MAX_PAGE_SIZE
+
+
+class KeysetPagination(CursorPagination):
+    """Курсорная пагинация по индексированному полю: без OFFSET и без COUNT(*).
+
+    Поле сортировки задается атрибутом viewset cursor_ordering (по умолчанию id).
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = settings.API_MAX_PAGE_SIZE
+    ordering = 'id'
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, 'cursor_ordering', None) or self.ordering
+        return (ordering,) if isinstance(ordering, str) else tuple(ordering)
+
+
+class OptionalCursorPagination(BasePagination):
+    """Постраничная пагинация по умолчанию; курсорная - по ?pagination=cursor или ?cursor=..."""
+    mode_query_param = 'pagination'
+
+    def __init__(self):
+        self.page_number_paginator = StandardPagination()
+        self.cursor_paginator = KeysetPagination()
+        self.paginator = self.page_number_paginator
+
+    def uses_cursor(self, request):
+        return (
+            request.query_params.get(self.mode_query_param) == 'cursor'
+            or self.cursor_paginator.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.paginator = self.cursor_paginator if self.uses_cursor(request) else self.page_number_paginator
+        return self.paginator.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return self.page_number_paginator.get_paginated_response_schema(schema)
+
+    def get_schema_operation_parameters(self, view):
+        parameters = self.page_number_paginator.get_schema_operation_parameters(view)
+        names = {parameter['name'] for parameter in parameters}
+        return parameters + [
+            parameter
+            for parameter in self.cursor_paginator.get_schema_operation_parameters(view)
+            if parameter['name'] not in names
+        ]
+
+    @property
+    def display_page_controls(self):
+        return getattr(self.paginator, 'display_page_controls', False)
+
+    def to_html(self):
+        return self.paginator.to_html()
@@ -0,0 +1,64 @@
+"""Рейтинг учеников класса и список неуспевающих.
+
+Средний балл, число оценок и двоек считаются условной агрегацией по оценкам,
+место в классе - оконной функцией RANK() с разбиением по классу; все это
+один запрос независимо от числа учеников.
+"""
+from django.db.models import Avg, Count, F, Q, Window
+from django.db.models.functions import FirstValue, Rank
+
+from .models import Student
+
+FAILING_GRADE = 2
+# Сортировка рейтинга; первое поле - ключ курсора. Страница курсора берет классы
+# целиком (school_class_id > позиции), поэтому места в классе не искажаются
+RANKING_ORDERING = ('school_class_id', 'rank', 'id')
+
+
+def ranked_students(quarter=None):
+    """Ученики со средним баллом, числом оценок и двоек и местом в классе (за четверть или за год)"""
+    grades = Q(grades__quarter=quarter) if quarter is not None else Q()
+    average = Avg('grades__grade', filter=grades)
+    return Student.objects.annotate(
+        average_grade=average,
+        grades_count=Count('grades', filter=grades),
+        failing_grades=Count('grades', filter=grades & Q(grades__grade=FAILING_GRADE)),
+        # Ученики без оценок - в конце рейтинга
+        rank=Window(Rank(), partition_by=F('school_class_id'), order_by=average.desc(nulls_last=True)),
+    ).order_by(*RANKING_ORDERING)
+
+
+def at_risk_students(quarter=None):
+    """Ученики хотя бы с одной двойкой; место - среди всех учеников класса.
+
+    Условие на число двоек задано через оконную функцию: Django применяет такой
+    фильтр к внешнему запросу, уже после расчета мест (обычный фильтр по агрегату
+    попал бы в HAVING и отбросил остальных учеников класса до RANK()).
+    """
+    return ranked_students(quarter).annotate(
+        failing_marker=Window(FirstValue('failing_grades'), partition_by=F('id'))
+    ).filter(failing_marker__gt=0)
+
+
+def ranking_values(queryset):
+    """Поля ranked_students / at_risk_students, нужные для ответа (строки - словари)"""
+    return queryset.values(
+        'id', 'last_name', 'first_name', 'school_class_id', 'school_class__class_name',
+        'average_grade', 'grades_count', 'failing_grades', 'rank'
+    )
+
+
+def ranking_row(row):
+    """Строка ответа из строки ranking_values"""
+    average_grade = row['average_grade']
+    return {
+        'student': row['id'],
+        'student_name': f"{row['last_name']} {row['first_name']}",
+        'school_class': row['school_class_id'],
+        'class_name': row['school_class__class_name'],
+        'rank': row['rank'],
+        'average_grade': round(average_grade, 2) if average_grade is not None else None,
+        'grades_count': row['grades_count'],
+        'failing_grades': row['failing_grades'],
+        'at_risk': row['failing_grades'] > 0,
+    }
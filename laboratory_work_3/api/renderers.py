@@ -0,0 +1,116 @@
+import csv
+import io
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import instrumentation
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class PassThroughRenderer(BaseRenderer):
+    """Рендерер для готового содержимого: байты, собранные представлением, отдаются как есть.
+
+    Нужен, чтобы DRF принял формат при согласовании; ошибки (словари) отдаются в JSON.
+    Подклассы задают только media_type, format и charset.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, bytes):
+            return data
+
+        response = (renderer_context or {}).get('response')
+        if response is not None:
+            response['Content-Type'] = 'application/json'
+        return JSONRenderer().render(data)
+
+
+class PDFRenderer(PassThroughRenderer):
+    """Рендерер для ?format=pdf: PDF отдается представлением напрямую (FileResponse)"""
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    render_style = 'binary'
+
+
+class ICSRenderer(PassThroughRenderer):
+    """iCalendar для лент расписания (.ics / ?format=ics), собранный в timetable_feed.py"""
+    media_type = 'text/calendar'
+    format = 'ics'
+    charset = 'utf-8'
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer на orjson (если установлен) с тем же компактным выводом.
+
+    Типы, которых orjson не знает, кодируются JSONEncoder из DRF. Отступы
+    (браузерный API, indent=...) и отсутствие orjson - обычный JSONRenderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with instrumentation.stage('render'):
+            return self._render(data, accepted_media_type, renderer_context)
+
+    def _render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if orjson is None or self.get_indent(accepted_media_type or '', renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=JSONEncoder().default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+        except TypeError:
+            # Например, ключи словаря не строки - orjson их не принимает
+            return super().render(data, accepted_media_type, renderer_context)
+        # Как JSONRenderer: U+2028 и U+2029 экранируются для совместимости с JavaScript
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+
+
+def _rows(data):
+    """Строки для табличных форматов: список, страница пагинации или один объект"""
+    if isinstance(data, dict) and isinstance(data.get('results'), list):
+        return data['results']
+    if isinstance(data, list):
+        return data
+    return [data]
+
+
+class CSVRenderer(BaseRenderer):
+    """CSV для ?format=csv (списки выгружаются потоком через StreamingExportMixin)"""
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        rows = _rows(data)
+        buffer = io.StringIO()
+        if rows:
+            writer = csv.DictWriter(buffer, fieldnames=list(rows[0].keys()), extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(rows)
+        return buffer.getvalue().encode(self.charset)
+
+
+class NDJSONRenderer(BaseRenderer):
+    """JSON Lines для ?format=ndjson: один объект на строку"""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        return ''.join(
+            json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+            for row in _rows(data)
+        ).encode(self.charset)
@@ -0,0 +1,231 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+from io import BytesIO
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Count, Sum
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+
+from . import instrumentation, metrics
+from .models import Classroom, GradeSummary, SchoolClass, Student, Teacher
+
+
+def _load_classes(class_ids):
+    classes = SchoolClass.objects.annotate(total_students=Count('students')).order_by('id')
+    if class_ids is not None:
+        classes = classes.filter(id__in=class_ids)
+    return list(classes.values_list('id', 'class_name', 'total_students'))
+
+
+def _load_class_teachers(class_ids):
+    # Классный руководитель - первый по id учитель, закрепленный за классом
+    teachers = Teacher.objects.filter(school_class__isnull=False).order_by('id')
+    if class_ids is not None:
+        teachers = teachers.filter(school_class_id__in=class_ids)
+
+    class_teachers = {}
+    for school_class_id, last_name, first_name in teachers.values_list('school_class_id', 'last_name', 'first_name'):
+        class_teachers.setdefault(school_class_id, f"{last_name} {first_name}")
+    return class_teachers
+
+
+def _load_subject_stats(class_ids):
+    # Сводка хранит сумму и количество оценок по четвертям - складываем четверти
+    summaries = GradeSummary.objects.filter(grade_count__gt=0)
+    if class_ids is not None:
+        summaries = summaries.filter(school_class_id__in=class_ids)
+    subjects_stats = summaries.values(
+        'school_class_id', 'subject_id', 'subject__subject_name'
+    ).annotate(
+        grade_sum=Sum('grade_sum'),
+        grades_count=Sum('grade_count')
+    ).order_by('school_class_id', 'subject_id')
+
+    stats_by_class = {}
+    for row in subjects_stats:
+        stats_by_class.setdefault(row['school_class_id'], []).append(row)
+    return stats_by_class
+
+
+# Независимые части отчета об успеваемости: асинхронный отчет загружает их одновременно
+CLASS_PERFORMANCE_LOADERS = (_load_classes, _load_class_teachers, _load_subject_stats)
+
+
+def assemble_class_performance_reports(classes, class_teachers, stats_by_class):
+    reports = {}
+    for school_class_id, class_name, total_students in classes:
+        subjects_data = {}
+        class_total_sum = 0
+        class_total_count = 0
+
+        for row in stats_by_class.get(school_class_id, []):
+            grades_count = row['grades_count']
+            avg_grade = row['grade_sum'] / grades_count
+
+            subjects_data[row['subject__subject_name']] = {
+                'average_grade': round(avg_grade, 2),
+                'grades_count': grades_count
+            }
+
+            class_total_sum += avg_grade * grades_count
+            class_total_count += grades_count
+
+        class_average = round(class_total_sum / class_total_count, 2) if class_total_count > 0 else 0
+
+        reports[school_class_id] = {
+            'class_name': class_name,
+            'class_teacher': class_teachers.get(school_class_id, "Не назначен"),
+            'total_students': total_students,
+            'subjects_data': subjects_data,
+            'class_average': class_average
+        }
+
+    return reports
+
+
+def build_class_performance_reports(class_ids=None):
+    """Отчеты об успеваемости для заданных классов (None - для всех классов).
+
+    Возвращает словарь {id класса: отчет}. Средние считаются по сводке GradeSummary,
+    поэтому число запросов и объем читаемых данных не зависят от количества оценок.
+    """
+    return assemble_class_performance_reports(*(loader(class_ids) for loader in CLASS_PERFORMANCE_LOADERS))
+
+
+def _load_class_names():
+    return list(SchoolClass.objects.order_by('id').values_list('id', 'class_name'))
+
+
+def _load_gender_counts():
+    rows = Student.objects.order_by().values('school_class_id', 'gender').annotate(count=Count('id'))
+    return {(row['school_class_id'], row['gender']): row['count'] for row in rows}
+
+
+GENDER_STATISTICS_LOADERS = (_load_class_names, _load_gender_counts)
+
+
+def assemble_gender_statistics(classes, counts):
+    statistics = []
+    for school_class_id, class_name in classes:
+        boys_count = counts.get((school_class_id, 'M'), 0)
+        girls_count = counts.get((school_class_id, 'F'), 0)
+        statistics.append({
+            'class_name': class_name,
+            'boys_count': boys_count,
+            'girls_count': girls_count,
+            'total_students': boys_count + girls_count
+        })
+    return statistics
+
+
+def build_gender_statistics():
+    """Сколько мальчиков и девочек в каждом классе (два запроса независимо от числа классов)"""
+    return assemble_gender_statistics(*(loader() for loader in GENDER_STATISTICS_LOADERS))
+
+
+def build_classroom_statistics():
+    """Сколько кабинетов в школе для базовых и профильных дисциплин?"""
+    counts = dict(Classroom.objects.order_by().values_list('subject_type').annotate(count=Count('id')))
+    return [
+        {
+            'subject_type': subject_type,
+            'subject_type_display': subject_type_display,
+            'classroom_count': counts.get(subject_type, 0)
+        }
+        for subject_type, subject_type_display in Classroom.SUBJECT_TYPES
+    ]
+
+
+def render_class_report_pdf(report_data):
+    """Генерация PDF отчета об успеваемости класса, возвращает содержимое файла"""
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4)
+    elements = []
+
+    styles = getSampleStyleSheet()
+
+    # Заголовок
+    title = Paragraph(f"Отчет об успеваемости класса {report_data['class_name']}", styles['Title'])
+    elements.append(title)
+    elements.append(Spacer(1, 12))
+
+    # Информация о классе
+    class_info = [
+        f"Классный руководитель: {report_data['class_teacher']}",
+        f"Количество учеников: {report_data['total_students']}",
+        f"Средний балл по классу: {report_data['class_average']}"
+    ]
+
+    for info in class_info:
+        elements.append(Paragraph(info, styles['Normal']))
+
+    elements.append(Spacer(1, 24))
+
+    # Таблица с предметами
+    if report_data['subjects_data']:
+        table_data = [['Предмет', 'Средний балл', 'Количество оценок']]
+
+        for subject, data in report_data['subjects_data'].items():
+            table_data.append([
+                subject,
+                str(data['average_grade']),
+                str(data['grades_count'])
+            ])
+
+        table = Table(table_data)
+        table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 14),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black)
+        ]))
+
+        elements.append(table)
+
+    doc.build(elements)
+    return buffer.getvalue()
+
+
+def report_data_hash(report_data):
+    """Хэш данных отчета: одинаковые данные дают один и тот же PDF"""
+    payload = json.dumps(report_data, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def pdf_artifact_path(data_hash):
+    return Path(settings.REPORT_ARTIFACTS_DIR) / f"{data_hash}.pdf"
+
+
+def get_or_render_pdf(report_data, data_hash=None):
+    """Путь к PDF отчета; файл генерируется только если отчета с такими данными еще нет"""
+    path = pdf_artifact_path(data_hash or report_data_hash(report_data))
+    if path.exists():
+        return path
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    started = time.perf_counter()
+    with instrumentation.stage('pdf'):
+        content = render_class_report_pdf(report_data)
+    metrics.observe('school_pdf_render_duration_seconds', time.perf_counter() - started)
+
+    # Пишем во временный файл и атомарно переименовываем, чтобы не отдать недописанный PDF
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as tmp_file:
+            tmp_file.write(content)
+        os.replace(tmp_name, path)
+    except BaseException:
+        os.unlink(tmp_name)
+        raise
+    return path
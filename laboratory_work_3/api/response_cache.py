@@ -0,0 +1,65 @@
+import hashlib
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import metrics, versions
+
+_stats = defaultdict(lambda: {'hits': 0, 'misses': 0})
+_stats_lock = threading.Lock()
+
+
+def is_enabled():
+    return settings.RESPONSE_CACHE_ENABLED
+
+
+def get_cache():
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def make_key(endpoint, parts, tags):
+    """Ключ ответа: точка входа, параметры запроса и текущие версии меток данных.
+
+    После изменения данных версии меток растут, и старые записи больше не находятся;
+    из кэша они вытесняются по TTL и MAX_ENTRIES.
+    """
+    tag_versions = versions.get_versions(*tags)
+    raw = '|'.join([endpoint, *parts, *(f"{tag}={version}" for tag, version in zip(tags, tag_versions))])
+    return f"response:{endpoint}:{hashlib.sha1(raw.encode()).hexdigest()}"
+
+
+def record(endpoint, hit):
+    with _stats_lock:
+        _stats[endpoint]['hits' if hit else 'misses'] += 1
+    metrics.inc('school_response_cache_requests_total', {'endpoint': endpoint, 'result': 'hit' if hit else 'miss'})
+
+
+def _hit_rate(hits, misses):
+    return round(hits / (hits + misses), 4) if hits + misses else None
+
+
+def get_stats():
+    """Статистика попаданий текущего процесса по точкам входа"""
+    with _stats_lock:
+        endpoints = {endpoint: dict(counters) for endpoint, counters in _stats.items()}
+
+    hits = sum(counters['hits'] for counters in endpoints.values())
+    misses = sum(counters['misses'] for counters in endpoints.values())
+    for counters in endpoints.values():
+        counters['hit_rate'] = _hit_rate(counters['hits'], counters['misses'])
+
+    return {
+        'enabled': is_enabled(),
+        'backend': settings.CACHES[settings.RESPONSE_CACHE_ALIAS]['BACKEND'],
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': _hit_rate(hits, misses),
+        'endpoints': dict(sorted(endpoints.items())),
+    }
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
@@ -0,0 +1,134 @@
+"""Поиск учеников и учителей по фамилии и имени: по началу слов, без учета регистра, с ранжированием.
+
+SQLite - таблицы FTS5 api_student_search / api_teacher_search (rowid = id человека),
+которые поддерживаются триггерами; PostgreSQL - GIN-индекс по to_tsvector('simple', ...).
+Индексы создает миграция 0006_person_search; для других СУБД поиск идет через icontains.
+Каждое слово запроса ищется как начало слова в фамилии или имени, слова объединяются по И.
+"""
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, Q
+from django.db.models.expressions import RawSQL
+
+from .models import Student, Teacher
+
+SEARCH_INDEXES = {
+    Student: 'api_student_search',
+    Teacher: 'api_teacher_search',
+}
+# Фамилия важнее имени при ранжировании (SQLite, bm25)
+LAST_NAME_WEIGHT = 2.0
+MAX_TERMS = 5
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+
+
+def parse_terms(query):
+    """Слова запроса в нижнем регистре, "ё" заменена на "е" (как в индексе); не больше MAX_TERMS"""
+    return re.findall(r'\w+', query.lower().replace('ё', 'е'))[:MAX_TERMS]
+
+
+def _sqlite_match(terms):
+    # Каждое слово - фраза в кавычках с * (поиск по началу слова); кавычки экранируют синтаксис FTS5
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def _postgresql_vector(model):
+    # Должно совпадать с выражением индекса из миграции 0006_person_search
+    table = model._meta.db_table
+    return f"""to_tsvector('simple', translate("{table}"."last_name" || ' ' || "{table}"."first_name", 'Ёё', 'Ее'))"""
+
+
+def _postgresql_query(terms):
+    # В словах только буквы, цифры и _, поэтому спецсимволов tsquery в них нет
+    return ' & '.join(f'{term}:*' for term in terms)
+
+
+def search_condition(model, terms, using='default'):
+    """Условие для filter(): человек подходит под все слова запроса"""
+    vendor = connections[using].vendor
+    table = model._meta.db_table
+    if vendor == 'sqlite':
+        index = SEARCH_INDEXES[model]
+        return RawSQL(
+            f'"{table}"."id" IN (SELECT rowid FROM {index} WHERE {index} MATCH %s)',
+            [_sqlite_match(terms)],
+            output_field=BooleanField()
+        )
+    if vendor == 'postgresql':
+        return RawSQL(
+            f"{_postgresql_vector(model)} @@ to_tsquery('simple', %s)",
+            [_postgresql_query(terms)],
+            output_field=BooleanField()
+        )
+
+    condition = Q()
+    for term in terms:
+        condition &= Q(last_name__icontains=term) | Q(first_name__icontains=term)
+    return condition
+
+
+def filter_queryset(queryset, query):
+    """Фильтр ?search=: сортировка queryset сохраняется"""
+    terms = parse_terms(query)
+    if not terms:
+        return queryset.none()
+    return queryset.filter(search_condition(queryset.model, terms, queryset.db))
+
+
+def ranked_ids(model, terms, limit, using='default'):
+    """Лучшие совпадения: [(id, оценка)] по убыванию оценки"""
+    vendor = connections[using].vendor
+    if vendor == 'sqlite':
+        index = SEARCH_INDEXES[model]
+        # bm25: чем меньше, тем лучше; ранжирование и LIMIT выполняются внутри FTS5
+        sql = (
+            f"SELECT rowid, -bm25({index}, {LAST_NAME_WEIGHT}, 1.0) FROM {index} "
+            f"WHERE {index} MATCH %s ORDER BY bm25({index}, {LAST_NAME_WEIGHT}, 1.0), rowid LIMIT %s"
+        )
+        params = [_sqlite_match(terms), limit]
+    elif vendor == 'postgresql':
+        vector = _postgresql_vector(model)
+        sql = (
+            f"SELECT id, ts_rank({vector}, to_tsquery('simple', %s)) AS score FROM {model._meta.db_table} "
+            f"WHERE {vector} @@ to_tsquery('simple', %s) ORDER BY score DESC, id LIMIT %s"
+        )
+        query = _postgresql_query(terms)
+        params = [query, query, limit]
+    else:
+        ids = model.objects.using(using).filter(search_condition(model, terms, using)).order_by(
+            'last_name', 'first_name', 'id'
+        ).values_list('id', flat=True)[:limit]
+        return [(pk, 0.0) for pk in ids]
+
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, params)
+        return [(pk, float(score)) for pk, score in cursor.fetchall()]
+
+
+def typeahead(query, limit=DEFAULT_LIMIT):
+    """Подсказки для строки поиска: ученики и учителя вместе, лучшие совпадения первыми"""
+    terms = parse_terms(query)
+    if not terms:
+        return []
+
+    results = []
+    for model, kind in ((Student, 'student'), (Teacher, 'teacher')):
+        scores = dict(ranked_ids(model, terms, limit))
+        if not scores:
+            continue
+        people = model.objects.filter(id__in=scores).values('id', 'last_name', 'first_name', 'school_class__class_name')
+        results += [
+            {
+                'type': kind,
+                'id': person['id'],
+                'name': f"{person['last_name']} {person['first_name']}",
+                'class_name': person['school_class__class_name'],
+                'score': round(scores[person['id']], 4),
+            }
+            for person in people
+        ]
+
+    results.sort(key=lambda row: (-row['score'], row['name'], row['type'], row['id']))
+    return results[:limit]
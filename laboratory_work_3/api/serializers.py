@@ -1,9 +1,64 @@
 from rest_framework import serializers
+from rest_framework.reverse import reverse
+
+from . import conflicts, instrumentation
 from .models import *
 from django.db.models import Avg, Count
-
-
-class ClassroomSerializer(serializers.ModelSerializer):
+from rest_framework.permissions import SAFE_METHODS
+
+
+def _param_names(request, name):
+    """Имена из параметра запроса (?fields=a,b или ?fields=a&fields=b); None, если параметра нет"""
+    if name not in request.query_params:
+        return None
+    return [
+        item.strip()
+        for value in request.query_params.getlist(name)
+        for item in value.split(',')
+        if item.strip()
+    ]
+
+
+class DynamicFieldsModelSerializer(serializers.ModelSerializer):
+    """ModelSerializer с выбором полей: ?fields= (только эти), ?omit= (кроме этих)
+    и ?expand= (вложенный объект вместо id связи).
+
+    Параметры передаются аргументами fields/omit/expand, а у сериализатора
+    верхнего уровня при GET берутся из запроса. Неизвестные имена игнорируются.
+    """
+    # Связь -> (класс сериализатора, аргументы) для ?expand=
+    expandable_fields = {}
+
+    def __init__(self, *args, fields=None, omit=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = kwargs.get('context', {}).get('request')
+        if request is not None and request.method in SAFE_METHODS:
+            fields = fields if fields is not None else _param_names(request, 'fields')
+            omit = omit if omit is not None else _param_names(request, 'omit')
+            expand = expand if expand is not None else _param_names(request, 'expand')
+        self._requested_fields = fields
+        self._omitted_fields = omit or ()
+        self._expanded_fields = expand or ()
+
+    def get_fields(self):
+        fields = super().get_fields()
+        for name in self._expanded_fields:
+            if name in self.expandable_fields and name in fields:
+                serializer_class, options = self.expandable_fields[name]
+                fields[name] = serializer_class(read_only=True, **options)
+
+        if self._requested_fields is not None:
+            fields = {name: field for name, field in fields.items() if name in self._requested_fields}
+        for name in self._omitted_fields:
+            fields.pop(name, None)
+        return fields
+
+    def to_representation(self, instance):
+        with instrumentation.stage('serialize'):
+            return super().to_representation(instance)
+
+
+class ClassroomSerializer(DynamicFieldsModelSerializer):
     subject_type_display = serializers.CharField(source='get_subject_type_display', read_only=True)
 
     class Meta:
@@ -11,7 +66,7 @@ class ClassroomSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class SchoolClassSerializer(serializers.ModelSerializer):
+class SchoolClassSerializer(DynamicFieldsModelSerializer):
     class_teacher_name = serializers.SerializerMethodField()
     students_count = serializers.SerializerMethodField()
 
@@ -20,31 +75,49 @@ class SchoolClassSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
     def get_class_teacher_name(self, obj):
-        teacher = obj.class_teacher.first()
+        # Классные руководители подгружаются во viewset через Prefetch(to_attr=...)
+        if hasattr(obj, 'prefetched_class_teachers'):
+            teacher = obj.prefetched_class_teachers[0] if obj.prefetched_class_teachers else None
+        else:
+            teacher = obj.class_teacher.first()
         return f"{teacher.last_name} {teacher.first_name}" if teacher else None
 
     def get_students_count(self, obj):
+        # Количество учеников аннотируется во viewset
+        if hasattr(obj, 'students_count'):
+            return obj.students_count
         return obj.students.count()
 
 
-class TeacherSerializer(serializers.ModelSerializer):
+class TeacherSerializer(DynamicFieldsModelSerializer):
     gender_display = serializers.CharField(source='get_gender_display', read_only=True)
     classroom_number = serializers.CharField(source='classroom.room_number', read_only=True)
     subjects = serializers.SerializerMethodField()
     class_name = serializers.CharField(source='school_class.class_name', read_only=True)
 
+    expandable_fields = {
+        'classroom': (ClassroomSerializer, {}),
+        'school_class': (SchoolClassSerializer, {'fields': ['id', 'class_name']}),
+    }
+
     class Meta:
         model = Teacher
         fields = '__all__'
 
     def get_subjects(self, obj):
+        # Периоды преподавания подгружаются во viewset через Prefetch(to_attr=...)
+        if hasattr(obj, 'prefetched_teaching_periods'):
+            subjects = {}
+            for period in obj.prefetched_teaching_periods:
+                subjects.setdefault(period.subject_id, period.subject.subject_name)
+            return list(subjects.values())
         subjects = Subject.objects.filter(
             teaching_periods__teacher=obj
         ).distinct().values_list('subject_name', flat=True)
         return list(subjects)
 
 
-class SubjectSerializer(serializers.ModelSerializer):
+class SubjectSerializer(DynamicFieldsModelSerializer):
     teachers_count = serializers.SerializerMethodField()
 
     class Meta:
@@ -52,47 +125,124 @@ class SubjectSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
     def get_teachers_count(self, obj):
+        # Количество учителей аннотируется во viewset
+        if hasattr(obj, 'teachers_count'):
+            return obj.teachers_count
         return Teacher.objects.filter(teaching_periods__subject=obj).distinct().count()
 
 
-class TeachingPeriodSerializer(serializers.ModelSerializer):
+class TeachingPeriodSerializer(DynamicFieldsModelSerializer):
     teacher_name = serializers.CharField(source='teacher.__str__', read_only=True)
     subject_name = serializers.CharField(source='subject.subject_name', read_only=True)
     class_name = serializers.CharField(source='school_class.class_name', read_only=True)
 
+    expandable_fields = {
+        'teacher': (TeacherSerializer, {'fields': ['id', 'last_name', 'first_name', 'gender']}),
+        'subject': (SubjectSerializer, {'fields': ['id', 'subject_name', 'weekly_lessons']}),
+        'school_class': (SchoolClassSerializer, {'fields': ['id', 'class_name']}),
+    }
+
     class Meta:
         model = TeachingPeriod
         fields = '__all__'
 
 
-class StudentSerializer(serializers.ModelSerializer):
+class StudentSerializer(DynamicFieldsModelSerializer):
     gender_display = serializers.CharField(source='get_gender_display', read_only=True)
     class_name = serializers.CharField(source='school_class.class_name', read_only=True)
 
+    expandable_fields = {
+        'school_class': (SchoolClassSerializer, {'fields': ['id', 'class_name']}),
+    }
+
     class Meta:
         model = Student
         fields = '__all__'
 
 
-class GradeSerializer(serializers.ModelSerializer):
+class GradeSerializer(DynamicFieldsModelSerializer):
     student_name = serializers.CharField(source='student.__str__', read_only=True)
     subject_name = serializers.CharField(source='subject.subject_name', read_only=True)
 
+    expandable_fields = {
+        'student': (StudentSerializer, {'omit': ['gender_display']}),
+        'subject': (SubjectSerializer, {'fields': ['id', 'subject_name', 'weekly_lessons']}),
+    }
+
     class Meta:
         model = Grade
         fields = '__all__'
 
 
-class ScheduleSerializer(serializers.ModelSerializer):
+class ScheduleSerializer(DynamicFieldsModelSerializer):
     day_of_week_display = serializers.CharField(source='get_day_of_week_display', read_only=True)
     teacher_name = serializers.CharField(source='teacher.__str__', read_only=True)
     subject_name = serializers.CharField(source='subject.subject_name', read_only=True)
     classroom_number = serializers.CharField(source='classroom.room_number', read_only=True)
     class_name = serializers.CharField(source='school_class.class_name', read_only=True)
 
+    expandable_fields = {
+        'school_class': (SchoolClassSerializer, {'fields': ['id', 'class_name']}),
+        'subject': (SubjectSerializer, {'fields': ['id', 'subject_name', 'weekly_lessons']}),
+        'teacher': (TeacherSerializer, {'fields': ['id', 'last_name', 'first_name', 'gender']}),
+        'classroom': (ClassroomSerializer, {}),
+    }
+
     class Meta:
         model = Schedule
         fields = '__all__'
+        # Уникальность слота класса проверяется в validate() вместе с учителем и кабинетом
+        validators = []
+
+    def validate(self, attrs):
+        """Учитель, кабинет и класс не могут быть заняты дважды в один и тот же урок"""
+        attrs = super().validate(attrs)
+
+        def value(field):
+            return attrs[field] if field in attrs else getattr(self.instance, field, None)
+
+        day_of_week, lesson_number = value('day_of_week'), value('lesson_number')
+        if day_of_week is None or lesson_number is None:
+            return attrs
+
+        entry = {
+            'id': self.instance.pk if self.instance else None,
+            'day_of_week': day_of_week,
+            'lesson_number': lesson_number,
+        }
+        for field in conflicts.RESOURCES:
+            related = value(field)
+            entry[field] = related.pk if related is not None else None
+
+        # Один запрос: все уроки этого слота, дальше - проверка в памяти
+        same_slot = Schedule.objects.filter(day_of_week=day_of_week, lesson_number=lesson_number)
+        if self.instance:
+            same_slot = same_slot.exclude(pk=self.instance.pk)
+
+        found = conflicts.check_changes([entry], entries=conflicts.load_entries(same_slot))
+        if found:
+            raise serializers.ValidationError([conflicts.describe(conflict) for conflict in found])
+        return attrs
+
+
+class BackgroundJobSerializer(serializers.ModelSerializer):
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    status_url = serializers.SerializerMethodField()
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = BackgroundJob
+        fields = ['id', 'kind', 'params', 'status', 'status_display', 'result', 'error',
+                  'created_at', 'started_at', 'finished_at', 'status_url', 'download_url']
+        read_only_fields = fields
+
+    def get_status_url(self, obj):
+        return reverse('report-job-detail', kwargs={'pk': obj.pk}, request=self.context.get('request'))
+
+    def get_download_url(self, obj):
+        if obj.status != 'done' or obj.kind != 'class_performance_pdf':
+            return None
+        return reverse('report-job-download', kwargs={'pk': obj.pk}, request=self.context.get('request'))
 
 
 class ClassReportSerializer(serializers.Serializer):
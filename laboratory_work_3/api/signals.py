@@ -0,0 +1,108 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import grade_summary, versions
+from .models import Grade, Student
+
+
+def _grade_state(instance):
+    """Значения оценки на момент загрузки из БД (None, если они неизвестны)"""
+    loaded = getattr(instance, '_loaded_values', None)
+    if not loaded or not {'student_id', 'subject_id', 'quarter', 'grade'} <= loaded.keys():
+        return None
+    return loaded['student_id'], loaded['subject_id'], loaded['quarter'], loaded['grade']
+
+
+def _remember_state(instance):
+    instance._loaded_values = {
+        'student_id': instance.student_id,
+        'subject_id': instance.subject_id,
+        'quarter': instance.quarter,
+        'grade': instance.grade,
+    }
+
+
+@receiver(post_save, sender=Grade)
+def update_summary_on_grade_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+
+    old = None if created else _grade_state(instance)
+    new = (instance.student_id, instance.subject_id, instance.quarter, instance.grade)
+
+    if not created and old is None:
+        # Прежнее значение неизвестно - пересчитываем сводку класса ученика целиком
+        class_id = grade_summary.student_class_ids([instance.student_id]).get(instance.student_id)
+        if class_id is not None:
+            grade_summary.rebuild([class_id])
+        _remember_state(instance)
+        return
+
+    if old == new:
+        return
+
+    student_ids = [new[0]] + ([old[0]] if old else [])
+    class_ids = grade_summary.student_class_ids(student_ids)
+
+    deltas = {}
+    if old:
+        grade_summary.add_grade(deltas, class_ids.get(old[0]), old[1], old[2], old[3], sign=-1)
+    grade_summary.add_grade(deltas, class_ids.get(new[0]), new[1], new[2], new[3])
+    grade_summary.apply_deltas(deltas)
+
+    _remember_state(instance)
+
+
+@receiver(post_delete, sender=Grade)
+def update_summary_on_grade_delete(sender, instance, **kwargs):
+    state = _grade_state(instance) or (instance.student_id, instance.subject_id, instance.quarter, instance.grade)
+    student_id, subject_id, quarter, grade = state
+
+    # При каскадном удалении ученика его строка еще не удалена, класс известен
+    class_id = grade_summary.student_class_ids([student_id]).get(student_id)
+
+    deltas = {}
+    grade_summary.add_grade(deltas, class_id, subject_id, quarter, grade, sign=-1)
+    grade_summary.apply_deltas(deltas)
+
+
+@receiver(post_save, sender=Student)
+@receiver(post_delete, sender=Student)
+def bump_student_class_versions(sender, instance, raw=False, **kwargs):
+    """Версии состава классов ученика (старого и нового). Регистрируется до переноса
+    сводки, который обновляет запомненный класс ученика."""
+    if raw:
+        return
+    loaded = getattr(instance, '_loaded_values', None) or {}
+    class_ids = {instance.school_class_id, loaded.get('school_class_id', instance.school_class_id)}
+    labels = [versions.class_label(Student, school_class_id) for school_class_id in class_ids]
+    transaction.on_commit(lambda: versions.bump(*labels))
+
+
+@receiver(post_save, sender=Student)
+def move_summary_on_student_class_change(sender, instance, created, raw=False, **kwargs):
+    if raw or created:
+        return
+
+    loaded = getattr(instance, '_loaded_values', None) or {}
+    old_class_id = loaded.get('school_class_id', instance.school_class_id)
+
+    if old_class_id != instance.school_class_id:
+        grade_summary.move_student_grades(instance.id, old_class_id, instance.school_class_id)
+
+    loaded['school_class_id'] = instance.school_class_id
+    instance._loaded_values = loaded
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def bump_table_version(sender, raw=False, **kwargs):
+    """Любое изменение модели приложения увеличивает версию ее таблицы.
+
+    Версия меняется после фиксации транзакции: иначе параллельный запрос мог бы
+    запомнить старые данные под новой версией.
+    """
+    if sender._meta.app_label == 'api' and not raw:
+        label = versions.label_for(sender)
+        transaction.on_commit(lambda: versions.bump(label))
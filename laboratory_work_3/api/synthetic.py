@@ -0,0 +1,191 @@
+import random
+from datetime import date
+
+from django.db import connection, transaction
+
+from . import grade_summary, versions
+from .models import (
+    Classroom, SchoolClass, Teacher, Subject, TeachingPeriod, Student, Grade, Schedule, GradeSummary
+)
+from .timetable_generator import generate_timetable, save_timetable
+
+LAST_NAMES = [
+    'Иванов', 'Смирнов', 'Кузнецов', 'Попов', 'Васильев', 'Петров', 'Соколов', 'Михайлов',
+    'Новиков', 'Федоров', 'Морозов', 'Волков', 'Алексеев', 'Лебедев', 'Семенов', 'Егоров',
+    'Павлов', 'Козлов', 'Степанов', 'Николаев', 'Орлов', 'Андреев', 'Макаров', 'Никитин',
+]
+MALE_NAMES = ['Александр', 'Дмитрий', 'Максим', 'Сергей', 'Андрей', 'Алексей', 'Артем', 'Илья', 'Кирилл', 'Михаил']
+FEMALE_NAMES = ['Анна', 'Мария', 'Елена', 'Дарья', 'Алина', 'Ирина', 'Екатерина', 'Ольга', 'Полина', 'Виктория']
+
+# (название, уроков в неделю, профильный кабинет)
+SUBJECTS = [
+    ('Математика', 5, False),
+    ('Русский язык', 4, False),
+    ('Литература', 3, False),
+    ('Английский язык', 3, False),
+    ('История', 2, False),
+    ('Обществознание', 1, False),
+    ('География', 2, False),
+    ('Биология', 2, True),
+    ('Физика', 2, True),
+    ('Химия', 2, True),
+    ('Информатика', 1, True),
+    ('Физическая культура', 3, True),
+]
+
+BATCH_SIZE = 5000
+
+
+def _person(rng, index):
+    gender = 'M' if rng.random() < 0.5 else 'F'
+    last_name = LAST_NAMES[index % len(LAST_NAMES)]
+    if gender == 'F':
+        last_name += 'а'
+    first_name = rng.choice(MALE_NAMES if gender == 'M' else FEMALE_NAMES)
+    return last_name, first_name, gender
+
+
+def _bump_all_versions():
+    """bulk-операции не отправляют сигналы - версии таблиц и классов увеличиваем сами"""
+    versions.bump(
+        *(versions.label_for(model) for model in (
+            Grade, GradeSummary, Schedule, TeachingPeriod, Student, Teacher, Subject, Classroom, SchoolClass
+        )),
+        versions.class_label(Student, '*'),
+        versions.class_label(GradeSummary, '*'),
+    )
+
+
+def clear_school():
+    """Удаляет все данные школы (пользователи не затрагиваются).
+
+    Таблицы очищаются одним DELETE без загрузки объектов и сигналов, поэтому сводка
+    оценок пересчитывается, а версии таблиц увеличиваются здесь же.
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            # Сначала зависимые таблицы, затем те, на которые они ссылаются
+            for model in (Grade, GradeSummary, Schedule, TeachingPeriod, Student, Teacher, Subject, Classroom, SchoolClass):
+                cursor.execute(f"DELETE FROM {connection.ops.quote_name(model._meta.db_table)}")
+        grade_summary.rebuild()
+    _bump_all_versions()
+
+
+def seed_school(classes=30, students_per_class=25, teachers=None, subjects=len(SUBJECTS),
+                quarters=4, timetable=True, seed=0, log=None):
+    """Заполняет пустую БД синтетической школой с помощью bulk-операций.
+
+    Возвращает словарь с количеством созданных объектов.
+    """
+    rng = random.Random(seed)
+    log = log or (lambda message: None)
+    subjects_spec = (SUBJECTS * (subjects // len(SUBJECTS) + 1))[:subjects]
+    teachers = teachers or max(classes * 2, subjects)
+    school_year = (date(date.today().year - 1, 9, 1), date(date.today().year + 1, 5, 31))
+
+    with transaction.atomic():
+        school_classes = SchoolClass.objects.bulk_create([
+            SchoolClass(class_name=f"{5 + index % 7}-{index // 7 + 1}") for index in range(classes)
+        ])
+
+        subject_objects = Subject.objects.bulk_create([
+            Subject(
+                subject_name=name if index < len(SUBJECTS) else f"{name} {index // len(SUBJECTS) + 1}",
+                weekly_lessons=weekly_lessons
+            )
+            for index, (name, weekly_lessons, _) in enumerate(subjects_spec)
+        ])
+
+        # Кабинетов чуть больше, чем классов; профильные - под профильные предметы
+        profile_share = sum(1 for *_, profile in subjects_spec if profile) / len(subjects_spec)
+        rooms_count = max(classes + classes // 4, 1)
+        classrooms = Classroom.objects.bulk_create([
+            Classroom(
+                room_number=str(100 + index),
+                subject_type='profile' if index >= rooms_count * (1 - profile_share) else 'basic'
+            )
+            for index in range(rooms_count)
+        ])
+        basic_rooms = [room for room in classrooms if room.subject_type == 'basic']
+        profile_rooms = [room for room in classrooms if room.subject_type == 'profile']
+
+        # Учителя распределены по предметам; каждому предмету - хотя бы один учитель
+        teacher_subjects = [index % len(subject_objects) for index in range(teachers)]
+        teacher_objects = []
+        for index in range(teachers):
+            last_name, first_name, gender = _person(rng, index)
+            profile = subjects_spec[teacher_subjects[index]][2]
+            rooms = profile_rooms if profile and profile_rooms else basic_rooms or classrooms
+            teacher_objects.append(Teacher(
+                last_name=last_name,
+                first_name=first_name,
+                gender=gender,
+                school_class=school_classes[index] if index < classes else None,
+                classroom=rooms[index % len(rooms)] if index < len(classrooms) else None,
+            ))
+        teacher_objects = Teacher.objects.bulk_create(teacher_objects)
+        log(f"Классы: {classes}, предметы: {len(subject_objects)}, кабинеты: {len(classrooms)}, учителя: {teachers}")
+
+        teachers_by_subject = {}
+        for teacher, subject_index in zip(teacher_objects, teacher_subjects):
+            teachers_by_subject.setdefault(subject_index, []).append(teacher)
+
+        periods = []
+        for class_index, school_class in enumerate(school_classes):
+            for subject_index, subject in enumerate(subject_objects):
+                candidates = teachers_by_subject[subject_index]
+                periods.append(TeachingPeriod(
+                    teacher=candidates[class_index % len(candidates)],
+                    subject=subject,
+                    school_class=school_class,
+                    start_date=school_year[0],
+                    end_date=school_year[1],
+                ))
+        TeachingPeriod.objects.bulk_create(periods, batch_size=BATCH_SIZE)
+
+        students = []
+        for school_class in school_classes:
+            for index in range(students_per_class):
+                last_name, first_name, gender = _person(rng, rng.randrange(len(LAST_NAMES)))
+                students.append(Student(last_name=last_name, first_name=first_name, gender=gender, school_class=school_class))
+        students = Student.objects.bulk_create(students, batch_size=BATCH_SIZE)
+        log(f"Ученики: {len(students)}")
+
+        grades_count = 0
+        batch = []
+        for student in students:
+            # У каждого ученика свой "уровень", чтобы распределение было правдоподобным
+            level = rng.choice((3, 4, 4, 5))
+            for subject in subject_objects:
+                for quarter in range(1, quarters + 1):
+                    grade = min(5, max(2, level + rng.choice((-1, 0, 0, 0, 1))))
+                    batch.append(Grade(student=student, subject=subject, quarter=quarter, grade=grade))
+            if len(batch) >= BATCH_SIZE:
+                Grade.objects.bulk_create(batch)
+                grades_count += len(batch)
+                batch = []
+        if batch:
+            Grade.objects.bulk_create(batch)
+            grades_count += len(batch)
+        log(f"Оценки: {grades_count}")
+
+        grade_summary.rebuild()
+
+    lessons_count = 0
+    if timetable:
+        result = generate_timetable(seed=seed)
+        save_timetable(result['lessons'])
+        lessons_count = len(result['lessons'])
+        log(f"Уроки в расписании: {lessons_count}, не размещено: {len(result['unplaced'])}")
+
+    _bump_all_versions()
+
+    return {
+        'classes': classes,
+        'subjects': len(subject_objects),
+        'classrooms': len(classrooms),
+        'teachers': teachers,
+        'students': len(students),
+        'grades': grades_count,
+        'lessons': lessons_count,
+    }
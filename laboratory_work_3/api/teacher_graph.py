@@ -0,0 +1,125 @@
+import threading
+from collections import defaultdict
+
+from . import versions
+from .models import Subject, Teacher, TeachingPeriod
+
+# Таблицы, от которых зависит граф (включая имена учителей и предметов в ответах)
+GRAPH_MODELS = (TeachingPeriod, Teacher, Subject)
+# Сколько графов на разные даты хранится одновременно
+GRAPH_CACHE_SIZE = 16
+
+
+class TeacherSubjectGraph:
+    """Двудольный граф учитель - предмет по периодам преподавания в памяти процесса.
+
+    Смежность хранится множествами в обе стороны, поэтому учителя тех же предметов,
+    кандидаты на замену и пересечение предметов считаются операциями над
+    множествами, без запросов к БД.
+    """
+
+    def __init__(self, version, periods, teacher_names, subject_names):
+        self.version = version
+        self.teacher_names = teacher_names
+        self.subject_names = subject_names
+        self.teacher_subjects = defaultdict(set)
+        self.subject_teachers = defaultdict(set)
+        self.class_teachers = defaultdict(set)
+        self.class_subject_teachers = defaultdict(set)
+
+        for teacher_id, subject_id, school_class_id in periods:
+            self.teacher_subjects[teacher_id].add(subject_id)
+            self.subject_teachers[subject_id].add(teacher_id)
+            self.class_teachers[school_class_id].add(teacher_id)
+            self.class_subject_teachers[(school_class_id, subject_id)].add(teacher_id)
+
+    def same_subject_teachers(self, teacher_id):
+        """id учителей, у которых есть хотя бы один общий предмет с учителем"""
+        teachers = set()
+        for subject_id in self.teacher_subjects.get(teacher_id, ()):
+            teachers |= self.subject_teachers[subject_id]
+        teachers.discard(teacher_id)
+        return teachers
+
+    def subject_overlap(self, teacher_id):
+        """Учителя с общими предметами и мера пересечения (коэффициент Жаккара), по убыванию"""
+        subjects = self.teacher_subjects.get(teacher_id, set())
+        overlap = []
+        for other_id in self.same_subject_teachers(teacher_id):
+            other_subjects = self.teacher_subjects[other_id]
+            shared = subjects & other_subjects
+            overlap.append({
+                **self.teacher_row(other_id),
+                'shared_subjects': sorted(self.subject_names[subject_id] for subject_id in shared),
+                'score': round(len(shared) / len(subjects | other_subjects), 3),
+            })
+        overlap.sort(key=lambda row: (-row['score'], row['teacher_name'], row['teacher']))
+        return overlap
+
+    def substitutes(self, subject_id, school_class_id):
+        """Кандидаты на замену по предмету в классе: ведут этот предмет, но не в этом классе.
+
+        Первыми идут учителя, которые уже работают с классом по другим предметам.
+        """
+        candidates = self.subject_teachers.get(subject_id, set()) - self.class_subject_teachers.get(
+            (school_class_id, subject_id), set()
+        )
+        class_teachers = self.class_teachers.get(school_class_id, set())
+        rows = [
+            {**self.teacher_row(teacher_id), 'teaches_class': teacher_id in class_teachers}
+            for teacher_id in candidates
+        ]
+        rows.sort(key=lambda row: (not row['teaches_class'], row['teacher_name'], row['teacher']))
+        return rows
+
+    def teacher_row(self, teacher_id):
+        return {'teacher': teacher_id, 'teacher_name': self.teacher_names[teacher_id]}
+
+
+_graphs = {}
+_graphs_lock = threading.Lock()
+
+
+def current_version():
+    return versions.get_versions(*(versions.label_for(model) for model in GRAPH_MODELS))
+
+
+def build_graph(version, on_date=None):
+    periods = TeachingPeriod.objects.order_by()
+    if on_date is not None:
+        periods = periods.filter(start_date__lte=on_date, end_date__gte=on_date)
+
+    teacher_names = {
+        teacher_id: f"{last_name} {first_name}"
+        for teacher_id, last_name, first_name in Teacher.objects.values_list('id', 'last_name', 'first_name')
+    }
+    subject_names = dict(Subject.objects.values_list('id', 'subject_name'))
+    return TeacherSubjectGraph(
+        version,
+        periods.values_list('teacher_id', 'subject_id', 'school_class_id').distinct(),
+        teacher_names,
+        subject_names
+    )
+
+
+def get_graph(on_date=None):
+    """Граф по всем периодам преподавания или по действующим на дату on_date.
+
+    Перестраивается лениво, когда меняется версия таблиц (любая запись в периоды
+    преподавания, учителей или предметы).
+    """
+    version = current_version()
+    graph = _graphs.get(on_date)
+    if graph is not None and graph.version == version:
+        return graph
+
+    with _graphs_lock:
+        graph = _graphs.get(on_date)
+        if graph is None or graph.version != version:
+            graph = build_graph(version, on_date)
+            _graphs.pop(on_date, None)
+            if len(_graphs) >= GRAPH_CACHE_SIZE:
+                # Вытесняется граф, построенный раньше всех
+                _graphs.pop(next(iter(_graphs)))
+            _graphs[on_date] = graph
+        return graph
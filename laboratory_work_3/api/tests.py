@@ -0,0 +1,263 @@
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from api import grade_summary
+from api.models import Classroom, Grade, GradeSummary, Schedule, SchoolClass, Student, Subject, Teacher
+
+# Версии таблиц и кэш ответов - в памяти процесса, а не в файлах рабочего кэша
+TEST_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-default'},
+    'versions': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-versions'},
+    'responses': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-responses'},
+}
+
+
+@override_settings(CACHES=TEST_CACHES)
+class SchoolAPITestCase(APITestCase):
+    """Небольшая школа: два класса, два предмета, по два ученика в классе"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('deputy', password='deputy')
+        cls.class_a = SchoolClass.objects.create(class_name='5-1')
+        cls.class_b = SchoolClass.objects.create(class_name='5-2')
+        cls.math = Subject.objects.create(subject_name='Математика', weekly_lessons=5)
+        cls.physics = Subject.objects.create(subject_name='Физика', weekly_lessons=2)
+        cls.students = [
+            Student.objects.create(last_name=f'Иванов{index}', first_name='Иван', gender='M', school_class=school_class)
+            for index, school_class in enumerate([cls.class_a, cls.class_a, cls.class_b, cls.class_b])
+        ]
+
+    def setUp(self):
+        for alias in TEST_CACHES:
+            caches[alias].clear()
+        self.client.force_authenticate(self.user)
+
+    def write(self, method, url, data=None, **kwargs):
+        """Запрос на изменение с выполнением on_commit (версии таблиц увеличиваются после фиксации)"""
+        with self.captureOnCommitCallbacks(execute=True):
+            return getattr(self.client, method)(url, data, format=kwargs.pop('format', 'json'), **kwargs)
+
+    def assertNoSummaryDrift(self):
+        # То же, что rebuild_grade_summary --check
+        self.assertEqual(grade_summary.find_drift(), {})
+
+
+class GradeBulkTests(SchoolAPITestCase):
+    url = '/api/grades/bulk/'
+
+    def test_partial_success(self):
+        student = self.students[0]
+        Grade.objects.create(student=student, subject=self.math, quarter=1, grade=3)
+
+        response = self.write('post', self.url, [
+            {'student': student.id, 'subject': self.math.id, 'quarter': 1, 'grade': 5},
+            {'student': student.id, 'subject': self.math.id, 'quarter': 2, 'grade': 4},
+            {'student': student.id, 'subject': self.math.id, 'quarter': 3, 'grade': 7},
+            {'student': 999999, 'subject': self.math.id, 'quarter': 1, 'grade': 4},
+        ])
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(response.data['updated'], 1)
+        self.assertEqual(response.data['failed'], 2)
+        self.assertEqual([error['row'] for error in response.data['errors']], [3, 4])
+        self.assertEqual(
+            dict(Grade.objects.filter(student=student).values_list('quarter', 'grade')),
+            {1: 5, 2: 4}
+        )
+        self.assertNoSummaryDrift()
+
+    def test_invalid_rows(self):
+        response = self.write('post', self.url, [
+            {'student': self.students[0].id, 'subject': self.math.id, 'quarter': 5, 'grade': 4},
+            {'student': self.students[0].id, 'subject': self.math.id, 'grade': 4},
+            'не объект',
+        ])
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['created'], 0)
+        self.assertEqual(response.data['failed'], 3)
+        self.assertIn('quarter', response.data['errors'][0]['errors'])
+        self.assertIn('quarter', response.data['errors'][1]['errors'])
+        self.assertFalse(Grade.objects.exists())
+
+    def test_values_are_not_coerced(self):
+        response = self.write('post', self.url, [
+            {'student': self.students[0].id, 'subject': self.math.id, 'quarter': 1, 'grade': 4.9},
+            {'student': self.students[0].id, 'subject': self.math.id, 'quarter': True, 'grade': 4},
+            {'student': self.students[0].id, 'subject': self.math.id, 'quarter': '2', 'grade': 4.0},
+        ])
+
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(
+            {error['row']: set(error['errors']) for error in response.data['errors']},
+            {1: {'grade'}, 2: {'quarter'}}
+        )
+        self.assertEqual(Grade.objects.get().quarter, 2)
+
+    def test_csv(self):
+        student = self.students[0]
+        body = (
+            'student,subject,quarter,grade\n'
+            f'{student.id},{self.math.id},1,5\n'
+            '\n'
+            f'{student.id},{self.physics.id},1,4.5\n'
+        ).encode() + f'{student.id},{self.physics.id},2,Пять\n'.encode('cp1251')
+
+        response = self.write('post', self.url, body, content_type='text/csv', format=None)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual([error['row'] for error in response.data['errors']], [2, 3])
+        self.assertNoSummaryDrift()
+
+    def test_csv_without_valid_header(self):
+        response = self.write('post', self.url, b'\xff\xfestudent', content_type='text/csv', format=None)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('error', response.data)
+
+
+class GradeSummaryTests(SchoolAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        for quarter, student in enumerate(self.students, start=1):
+            self.write('post', '/api/grades/', {
+                'student': student.id, 'subject': self.math.id, 'quarter': quarter % 4 + 1, 'grade': 4
+            })
+
+    def test_grade_create(self):
+        self.assertEqual(GradeSummary.objects.count(), 4)
+        self.assertNoSummaryDrift()
+
+    def test_grade_edit(self):
+        grade = Grade.objects.first()
+        response = self.write('patch', f'/api/grades/{grade.id}/', {'grade': 2})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNoSummaryDrift()
+
+        response = self.write('patch', f'/api/grades/{grade.id}/', {'quarter': 4, 'subject': self.physics.id})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNoSummaryDrift()
+
+    def test_grade_delete(self):
+        grade = Grade.objects.first()
+        response = self.write('delete', f'/api/grades/{grade.id}/')
+
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertNoSummaryDrift()
+
+    def test_student_class_move(self):
+        student = self.students[0]
+        response = self.write('patch', f'/api/students/{student.id}/', {'school_class': self.class_b.id})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNoSummaryDrift()
+
+    def test_student_delete(self):
+        response = self.write('delete', f'/api/students/{self.students[0].id}/')
+
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertNoSummaryDrift()
+
+
+class ConditionalGetTests(SchoolAPITestCase):
+
+    def test_not_modified_until_write(self):
+        url = '/api/grades/'
+        response = self.client.get(url)
+        etag = response['ETag']
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.write('post', url, {'student': self.students[0].id, 'subject': self.math.id, 'quarter': 1, 'grade': 5})
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['count'], 1)
+
+    def test_bulk_upsert_changes_etag(self):
+        url = '/api/grades/'
+        etag = self.client.get(url)['ETag']
+
+        self.write('post', '/api/grades/bulk/', [
+            {'student': self.students[0].id, 'subject': self.math.id, 'quarter': 1, 'grade': 5},
+        ])
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+    @override_settings(RESPONSE_CACHE_ENABLED=True)
+    def test_response_cache_invalidated_by_write(self):
+        url = '/api/classrooms/'
+        self.assertEqual(self.client.get(url).json()['count'], 0)
+        # Повторный запрос - из кэша, без обращения к БД
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).json()['count'], 0)
+
+        self.write('post', url, {'room_number': '101', 'subject_type': 'basic'})
+
+        self.assertEqual(self.client.get(url).json()['count'], 1)
+
+
+class ScheduleConflictTests(SchoolAPITestCase):
+    url = '/api/schedules/'
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.teacher = Teacher.objects.create(last_name='Петров', first_name='Петр', gender='M')
+        cls.other_teacher = Teacher.objects.create(last_name='Сидорова', first_name='Анна', gender='F')
+        cls.room = Classroom.objects.create(room_number='101', subject_type='basic')
+        cls.other_room = Classroom.objects.create(room_number='102', subject_type='basic')
+        cls.lesson = Schedule.objects.create(
+            school_class=cls.class_a, subject=cls.math, teacher=cls.teacher, classroom=cls.room,
+            day_of_week=1, lesson_number=1
+        )
+
+    def lesson_data(self, **changes):
+        data = {
+            'school_class': self.class_b.id, 'subject': self.physics.id, 'teacher': self.other_teacher.id,
+            'classroom': self.other_room.id, 'day_of_week': 1, 'lesson_number': 1,
+        }
+        data.update(changes)
+        return data
+
+    def assertConflict(self, response, resource):
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        errors = response.data['non_field_errors']
+        self.assertEqual(len(errors), 1)
+        self.assertTrue(errors[0].startswith(resource), errors)
+
+    def test_free_slot(self):
+        response = self.write('post', self.url, self.lesson_data())
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_teacher_conflict(self):
+        self.assertConflict(self.write('post', self.url, self.lesson_data(teacher=self.teacher.id)), 'Учитель')
+
+    def test_classroom_conflict(self):
+        self.assertConflict(self.write('post', self.url, self.lesson_data(classroom=self.room.id)), 'Кабинет')
+
+    def test_update_keeps_own_slot(self):
+        response = self.write('patch', f'{self.url}{self.lesson.id}/', {'subject': self.physics.id})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_update_into_busy_slot(self):
+        other = Schedule.objects.create(
+            school_class=self.class_b, subject=self.physics, teacher=self.other_teacher, classroom=self.other_room,
+            day_of_week=2, lesson_number=1
+        )
+        response = self.write('patch', f'{self.url}{other.id}/', {'day_of_week': 1, 'classroom': self.room.id})
+
+        self.assertConflict(response, 'Кабинет')
@@ -0,0 +1,90 @@
+import threading
+from collections import defaultdict
+from datetime import time
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import versions
+from .models import Schedule, SchoolClass, Subject, Teacher, Classroom
+
+# Таблицы, от которых зависят данные индекса (включая имена в сериализованных уроках)
+TIMETABLE_MODELS = (Schedule, SchoolClass, Subject, Teacher, Classroom)
+
+
+class TimetableIndex:
+    """Индекс расписания в памяти процесса.
+
+    Хранит уже сериализованные уроки, поэтому поиск по (класс, день, урок),
+    (учитель, день, урок) и (кабинет, день, урок) не обращается к БД.
+    """
+
+    def __init__(self, version, lessons):
+        self.version = version
+        self.lessons = lessons
+        self.by_class = defaultdict(list)
+        self.by_teacher = defaultdict(list)
+        self.by_classroom = defaultdict(list)
+        # Готовые ленты расписания (см. timetable_feed.py) - живут, пока жив индекс
+        self.feeds = {}
+
+        for lesson in lessons:
+            slot = (lesson['day_of_week'], lesson['lesson_number'])
+            self.by_class[(lesson['school_class'], *slot)].append(lesson)
+            self.by_teacher[(lesson['teacher'], *slot)].append(lesson)
+            self.by_classroom[(lesson['classroom'], *slot)].append(lesson)
+
+    def for_class(self, class_id, day_of_week, lesson_number):
+        return self.by_class.get((class_id, day_of_week, lesson_number), [])
+
+    def for_teacher(self, teacher_id, day_of_week, lesson_number):
+        return self.by_teacher.get((teacher_id, day_of_week, lesson_number), [])
+
+    def for_classroom(self, classroom_id, day_of_week, lesson_number):
+        return self.by_classroom.get((classroom_id, day_of_week, lesson_number), [])
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def current_version():
+    return versions.get_versions(*(versions.label_for(model) for model in TIMETABLE_MODELS))
+
+
+def build_index(version):
+    from .serializers import ScheduleSerializer
+
+    schedules = Schedule.objects.select_related('school_class', 'subject', 'teacher', 'classroom').order_by(
+        'day_of_week', 'lesson_number', 'id'
+    )
+    lessons = [dict(lesson) for lesson in ScheduleSerializer(schedules, many=True).data]
+    return TimetableIndex(version, lessons)
+
+
+def get_index():
+    """Индекс расписания; перестраивается лениво, когда меняется версия таблиц"""
+    global _index
+    version = current_version()
+    index = _index
+    if index is not None and index.version == version:
+        return index
+
+    with _index_lock:
+        if _index is None or _index.version != version:
+            _index = build_index(version)
+        return _index
+
+
+def current_slot(now=None):
+    """(день недели, номер урока) для текущего момента или None вне уроков"""
+    now = timezone.localtime(now)
+    day_of_week = now.isoweekday()
+    if day_of_week > len(Schedule.DAYS_OF_WEEK):
+        return None
+
+    current = now.time()
+    for lesson_number, (start, end) in enumerate(settings.LESSON_BELLS, start=1):
+        if time.fromisoformat(start) <= current < time.fromisoformat(end):
+            return day_of_week, lesson_number
+    return None
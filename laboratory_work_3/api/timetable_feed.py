@@ -0,0 +1,218 @@
+"""Расписание класса, учителя или кабинета на неделю: сетка "день x урок" в JSON и календарь iCalendar.
+
+Обе формы строятся из индекса расписания (timetable.get_index) и расписания звонков
+LESSON_BELLS и запоминаются в самом индексе: пока версия расписания не изменилась,
+повторные запросы (календари опрашивают ленту регулярно) не обращаются к БД и
+ничего не пересчитывают.
+"""
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import timetable
+from .models import Classroom, Schedule, SchoolClass, Teacher
+
+# Вид ленты: (модель, поле урока с id владельца, имя владельца по объекту)
+FEED_KINDS = {
+    'class': (SchoolClass, 'school_class', lambda school_class: school_class.class_name),
+    'teacher': (Teacher, 'teacher', str),
+    'classroom': (Classroom, 'classroom', lambda classroom: f"Кабинет {classroom.room_number}"),
+}
+ICS_PRODID = '-//School//Timetable//RU'
+# Как часто календарю перепроверять ленту (подсказка клиенту; проверка дешевая - 304 по ETag)
+ICS_REFRESH_INTERVAL = 'PT1H'
+ICS_LINE_LENGTH = 75
+# На сколько лет вперед описывать переходы часового пояса в VTIMEZONE
+ICS_TIMEZONE_YEARS = 5
+
+
+def _lesson_cell(lesson):
+    """Урок в ячейке сетки: только то, что нужно для показа"""
+    return {
+        'id': lesson['id'],
+        'subject': lesson['subject_name'],
+        'teacher': lesson['teacher_name'],
+        'classroom': lesson['classroom_number'],
+        'class_name': lesson['class_name'],
+    }
+
+
+def build_week_grid(kind, owner_id, owner_name, lessons):
+    """Сетка на неделю: days[день].lessons[урок] - список уроков в этом слоте (обычно 0 или 1)"""
+    bells = settings.LESSON_BELLS
+    grid = {day: [[] for _ in bells] for day, _ in Schedule.DAYS_OF_WEEK}
+    for lesson in lessons:
+        row = grid.get(lesson['day_of_week'])
+        if row is not None and 1 <= lesson['lesson_number'] <= len(bells):
+            row[lesson['lesson_number'] - 1].append(_lesson_cell(lesson))
+
+    return {
+        'kind': kind,
+        'id': owner_id,
+        'name': owner_name,
+        'bells': [
+            {'lesson_number': number, 'start': start, 'end': end}
+            for number, (start, end) in enumerate(bells, start=1)
+        ],
+        'days': [
+            {'day_of_week': day, 'day_name': day_name, 'lessons': grid[day]}
+            for day, day_name in Schedule.DAYS_OF_WEEK
+        ],
+    }
+
+
+def _ics_text(value):
+    """Экранирование текстового значения iCalendar (RFC 5545, 3.3.11)"""
+    return str(value).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def _ics_fold(line):
+    """Перенос строки длиннее 75 байт; символы UTF-8 не разрываются"""
+    parts = []
+    current, size = '', 0
+    for char in line:
+        length = len(char.encode())
+        # Строки продолжения начинаются с пробела, он тоже занимает байт
+        if size + length > ICS_LINE_LENGTH - (1 if parts else 0):
+            parts.append(current)
+            current, size = '', 0
+        current += char
+        size += length
+    parts.append(current)
+    return '\r\n '.join(parts)
+
+
+def _ics_offset(offset):
+    """Смещение от UTC в виде +HHMM (или +HHMMSS)"""
+    seconds = int(offset.total_seconds())
+    sign = '-' if seconds < 0 else '+'
+    hours, rest = divmod(abs(seconds), 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f'{sign}{hours:02}{minutes:02}' + (f'{seconds:02}' if seconds else '')
+
+
+def _zone_transitions(zone, start, end):
+    """Моменты (UTC) смены смещения часового пояса между start и end"""
+    step = timedelta(days=1)
+    moment = start
+    while moment < end:
+        following = moment + step
+        if moment.astimezone(zone).utcoffset() != following.astimezone(zone).utcoffset():
+            # Переход внутри суток - уточняем делением пополам до минуты
+            low, high = moment, following
+            while high - low > timedelta(minutes=1):
+                middle = low + (high - low) / 2
+                if middle.astimezone(zone).utcoffset() == low.astimezone(zone).utcoffset():
+                    low = middle
+                else:
+                    high = middle
+            yield high.replace(second=0, microsecond=0)
+        moment = following
+
+
+def _ics_timezone(tzid, monday):
+    """Компонент VTIMEZONE для TZID событий (RFC 5545, 3.6.5).
+
+    Смещения берутся из базы часовых поясов: действующее на начало недели расписания
+    и переходы на ICS_TIMEZONE_YEARS лет вперед.
+    """
+    zone = timezone.get_default_timezone()
+    start = datetime.combine(monday, time(), tzinfo=zone).astimezone(dt_timezone.utc)
+    end = start.replace(year=start.year + ICS_TIMEZONE_YEARS)
+
+    def observance(moment, offset_from):
+        local = moment.astimezone(zone)
+        kind = 'DAYLIGHT' if local.dst() else 'STANDARD'
+        return [
+            f'BEGIN:{kind}',
+            # Начало правила - местное время по прежнему смещению
+            f'DTSTART:{(moment + offset_from).replace(tzinfo=None):%Y%m%dT%H%M%S}',
+            f'TZOFFSETFROM:{_ics_offset(offset_from)}',
+            f'TZOFFSETTO:{_ics_offset(local.utcoffset())}',
+            f'TZNAME:{_ics_text(local.tzname())}',
+            f'END:{kind}',
+        ]
+
+    offset = start.astimezone(zone).utcoffset()
+    lines = ['BEGIN:VTIMEZONE', f'TZID:{tzid}'] + observance(start, offset)
+    for moment in _zone_transitions(zone, start, end):
+        lines += observance(moment, offset)
+        offset = moment.astimezone(zone).utcoffset()
+    lines.append('END:VTIMEZONE')
+    return lines
+
+
+def timetable_week(version):
+    """Понедельник недели, в которую расписание изменилось последний раз.
+
+    От этой недели повторяются события календаря: дата зависит только от версии
+    расписания, поэтому лента не меняется без изменения ETag.
+    """
+    changed = timezone.localdate(datetime.fromtimestamp(max(version) / 10 ** 9, tz=dt_timezone.utc))
+    return changed - timedelta(days=changed.weekday())
+
+
+def build_ics(owner_name, lessons, version):
+    """Календарь: каждый урок - еженедельно повторяющееся событие по расписанию звонков"""
+    bells = settings.LESSON_BELLS
+    monday = timetable_week(version)
+    stamp = datetime.fromtimestamp(max(version) / 10 ** 9, tz=dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    tzid = settings.TIME_ZONE
+
+    lines = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        f'PRODID:{ICS_PRODID}',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        'X-WR-CALNAME:' + _ics_text(f"Расписание: {owner_name}"),
+        f'X-WR-TIMEZONE:{tzid}',
+        f'REFRESH-INTERVAL;VALUE=DURATION:{ICS_REFRESH_INTERVAL}',
+        f'X-PUBLISHED-TTL:{ICS_REFRESH_INTERVAL}',
+    ]
+    lines += _ics_timezone(tzid, monday)
+    for lesson in lessons:
+        if not 1 <= lesson['lesson_number'] <= len(bells):
+            continue
+        start, end = bells[lesson['lesson_number'] - 1]
+        day = monday + timedelta(days=lesson['day_of_week'] - 1)
+        lines += [
+            'BEGIN:VEVENT',
+            f"UID:schedule-{lesson['id']}@school",
+            f'DTSTAMP:{stamp}',
+            f"DTSTART;TZID={tzid}:{datetime.combine(day, time.fromisoformat(start)):%Y%m%dT%H%M%S}",
+            f"DTEND;TZID={tzid}:{datetime.combine(day, time.fromisoformat(end)):%Y%m%dT%H%M%S}",
+            'RRULE:FREQ=WEEKLY',
+            f"SUMMARY:{_ics_text(lesson['subject_name'])}",
+            'LOCATION:' + _ics_text(f"Кабинет {lesson['classroom_number']}"),
+            'DESCRIPTION:' + _ics_text(f"Учитель: {lesson['teacher_name']}\nКласс: {lesson['class_name']}"),
+            'END:VEVENT',
+        ]
+    lines.append('END:VCALENDAR')
+    return ('\r\n'.join(_ics_fold(line) for line in lines) + '\r\n').encode()
+
+
+def get_feed(kind, owner_id, feed_format):
+    """Сетка (словарь) или календарь (байты) владельца; None, если владельца нет.
+
+    Результат хранится в индексе расписания и живет, пока не изменится его версия.
+    """
+    index = timetable.get_index()
+    key = (kind, owner_id, feed_format)
+    feed = index.feeds.get(key)
+    if feed is not None:
+        return feed
+
+    model, field, name = FEED_KINDS[kind]
+    owner = model.objects.filter(pk=owner_id).first()
+    if owner is None:
+        return None
+
+    lessons = [lesson for lesson in index.lessons if lesson[field] == owner_id]
+    if feed_format == 'ics':
+        feed = build_ics(name(owner), lessons, index.version)
+    else:
+        feed = build_week_grid(kind, owner_id, name(owner), lessons)
+    index.feeds[key] = feed
+    return feed
@@ -0,0 +1,205 @@
+import random
+import time
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import versions
+from .models import Classroom, Schedule, Subject, Teacher, TeachingPeriod
+
+DAYS = len(Schedule.DAYS_OF_WEEK)
+LESSONS_PER_DAY = 8
+SLOTS = DAYS * LESSONS_PER_DAY
+ALL_SLOTS = (1 << SLOTS) - 1
+
+
+def slot_index(day_of_week, lesson_number):
+    return (day_of_week - 1) * LESSONS_PER_DAY + (lesson_number - 1)
+
+
+def slot_position(index):
+    """(день недели, номер урока) по номеру слота"""
+    return index // LESSONS_PER_DAY + 1, index % LESSONS_PER_DAY + 1
+
+
+class TimetableProblem:
+    """Исходные данные генератора: нагрузка по классам и кабинеты"""
+
+    def __init__(self, on_date=None):
+        on_date = on_date or timezone.localdate()
+
+        # Действующие назначения; если предмет в классе ведут несколько учителей,
+        # берется назначение с самой поздней датой начала
+        teachers_by_pair = {}
+        for school_class_id, subject_id, teacher_id in TeachingPeriod.objects.filter(
+            start_date__lte=on_date,
+            end_date__gte=on_date
+        ).order_by('start_date', 'id').values_list('school_class_id', 'subject_id', 'teacher_id'):
+            teachers_by_pair[(school_class_id, subject_id)] = teacher_id
+
+        weekly_lessons = dict(Subject.objects.values_list('id', 'weekly_lessons'))
+        self.teacher_rooms = dict(Teacher.objects.filter(classroom__isnull=False).values_list('id', 'classroom_id'))
+
+        self.rooms = list(Classroom.objects.order_by('id').values_list('id', 'subject_type'))
+        self.room_bits = {room_id: 1 << position for position, (room_id, _) in enumerate(self.rooms)}
+        rooms_by_type = defaultdict(int)
+        for room_id, subject_type in self.rooms:
+            rooms_by_type[subject_type] |= self.room_bits[room_id]
+        self.all_rooms = sum(self.room_bits.values())
+
+        # Тип кабинета для предмета - самый частый тип закрепленных кабинетов его учителей
+        room_types = defaultdict(Counter)
+        room_type_by_id = dict(self.rooms)
+        for (_, subject_id), teacher_id in teachers_by_pair.items():
+            room_id = self.teacher_rooms.get(teacher_id)
+            if room_id is not None:
+                room_types[subject_id][room_type_by_id[room_id]] += 1
+        self.subject_rooms = {
+            subject_id: rooms_by_type[counter.most_common(1)[0][0]]
+            for subject_id, counter in room_types.items()
+        }
+
+        self.lessons = [
+            (school_class_id, subject_id, teacher_id)
+            for (school_class_id, subject_id), teacher_id in sorted(teachers_by_pair.items())
+            for _ in range(weekly_lessons.get(subject_id, 0))
+        ]
+
+
+class TimetableGenerator:
+    """Жадная раскладка уроков по слотам с занятостью в битовых масках.
+
+    Для каждого учителя, класса и слота хранится целое число, биты которого -
+    занятые слоты (или кабинеты), поэтому проверка свободного времени - одна
+    битовая операция. Уроки раскладываются от самых загруженных учителей;
+    при неудаче выполняется повтор с другим случайным порядком.
+    """
+
+    def __init__(self, problem, seed=0, attempts=20):
+        self.problem = problem
+        self.seed = seed
+        self.attempts = attempts
+
+    def generate(self):
+        started = time.monotonic()
+        best = None
+
+        for attempt in range(self.attempts):
+            placed, unplaced = self._attempt(random.Random(self.seed + attempt))
+            if best is None or len(unplaced) < len(best[1]):
+                best = (placed, unplaced)
+            if not unplaced:
+                break
+
+        placed, unplaced = best or ([], [])
+        return {
+            'lessons': placed,
+            'unplaced': [
+                {'school_class': school_class_id, 'subject': subject_id, 'teacher': teacher_id}
+                for school_class_id, subject_id, teacher_id in unplaced
+            ],
+            'attempts': attempt + 1 if self.attempts else 0,
+            'seconds': round(time.monotonic() - started, 3),
+        }
+
+    def _attempt(self, rng):
+        problem = self.problem
+        teacher_busy = defaultdict(int)
+        class_busy = defaultdict(int)
+        rooms_busy = [0] * SLOTS
+        class_day_load = defaultdict(lambda: [0] * DAYS)
+        subject_days = defaultdict(int)
+
+        teacher_load = Counter(teacher_id for _, _, teacher_id in problem.lessons)
+        lessons = list(problem.lessons)
+        rng.shuffle(lessons)
+        lessons.sort(key=lambda lesson: -teacher_load[lesson[2]])
+
+        placed = []
+        unplaced = []
+
+        for school_class_id, subject_id, teacher_id in lessons:
+            free = ALL_SLOTS & ~teacher_busy[teacher_id] & ~class_busy[school_class_id]
+            day_load = class_day_load[school_class_id]
+            days_with_subject = subject_days[(school_class_id, subject_id)]
+
+            candidates = []
+            while free:
+                bit = free & -free
+                index = bit.bit_length() - 1
+                free ^= bit
+                day = index // LESSONS_PER_DAY
+                lesson = index % LESSONS_PER_DAY
+                candidates.append((
+                    bool(days_with_subject >> day & 1),  # тот же предмет уже есть в этот день
+                    lesson != day_load[day],              # урок не продолжает день класса (окно)
+                    day_load[day],                        # равномерная нагрузка по дням
+                    lesson,
+                    rng.random(),
+                    index,
+                ))
+            candidates.sort()
+
+            for *_, index in candidates:
+                room_id = self._pick_room(teacher_id, subject_id, rooms_busy[index])
+                if room_id is None:
+                    continue
+
+                bit = 1 << index
+                teacher_busy[teacher_id] |= bit
+                class_busy[school_class_id] |= bit
+                rooms_busy[index] |= problem.room_bits[room_id]
+                day_load[index // LESSONS_PER_DAY] += 1
+                subject_days[(school_class_id, subject_id)] |= 1 << (index // LESSONS_PER_DAY)
+
+                day_of_week, lesson_number = slot_position(index)
+                placed.append({
+                    'school_class': school_class_id,
+                    'subject': subject_id,
+                    'teacher': teacher_id,
+                    'classroom': room_id,
+                    'day_of_week': day_of_week,
+                    'lesson_number': lesson_number,
+                })
+                break
+            else:
+                unplaced.append((school_class_id, subject_id, teacher_id))
+
+        return placed, unplaced
+
+    def _pick_room(self, teacher_id, subject_id, busy_rooms):
+        """Закрепленный кабинет учителя, иначе свободный кабинет подходящего типа, иначе любой"""
+        problem = self.problem
+        own_room = problem.teacher_rooms.get(teacher_id)
+        if own_room is not None and not busy_rooms & problem.room_bits[own_room]:
+            return own_room
+
+        for mask in (problem.subject_rooms.get(subject_id, 0), problem.all_rooms):
+            free = mask & ~busy_rooms
+            if free:
+                return problem.rooms[(free & -free).bit_length() - 1][0]
+        return None
+
+
+def generate_timetable(on_date=None, seed=0, attempts=20):
+    return TimetableGenerator(TimetableProblem(on_date), seed=seed, attempts=attempts).generate()
+
+
+def save_timetable(lessons):
+    """Атомарно заменяет расписание сгенерированным"""
+    with transaction.atomic():
+        Schedule.objects.all().delete()
+        Schedule.objects.bulk_create([
+            Schedule(
+                school_class_id=lesson['school_class'],
+                subject_id=lesson['subject'],
+                teacher_id=lesson['teacher'],
+                classroom_id=lesson['classroom'],
+                day_of_week=lesson['day_of_week'],
+                lesson_number=lesson['lesson_number'],
+            )
+            for lesson in lessons
+        ], batch_size=1000)
+        # bulk_create не отправляет сигналы - версию таблицы расписания увеличиваем сами
+        transaction.on_commit(lambda: versions.bump(versions.label_for(Schedule)))
@@ -15,6 +15,13 @@ router.register(r'schedules', views.ScheduleViewSet)
 urlpatterns = [
     path('', include(router.urls)),
     path('reports/', views.ReportView.as_view(), name='reports'),
+    path('reports/async/', views.AsyncReportView.as_view(), name='reports-async'),
+    path('reports/analytics/', views.GradeAnalyticsView.as_view(), name='grade-analytics'),
+    path('reports/jobs/', views.ReportJobListView.as_view(), name='report-job-list'),
+    path('reports/jobs/<uuid:pk>/', views.ReportJobDetailView.as_view(), name='report-job-detail'),
+    path('reports/jobs/<uuid:pk>/download/', views.ReportJobDownloadView.as_view(), name='report-job-download'),
+    path('search/', views.SearchView.as_view(), name='search'),
+    path('cache/stats/', views.CacheStatsView.as_view(), name='cache-stats'),
     path('auth/', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
 ]
\ No newline at end of file
@@ -0,0 +1,59 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+def _cache():
+    return caches[settings.TABLE_VERSIONS_CACHE]
+
+
+def _key(label):
+    return f"table-version:{label}"
+
+
+def label_for(model):
+    """Метка версии для модели, например 'api.schedule'"""
+    return model._meta.label_lower
+
+
+def class_label(model, school_class_id):
+    """Метка данных модели в пределах одного класса, например 'api.grade:class=5'.
+
+    Метка class_label(model, '*') увеличивается массовыми операциями, которые
+    не отслеживают затронутые классы, поэтому от нее зависят все классы.
+    """
+    return f"{label_for(model)}:class={school_class_id}"
+
+
+def bump(*labels):
+    """Увеличивает версии меток после изменения данных.
+
+    Версия - время изменения в наносекундах (но всегда больше предыдущей),
+    поэтому по ней же можно отдавать Last-Modified.
+    """
+    cache = _cache()
+    now = time.time_ns()
+    current = cache.get_many([_key(label) for label in labels])
+    cache.set_many({
+        _key(label): max(now, current.get(_key(label), 0) + 1)
+        for label in labels
+    }, timeout=None)
+
+
+def get_versions(*labels):
+    """Текущие версии меток (кортеж в том же порядке).
+
+    Если версии нет (кэш очищен), она заводится заново текущим временем -
+    это гарантированно отличается от всех ранее выданных версий.
+    """
+    cache = _cache()
+    keys = [_key(label) for label in labels]
+    found = cache.get_many(keys)
+
+    for key in keys:
+        if key not in found:
+            cache.add(key, time.time_ns(), timeout=None)
+            found[key] = cache.get(key)
+
+    return tuple(found[key] for key in keys)
@@ -1,85 +1,221 @@
+import asyncio
+import hmac
+from datetime import date
+
+from asgiref.sync import sync_to_async
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import viewsets, generics, status
+from rest_framework import exceptions, serializers, viewsets, generics, status
+from rest_framework.request import Request
+from rest_framework.views import APIView
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Count, Avg, Q
-from django.http import HttpResponse
-import json
-from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib import colors
-from io import BytesIO
+from rest_framework.settings import api_settings
+from django.db.models import Count, Avg, Q, Prefetch
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import FileResponse, HttpResponse, HttpResponseForbidden
+from django.views import View
+from django.utils import timezone
 
 from .models import *
 from .serializers import *
 from .permissions import IsDeputyDirector
+from .renderers import FastJSONRenderer, ICSRenderer, PDFRenderer
+from .pagination import OptionalCursorPagination
+from .mixins import ConditionalGetMixin, FastListMixin, ResponseCacheMixin, SparseFieldsMixin, StreamingExportMixin
+from .fastpath import choice_display, date_value, datetime_value, person_name, student_name
+from .timetable_generator import generate_timetable, save_timetable
+from .bulk import iter_csv_rows, upsert_grades
+from .reports import (
+    CLASS_PERFORMANCE_LOADERS, GENDER_STATISTICS_LOADERS, assemble_class_performance_reports,
+    assemble_gender_statistics, build_class_performance_reports, build_classroom_statistics,
+    build_gender_statistics, get_or_render_pdf, pdf_artifact_path, report_data_hash
+)
+from . import (
+    analytics, conflicts, instrumentation, jobs, metrics, rankings, response_cache, search, teacher_graph, timetable,
+    timetable_feed, versions
+)
 from .filters import *
 
 
-class ClassroomViewSet(viewsets.ModelViewSet):
-    queryset = Classroom.objects.all()
+QUARTER_ERROR = "quarter должна быть числом от 1 до 4"
+
+
+def _quarter_param(query_params):
+    """Четверть из ?quarter=; None - за весь год. ValueError, если значение неверное"""
+    value = query_params.get('quarter')
+    if not value:
+        return None
+    quarter = int(value)
+    if not 1 <= quarter <= 4:
+        raise ValueError(value)
+    return quarter
+
+
+def _date_param(query_params):
+    """Дата из ?date=; None - не задана. ValueError, если формат неверный"""
+    value = query_params.get('date')
+    return date.fromisoformat(value) if value else None
+
+
+class ClassroomViewSet(ResponseCacheMixin, ConditionalGetMixin, FastListMixin, SparseFieldsMixin,
+                       viewsets.ModelViewSet):
+    queryset = Classroom.objects.all().order_by('id')
     serializer_class = ClassroomSerializer
     permission_classes = [IsAuthenticated, IsDeputyDirector]
     filter_backends = [DjangoFilterBackend]
     filterset_class = ClassroomFilter
+    fast_list_fields = {
+        'id': 'id',
+        'subject_type_display': (choice_display(Classroom.SUBJECT_TYPES), 'subject_type'),
+        'room_number': 'room_number',
+        'subject_type': 'subject_type',
+    }
 
 
-class SchoolClassViewSet(viewsets.ModelViewSet):
-    queryset = SchoolClass.objects.all().annotate(
-        students_count=Count('students')
-    )
+class SchoolClassViewSet(ConditionalGetMixin, SparseFieldsMixin, viewsets.ModelViewSet):
+    queryset = SchoolClass.objects.all()
     serializer_class = SchoolClassSerializer
     permission_classes = [IsAuthenticated, IsDeputyDirector]
     filter_backends = [DjangoFilterBackend]
     filterset_class = SchoolClassFilter
+    etag_models = (SchoolClass, Teacher, Student)
+    etag_action_models = {
+        'ranking': (SchoolClass, Student, Grade),
+    }
+    field_annotations = {
+        'students_count': {'students_count': Count('students')},
+    }
+    field_prefetch_related = {
+        'class_teacher_name': [
+            Prefetch('class_teacher', queryset=Teacher.objects.order_by('id'), to_attr='prefetched_class_teachers')
+        ],
+    }
 
+    @action(detail=True, methods=['get'])
+    def ranking(self, request, pk=None):
+        """Рейтинг учеников класса за четверть (?quarter=) или за год: средний балл, место и двойки"""
+        try:
+            quarter = _quarter_param(request.query_params)
+        except ValueError:
+            return Response(
+                {"error": QUARTER_ERROR},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-class TeacherViewSet(viewsets.ModelViewSet):
-    queryset = Teacher.objects.all().prefetch_related('teaching_periods__subject')
+        # Класс не загружается отдельно: существование проверяется, только если рейтинг пуст
+        rows = []
+        if pk.isdigit():
+            rows = list(rankings.ranking_values(rankings.ranked_students(quarter).filter(school_class_id=pk)))
+        if not rows and not (pk.isdigit() and SchoolClass.objects.filter(pk=pk).exists()):
+            return Response(
+                {"error": "Класс не найден"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        return Response([rankings.ranking_row(row) for row in rows])
+
+
+class TeacherViewSet(ConditionalGetMixin, SparseFieldsMixin, viewsets.ModelViewSet):
+    queryset = Teacher.objects.all()
     serializer_class = TeacherSerializer
     permission_classes = [IsAuthenticated, IsDeputyDirector]
     filter_backends = [DjangoFilterBackend]
     filterset_class = TeacherFilter
+    etag_models = (Teacher, Classroom, SchoolClass, TeachingPeriod, Subject)
+    field_select_related = {
+        'classroom_number': ['classroom'],
+        'class_name': ['school_class'],
+    }
+    field_prefetch_related = {
+        'subjects': [
+            Prefetch(
+                'teaching_periods',
+                queryset=TeachingPeriod.objects.select_related('subject').order_by('id'),
+                to_attr='prefetched_teaching_periods'
+            )
+        ],
+    }
+
+    def _graph_or_error(self):
+        """Граф учитель - предмет (на дату ?date=, если задана) или ответ с ошибкой"""
+        try:
+            return teacher_graph.get_graph(_date_param(self.request.query_params)), None
+        except ValueError:
+            return None, Response(
+                {"error": "date должна быть в формате ГГГГ-ММ-ДД"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+    def _graph_teacher(self, graph, pk):
+        """id учителя из URL, если такой учитель есть в графе, иначе None"""
+        return int(pk) if pk.isdigit() and int(pk) in graph.teacher_names else None
 
     @action(detail=True, methods=['get'])
     def same_subject_teachers(self, request, pk=None):
-        """Список учителей, преподающих те же предметы, что и учитель, ведущий информатику в заданном классе"""
-        try:
-            teacher = self.get_object()
-            # Получаем предметы, которые преподает данный учитель
-            teacher_subjects = Subject.objects.filter(
-                teaching_periods__teacher=teacher
-            ).distinct()
-
-            # Находим учителей информатики
-            informatics = Subject.objects.filter(subject_name__icontains='информатик').first()
-
-            if not informatics:
-                return Response({"error": "Предмет 'Информатика' не найден"},
-                                status=status.HTTP_404_NOT_FOUND)
-
-            # Находим учителей, преподающих те же предметы
-            same_subject_teachers = Teacher.objects.filter(
-                teaching_periods__subject__in=teacher_subjects
-            ).distinct().exclude(id=teacher.id)
-
-            serializer = self.get_serializer(same_subject_teachers, many=True)
-            return Response(serializer.data)
-        except Teacher.DoesNotExist:
+        """Учителя, преподающие хотя бы один из предметов учителя (?date= - по периодам на дату)"""
+        graph, error = self._graph_or_error()
+        if error:
+            return error
+
+        teacher_id = self._graph_teacher(graph, pk)
+        if teacher_id is None:
             return Response({"error": "Учитель не найден"},
                             status=status.HTTP_404_NOT_FOUND)
 
+        # Учителя находятся пересечением множеств в памяти, из БД читаются только их данные
+        same_subject_teachers = self.get_queryset().filter(
+            id__in=graph.same_subject_teachers(teacher_id)
+        ).order_by('id')
+        serializer = self.get_serializer(same_subject_teachers, many=True)
+        return Response(serializer.data)
 
-class SubjectViewSet(viewsets.ModelViewSet):
-    queryset = Subject.objects.all().annotate(
-        teachers_count=Count('teaching_periods__teacher', distinct=True)
-    )
+    @action(detail=True, methods=['get'])
+    def subject_overlap(self, request, pk=None):
+        """Учителя с общими предметами: общие предметы и доля пересечения (от 0 до 1)"""
+        graph, error = self._graph_or_error()
+        if error:
+            return error
+
+        teacher_id = self._graph_teacher(graph, pk)
+        if teacher_id is None:
+            return Response({"error": "Учитель не найден"},
+                            status=status.HTTP_404_NOT_FOUND)
+        return Response(graph.subject_overlap(teacher_id))
+
+    @action(detail=False, methods=['get'])
+    def substitutes(self, request):
+        """Кандидаты на замену учителя предмета subject_id в классе class_id"""
+        graph, error = self._graph_or_error()
+        if error:
+            return error
+
+        try:
+            subject_id = int(request.query_params['subject_id'])
+            school_class_id = int(request.query_params['class_id'])
+        except (KeyError, ValueError):
+            return Response(
+                {"error": "Необходимо указать subject_id и class_id"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if subject_id not in graph.subject_names:
+            return Response({"error": "Предмет не найден"},
+                            status=status.HTTP_404_NOT_FOUND)
+        return Response(graph.substitutes(subject_id, school_class_id))
+
+
+class SubjectViewSet(ResponseCacheMixin, ConditionalGetMixin, SparseFieldsMixin, viewsets.ModelViewSet):
+    queryset = Subject.objects.all()
     serializer_class = SubjectSerializer
     permission_classes = [IsAuthenticated, IsDeputyDirector]
     filter_backends = [DjangoFilterBackend]
     filterset_class = SubjectFilter
+    etag_models = (Subject, TeachingPeriod)
+    field_annotations = {
+        'teachers_count': {'teachers_count': Count('teaching_periods__teacher', distinct=True)},
+    }
 
     @action(detail=False, methods=['get'])
     def teachers_count(self, request):
@@ -87,88 +223,411 @@ class SubjectViewSet(viewsets.ModelViewSet):
         subjects = self.get_queryset()
         data = []
         for subject in subjects:
-            teachers_count = Teacher.objects.filter(
-                teaching_periods__subject=subject
-            ).distinct().count()
             data.append({
                 'subject': subject.subject_name,
-                'teachers_count': teachers_count
+                'teachers_count': subject.teachers_count
             })
         return Response(data)
 
 
-class TeachingPeriodViewSet(viewsets.ModelViewSet):
-    queryset = TeachingPeriod.objects.all().select_related('teacher', 'subject', 'school_class')
+class TeachingPeriodViewSet(ConditionalGetMixin, FastListMixin, SparseFieldsMixin, viewsets.ModelViewSet):
+    queryset = TeachingPeriod.objects.all().order_by('id')
     serializer_class = TeachingPeriodSerializer
     permission_classes = [IsAuthenticated, IsDeputyDirector]
     filter_backends = [DjangoFilterBackend]
     filterset_class = TeachingPeriodFilter
-
-
-class StudentViewSet(viewsets.ModelViewSet):
-    queryset = Student.objects.all().select_related('school_class')
+    pagination_class = OptionalCursorPagination
+    etag_models = (TeachingPeriod, Teacher, Subject, SchoolClass)
+    field_select_related = {
+        'teacher_name': ['teacher'],
+        'subject_name': ['subject'],
+        'class_name': ['school_class'],
+    }
+    fast_list_fields = {
+        'id': 'id',
+        'teacher_name': (person_name, 'teacher__last_name', 'teacher__first_name'),
+        'subject_name': 'subject__subject_name',
+        'class_name': 'school_class__class_name',
+        'start_date': (date_value, 'start_date'),
+        'end_date': (date_value, 'end_date'),
+        'teacher': 'teacher_id',
+        'subject': 'subject_id',
+        'school_class': 'school_class_id',
+    }
+
+
+class StudentViewSet(ConditionalGetMixin, StreamingExportMixin, FastListMixin, SparseFieldsMixin,
+                     viewsets.ModelViewSet):
+    queryset = Student.objects.all().order_by('id')
     serializer_class = StudentSerializer
     permission_classes = [IsAuthenticated, IsDeputyDirector]
     filter_backends = [DjangoFilterBackend]
     filterset_class = StudentFilter
+    pagination_class = OptionalCursorPagination
+    etag_models = (Student, SchoolClass)
+    etag_action_models = {
+        'at_risk': (Student, SchoolClass, Grade),
+    }
+    field_select_related = {
+        'class_name': ['school_class'],
+    }
+    export_fields = ('id', 'last_name', 'first_name', 'gender', 'school_class_id', 'school_class__class_name')
+    fast_list_fields = {
+        'id': 'id',
+        'gender_display': (choice_display(Student.GENDER_CHOICES), 'gender'),
+        'class_name': 'school_class__class_name',
+        'last_name': 'last_name',
+        'first_name': 'first_name',
+        'gender': 'gender',
+        'school_class': 'school_class_id',
+    }
+
+    @property
+    def cursor_ordering(self):
+        return rankings.RANKING_ORDERING if self.action == 'at_risk' else None
+
+    @action(detail=False, methods=['get'])
+    def at_risk(self, request):
+        """Ученики с двойками за четверть (?quarter=) или за год по всей школе или классу (?school_class=)"""
+        try:
+            quarter = _quarter_param(request.query_params)
+            school_class = request.query_params.get('school_class')
+            school_class = int(school_class) if school_class else None
+        except ValueError:
+            return Response(
+                {"error": f"{QUARTER_ERROR}, school_class - числом"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        students = rankings.at_risk_students(quarter)
+        if school_class is not None:
+            students = students.filter(school_class_id=school_class)
+
+        page = self.paginate_queryset(rankings.ranking_values(students))
+        return self.get_paginated_response([rankings.ranking_row(row) for row in page])
 
 
-class GradeViewSet(viewsets.ModelViewSet):
-    queryset = Grade.objects.all().select_related('student', 'subject')
+class GradeViewSet(ConditionalGetMixin, StreamingExportMixin, FastListMixin, SparseFieldsMixin,
+                   viewsets.ModelViewSet):
+    queryset = Grade.objects.all().order_by('id')
     serializer_class = GradeSerializer
     permission_classes = [IsAuthenticated, IsDeputyDirector]
     filter_backends = [DjangoFilterBackend]
     filterset_class = GradeFilter
+    pagination_class = OptionalCursorPagination
+    etag_models = (Grade, Student, SchoolClass, Subject)
+    field_select_related = {
+        'student_name': ['student__school_class'],
+        'subject_name': ['subject'],
+    }
+    # Вложенный ученик выводит название класса
+    expand_select_related = {
+        'student': ['student__school_class'],
+    }
+    export_fields = (
+        'id', 'student_id', 'student__last_name', 'student__first_name', 'student__school_class__class_name',
+        'subject_id', 'subject__subject_name', 'quarter', 'grade', 'date_created', 'date_modified'
+    )
+    fast_list_fields = {
+        'id': 'id',
+        'student_name': (
+            student_name, 'student__last_name', 'student__first_name', 'student__school_class__class_name'
+        ),
+        'subject_name': 'subject__subject_name',
+        'quarter': 'quarter',
+        'grade': 'grade',
+        'date_created': (datetime_value, 'date_created'),
+        'date_modified': (datetime_value, 'date_modified'),
+        'student': 'student_id',
+        'subject': 'subject_id',
+    }
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        """Массовая загрузка оценок (JSON-массив или CSV) с обновлением существующих"""
+        if request.content_type.startswith('text/csv'):
+            # Пустое тело: DRF не создает поток (request.stream is None)
+            if request.stream is None:
+                return Response(
+                    {"error": "Пустой CSV: ожидается заголовок student,subject,quarter,grade и строки оценок"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            try:
+                rows = iter_csv_rows(request.stream)
+            except ValueError as exc:
+                return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            rows = request.data
+            if not isinstance(rows, list):
+                return Response(
+                    {"error": "Ожидается JSON-массив оценок или CSV (Content-Type: text/csv)"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
 
+        return Response(upsert_grades(rows))
 
-class ScheduleViewSet(viewsets.ModelViewSet):
-    queryset = Schedule.objects.all().select_related(
-        'school_class', 'subject', 'teacher', 'classroom'
-    )
+
+class ScheduleViewSet(ResponseCacheMixin, ConditionalGetMixin, StreamingExportMixin, FastListMixin,
+                      SparseFieldsMixin, viewsets.ModelViewSet):
+    queryset = Schedule.objects.all().order_by('day_of_week', 'lesson_number', 'id')
     serializer_class = ScheduleSerializer
     permission_classes = [IsAuthenticated, IsDeputyDirector]
     filter_backends = [DjangoFilterBackend]
     filterset_class = ScheduleFilter
+    pagination_class = OptionalCursorPagination
+    etag_models = timetable.TIMETABLE_MODELS
+    # Без day_of_week и lesson_number ответ зависит от текущего времени
+    etag_exempt_actions = ('teacher_current_lesson', 'classroom_current_lesson')
+    field_select_related = {
+        'teacher_name': ['teacher'],
+        'subject_name': ['subject'],
+        'classroom_number': ['classroom'],
+        'class_name': ['school_class'],
+    }
+    export_fields = (
+        'id', 'school_class_id', 'school_class__class_name', 'day_of_week', 'lesson_number',
+        'subject_id', 'subject__subject_name', 'teacher_id', 'teacher__last_name', 'teacher__first_name',
+        'classroom_id', 'classroom__room_number'
+    )
+    fast_list_fields = {
+        'id': 'id',
+        'day_of_week_display': (choice_display(Schedule.DAYS_OF_WEEK), 'day_of_week'),
+        'teacher_name': (person_name, 'teacher__last_name', 'teacher__first_name'),
+        'subject_name': 'subject__subject_name',
+        'classroom_number': 'classroom__room_number',
+        'class_name': 'school_class__class_name',
+        'day_of_week': 'day_of_week',
+        'lesson_number': 'lesson_number',
+        'school_class': 'school_class_id',
+        'subject': 'subject_id',
+        'teacher': 'teacher_id',
+        'classroom': 'classroom_id',
+    }
+
+    def _int_params(self, *names):
+        """Целочисленные параметры запроса; None, если какой-то не указан или не число"""
+        try:
+            return [int(self.request.query_params[name]) for name in names]
+        except (KeyError, ValueError):
+            return None
+
+    def _lessons_response(self, lessons):
+        if not lessons:
+            return Response(
+                {"message": "Урок не найден"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        if len(lessons) == 1:
+            return Response(lessons[0])
+        return Response(lessons)
+
+    def _slot_params(self):
+        """День и урок из запроса или, если они не указаны, текущий урок по расписанию звонков.
+
+        ValueError, если указан только один из параметров или значение не число.
+        """
+        if 'day_of_week' in self.request.query_params or 'lesson_number' in self.request.query_params:
+            slot = self._int_params('day_of_week', 'lesson_number')
+            if slot is None:
+                raise ValueError('day_of_week, lesson_number')
+            return slot
+        return timetable.current_slot()
+
+    def _current_lessons_response(self, lookup, owner_id):
+        """Уроки учителя или кабинета (lookup - метод индекса) в слоте из запроса или в текущем слоте"""
+        try:
+            slot = self._slot_params()
+        except ValueError:
+            return Response(
+                {"error": "day_of_week и lesson_number указываются вместе и должны быть числами"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if slot is None:
+            return Response(
+                {"message": "Сейчас нет уроков"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        return self._lessons_response(getattr(timetable.get_index(), lookup)(owner_id, *slot))
 
     @action(detail=False, methods=['get'])
     def get_lesson(self, request):
         """Какой предмет будет в заданном классе, в заданный день недели на заданном уроке?"""
-        class_id = request.query_params.get('class_id')
-        day_of_week = request.query_params.get('day_of_week')
-        lesson_number = request.query_params.get('lesson_number')
+        params = self._int_params('class_id', 'day_of_week', 'lesson_number')
 
-        if not all([class_id, day_of_week, lesson_number]):
+        if params is None:
             return Response(
                 {"error": "Необходимо указать class_id, day_of_week и lesson_number"},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        try:
-            schedule = Schedule.objects.get(
-                school_class_id=class_id,
-                day_of_week=day_of_week,
-                lesson_number=lesson_number
-            )
-            serializer = self.get_serializer(schedule)
-            return Response(serializer.data)
-        except Schedule.DoesNotExist:
+        return self._lessons_response(timetable.get_index().for_class(*params))
+
+    @action(detail=False, methods=['get'], url_path=r'feed/(?P<kind>class|teacher|classroom)/(?P<owner_id>\d+)',
+            renderer_classes=api_settings.DEFAULT_RENDERER_CLASSES + [ICSRenderer])
+    def feed(self, request, kind, owner_id, format=None):
+        """Расписание класса, учителя или кабинета на неделю: сетка "день x урок" (JSON) или календарь (.ics)"""
+        feed_format = 'ics' if request.accepted_renderer.format == 'ics' else 'json'
+        feed = timetable_feed.get_feed(kind, int(owner_id), feed_format)
+        if feed is None:
             return Response(
-                {"message": "Урок не найден"},
+                {"error": "Владелец расписания не найден"},
                 status=status.HTTP_404_NOT_FOUND
             )
-        except Schedule.MultipleObjectsReturned:
-            schedules = Schedule.objects.filter(
-                school_class_id=class_id,
-                day_of_week=day_of_week,
-                lesson_number=lesson_number
+
+        response = Response(feed)
+        if feed_format == 'ics':
+            response['Content-Disposition'] = f'inline; filename="{kind}-{owner_id}.ics"'
+        return response
+
+    @action(detail=False, methods=['get', 'post'])
+    def conflicts(self, request):
+        """Конфликты всего расписания (GET) или пакета предлагаемых изменений (POST)"""
+        if request.method == 'GET':
+            return Response(conflicts.find_conflicts(conflicts.load_entries()))
+
+        message = "Ожидается JSON-массив уроков с полями school_class, teacher, classroom, day_of_week, lesson_number"
+        changes = request.data
+        if not isinstance(changes, list):
+            return Response({"error": message}, status=status.HTTP_400_BAD_REQUEST)
+
+        entries = conflicts.load_entries()
+        changes, errors = conflicts.parse_changes(changes, {entry['id'] for entry in entries})
+        if errors:
+            return Response({"error": message, "errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(conflicts.check_changes(changes, entries))
+
+    @action(detail=False, methods=['post'])
+    def generate(self, request):
+        """Фоновая генерация расписания; статус - по ссылке status_url"""
+        error = "Ожидается объект: date в формате ГГГГ-ММ-ДД, seed - число, allow_partial - true/false"
+        if not isinstance(request.data, dict):
+            return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            on_date = request.data.get('date')
+            on_date = date.fromisoformat(on_date) if on_date else None
+            seed = int(request.data.get('seed', 0))
+            # Из формы приходит строка: bool("false") был бы True
+            allow_partial = serializers.BooleanField().to_internal_value(request.data.get('allow_partial', False))
+        except (TypeError, ValueError, exceptions.ValidationError):
+            return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+
+        job = BackgroundJob.objects.create(
+            kind='timetable',
+            params={
+                'date': on_date.isoformat() if on_date else None,
+                'seed': seed,
+                'allow_partial': allow_partial,
+            },
+            created_by=request.user
+        )
+        jobs.submit(job, _generate_timetable_job)
+        return Response(BackgroundJobSerializer(job, context=self.get_serializer_context()).data,
+                        status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=False, methods=['get'])
+    def teacher_current_lesson(self, request):
+        """Какой урок сейчас (или в заданный день и урок) у заданного учителя?"""
+        params = self._int_params('teacher_id')
+        if params is None:
+            return Response(
+                {"error": "Необходимо указать teacher_id"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return self._current_lessons_response('for_teacher', params[0])
+
+    @action(detail=False, methods=['get'])
+    def classroom_current_lesson(self, request):
+        """Какой урок сейчас (или в заданный день и урок) идет в заданном кабинете?"""
+        params = self._int_params('classroom_id')
+        if params is None:
+            return Response(
+                {"error": "Необходимо указать classroom_id"},
+                status=status.HTTP_400_BAD_REQUEST
             )
-            serializer = self.get_serializer(schedules, many=True)
-            return Response(serializer.data)
+
+        return self._current_lessons_response('for_classroom', params[0])
+
+
+def _generate_timetable_job(job):
+    """Тело фоновой задачи генерации расписания"""
+    on_date = date.fromisoformat(job.params['date']) if job.params.get('date') else None
+    result = generate_timetable(on_date, seed=job.params.get('seed', 0))
+
+    saved = not result['unplaced'] or job.params.get('allow_partial')
+    if saved:
+        save_timetable(result['lessons'])
+
+    job.result = {
+        'saved': bool(saved),
+        'lessons_count': len(result['lessons']),
+        'unplaced': result['unplaced'],
+        'attempts': result['attempts'],
+        'seconds': result['seconds'],
+    }
+
+
+REPORT_TYPES = ('class_performance', 'gender_statistics', 'classroom_statistics')
+REPORT_TYPE_ERROR = f"Неверный тип отчета. Доступные: {', '.join(REPORT_TYPES)}"
+CLASS_ID_ERROR = "class_id должен быть числом, списком чисел через запятую или 'all'"
+
+
+def _param_values(query_params, name):
+    # name=1 - одно значение; name=1,2 или name=1&name=2 - несколько
+    return [
+        value.strip()
+        for param in query_params.getlist(name)
+        for value in param.split(',')
+        if value.strip()
+    ]
+
+
+def _class_id_values(query_params):
+    # class_id=all - все классы
+    return _param_values(query_params, 'class_id')
+
+
+def _parse_class_ids(raw_ids):
+    """id классов отчета; None - все классы. ValueError, если id не число"""
+    if 'all' in raw_ids:
+        return None
+    return [int(value) for value in raw_ids]
 
 
-class ReportView(generics.GenericAPIView):
+class ReportView(ResponseCacheMixin, generics.GenericAPIView):
     """Генерация отчетов"""
     permission_classes = [IsAuthenticated, IsDeputyDirector]
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES + [PDFRenderer]
+    metrics_label_param = 'type'
+    metrics_label_choices = REPORT_TYPES
+
+    def get_cache_endpoint(self, request):
+        return f"ReportView.{request.query_params.get('type')}"
+
+    def get_cache_tags(self, request):
+        """Версии данных отчета: отчет по классу зависит только от сводки и учеников этого класса"""
+        report_type = request.query_params.get('type')
+        if report_type == 'gender_statistics':
+            models = (SchoolClass, Student)
+        elif report_type == 'classroom_statistics':
+            models = (Classroom,)
+        elif report_type == 'class_performance':
+            models = (SchoolClass, Teacher, Subject)
+            raw_ids = self._class_id_values()
+            if raw_ids and all(value.isdigit() for value in raw_ids):
+                return [versions.label_for(model) for model in models] + [
+                    versions.class_label(model, school_class_id)
+                    for model in (GradeSummary, Student)
+                    for school_class_id in ['*', *sorted(set(raw_ids))]
+                ]
+            models += (GradeSummary, Student)
+        else:
+            return None
+        return [versions.label_for(model) for model in models]
+
+    def _class_id_values(self):
+        return _class_id_values(self.request.query_params)
 
     def get(self, request, *args, **kwargs):
         report_type = request.query_params.get('type')
@@ -182,175 +641,356 @@ class ReportView(generics.GenericAPIView):
             return self.generate_classroom_statistics()
         else:
             return Response(
-                {"error": "Неверный тип отчета. Доступные: class_performance, gender_statistics, classroom_statistics"},
+                {"error": REPORT_TYPE_ERROR},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
     def generate_class_performance_report(self, class_id):
-        """Отчет об успеваемости заданного класса"""
+        """Отчет об успеваемости заданного класса, нескольких классов или всех классов"""
         if not class_id:
             return Response(
                 {"error": "Необходимо указать class_id"},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+        raw_ids = self._class_id_values()
+        single = len(raw_ids) == 1 and raw_ids[0] != 'all'
+
         try:
-            school_class = SchoolClass.objects.get(id=class_id)
-            students = Student.objects.filter(school_class=school_class)
+            class_ids = _parse_class_ids(raw_ids)
+        except ValueError:
+            return Response(
+                {"error": CLASS_ID_ERROR},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-            # Получаем классного руководителя
-            class_teacher = Teacher.objects.filter(school_class=school_class).first()
+        reports = build_class_performance_reports(class_ids)
 
-            # Получаем все предметы, которые есть у учеников класса
-            subjects = Subject.objects.filter(
-                grades__student__in=students
-            ).distinct()
+        if class_ids is not None and any(pk not in reports for pk in class_ids):
+            return Response(
+                {"error": "Класс не найден"},
+                status=status.HTTP_404_NOT_FOUND
+            )
 
-            subjects_data = {}
-            class_total_sum = 0
-            class_total_count = 0
+        if not single:
+            return Response(list(reports.values()))
 
-            for subject in subjects:
-                grades = Grade.objects.filter(
-                    student__in=students,
-                    subject=subject
-                )
+        report_data = reports[class_ids[0]]
 
-                if grades.exists():
-                    avg_grade = grades.aggregate(avg=Avg('grade'))['avg']
-                    grades_count = grades.count()
+        # Формат ответа (JSON или PDF)
+        format_type = self.request.query_params.get('format', 'json')
 
-                    subjects_data[subject.subject_name] = {
-                        'average_grade': round(avg_grade, 2),
-                        'grades_count': grades_count
-                    }
+        if format_type == 'pdf':
+            return self.generate_pdf_report(report_data)
+        else:
+            return Response(report_data)
 
-                    class_total_sum += avg_grade * grades_count
-                    class_total_count += grades_count
+    def generate_gender_statistics(self):
+        """Сколько мальчиков и девочек в каждом классе?"""
+        return Response(build_gender_statistics())
 
-            class_average = round(class_total_sum / class_total_count, 2) if class_total_count > 0 else 0
+    def generate_classroom_statistics(self):
+        """Сколько кабинетов в школе для базовых и профильных дисциплин?"""
+        return Response(build_classroom_statistics())
 
-            report_data = {
-                'class_name': school_class.class_name,
-                'class_teacher': f"{class_teacher.last_name} {class_teacher.first_name}" if class_teacher else "Не назначен",
-                'total_students': students.count(),
-                'subjects_data': subjects_data,
-                'class_average': class_average
-            }
+    def generate_pdf_report(self, report_data):
+        """Генерация PDF отчета (готовый файл с теми же данными берется с диска)"""
+        path = get_or_render_pdf(report_data)
+        return FileResponse(
+            open(path, 'rb'),
+            as_attachment=True,
+            filename=f"class_report_{report_data['class_name']}.pdf",
+            content_type='application/pdf'
+        )
+
+
+class GradeAnalyticsView(ResponseCacheMixin, generics.GenericAPIView):
+    """Аналитика оценок: распределение, медиана, перцентили, отклонение и динамика по четвертям.
+
+    Параметры: class_id и subject_id (число или список через запятую, по умолчанию - все),
+    group_by - группы через запятую из classes, subjects, teachers (по умолчанию все).
+    """
+    permission_classes = [IsAuthenticated, IsDeputyDirector]
+    cache_models = (Grade, Student, SchoolClass, Subject, Teacher, TeachingPeriod)
 
-            # Формат ответа (JSON или PDF)
-            format_type = self.request.query_params.get('format', 'json')
+    def get_cache_endpoint(self, request):
+        return 'GradeAnalyticsView'
 
-            if format_type == 'pdf':
-                return self.generate_pdf_report(report_data)
-            else:
-                return Response(report_data)
+    def get(self, request, *args, **kwargs):
+        if not analytics.is_available():
+            return Response(
+                {"error": "Аналитика недоступна: не установлен numpy"},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
 
-        except SchoolClass.DoesNotExist:
+        try:
+            class_ids = self._parse_ids('class_id')
+            subject_ids = self._parse_ids('subject_id')
+        except ValueError:
+            return Response(
+                {"error": "class_id и subject_id должны быть числами или списками чисел через запятую"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        groups = _param_values(request.query_params, 'group_by') or analytics.GROUPS
+        unknown = [group for group in groups if group not in analytics.GROUPS]
+        if unknown:
+            return Response(
+                {"error": f"Неверная группировка: {', '.join(unknown)}. Доступные: {', '.join(analytics.GROUPS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response(analytics.build_grade_analytics(class_ids, subject_ids, groups))
+
+    def _parse_ids(self, name):
+        """id из параметра; None - параметр не задан или равен all"""
+        raw_ids = _param_values(self.request.query_params, name)
+        if not raw_ids:
+            return None
+        return _parse_class_ids(raw_ids)
+
+
+def _in_thread(func):
+    """Синхронная функция в отдельном потоке (thread_sensitive=False).
+
+    У каждого потока свое соединение с БД, поэтому независимые запросы выполняются
+    одновременно; асинхронные методы ORM (aget, acount...) идут через один общий поток.
+    """
+    def run(*args):
+        try:
+            with instrumentation.track_queries():
+                return func(*args)
+        finally:
+            close_old_connections()
+    return sync_to_async(run, thread_sensitive=False)
+
+
+async def _gather(loaders, *args):
+    return await asyncio.gather(*(_in_thread(loader)(*args) for loader in loaders))
+
+
+class AsyncReportView(View):
+    """Те же отчеты, что и ReportView, для ASGI-сервера.
+
+    Независимые части отчета загружаются одновременно, PDF генерируется в потоке,
+    поэтому медленные отчеты не занимают поток сервера и не задерживают остальные запросы.
+    """
+    authentication_classes = api_settings.DEFAULT_AUTHENTICATION_CLASSES
+    permission_classes = [IsAuthenticated, IsDeputyDirector]
+    metrics_label_param = 'type'
+    metrics_label_choices = REPORT_TYPES
+
+    def check_access(self, request):
+        """Аутентификация и права как в DRF; ответ с ошибкой или None"""
+        drf_request = Request(request, authenticators=[auth() for auth in self.authentication_classes])
+        try:
+            for permission in self.permission_classes:
+                if not permission().has_permission(drf_request, self):
+                    if drf_request.authenticators and not drf_request.successful_authenticator:
+                        raise exceptions.NotAuthenticated()
+                    raise exceptions.PermissionDenied()
+        except exceptions.APIException as exc:
+            response = self.json_response({'detail': exc.detail}, exc.status_code)
+            if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+                response['WWW-Authenticate'] = drf_request.authenticators[0].authenticate_header(drf_request)
+            return response
+        return None
+
+    def json_response(self, data, status_code=status.HTTP_200_OK):
+        return HttpResponse(FastJSONRenderer().render(data), status=status_code, content_type='application/json')
+
+    async def get(self, request, *args, **kwargs):
+        error = await sync_to_async(self.check_access)(request)
+        if error is not None:
+            return error
+
+        report_type = request.GET.get('type')
+        if report_type == 'class_performance':
+            return await self.class_performance_report(request)
+        elif report_type == 'gender_statistics':
+            return self.json_response(assemble_gender_statistics(*await _gather(GENDER_STATISTICS_LOADERS)))
+        elif report_type == 'classroom_statistics':
+            return self.json_response(await _in_thread(build_classroom_statistics)())
+        else:
+            return self.json_response({"error": REPORT_TYPE_ERROR}, status.HTTP_400_BAD_REQUEST)
+
+    async def class_performance_report(self, request):
+        """Отчет об успеваемости: классы, классные руководители и сводка оценок - одновременно"""
+        if not request.GET.get('class_id'):
+            return self.json_response({"error": "Необходимо указать class_id"}, status.HTTP_400_BAD_REQUEST)
+
+        raw_ids = _class_id_values(request.GET)
+        single = len(raw_ids) == 1 and raw_ids[0] != 'all'
+
+        try:
+            class_ids = _parse_class_ids(raw_ids)
+        except ValueError:
+            return self.json_response({"error": CLASS_ID_ERROR}, status.HTTP_400_BAD_REQUEST)
+
+        reports = assemble_class_performance_reports(*await _gather(CLASS_PERFORMANCE_LOADERS, class_ids))
+
+        if class_ids is not None and any(pk not in reports for pk in class_ids):
+            return self.json_response({"error": "Класс не найден"}, status.HTTP_404_NOT_FOUND)
+
+        if not single:
+            return self.json_response(list(reports.values()))
+
+        report_data = reports[class_ids[0]]
+        if request.GET.get('format', 'json') == 'pdf':
+            path = await _in_thread(get_or_render_pdf)(report_data)
+            return FileResponse(
+                open(path, 'rb'),
+                as_attachment=True,
+                filename=f"class_report_{report_data['class_name']}.pdf",
+                content_type='application/pdf'
+            )
+        return self.json_response(report_data)
+
+
+class SearchView(APIView):
+    """Подсказки для строки поиска: ученики и учителя по началу фамилии и имени (?q=, ?limit=)"""
+    permission_classes = [IsAuthenticated, IsDeputyDirector]
+
+    def get(self, request, *args, **kwargs):
+        query = request.query_params.get('q', '')
+        try:
+            limit = int(request.query_params.get('limit', search.DEFAULT_LIMIT))
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= search.MAX_LIMIT:
+            return Response(
+                {"error": f"limit должен быть числом от 1 до {search.MAX_LIMIT}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(search.typeahead(query, limit))
+
+
+class CacheStatsView(APIView):
+    """Статистика кэша ответов текущего процесса (DELETE - сбросить счетчики)"""
+    permission_classes = [IsAuthenticated, IsDeputyDirector]
+
+    def get(self, request, *args, **kwargs):
+        return Response(response_cache.get_stats())
+
+    def delete(self, request, *args, **kwargs):
+        response_cache.reset_stats()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+def _metrics_access_allowed(request):
+    """Токен METRICS_TOKEN в заголовке Authorization или адрес из METRICS_ALLOWED_IPS"""
+    token = settings.METRICS_TOKEN
+    if token:
+        scheme, _, value = request.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() == 'bearer' and hmac.compare_digest(value.strip().encode(), token.encode()):
+            return True
+    allowed = settings.METRICS_ALLOWED_IPS
+    return '*' in allowed or request.META.get('REMOTE_ADDR') in allowed
+
+
+def metrics_view(request):
+    """Метрики всех процессов сервера в текстовом формате Prometheus"""
+    if not settings.METRICS_ENABLED:
+        return HttpResponse(status=status.HTTP_404_NOT_FOUND)
+    if not _metrics_access_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def _render_class_report_job(job):
+    """Тело фоновой задачи: генерирует PDF, если его еще нет на диске"""
+    report_data = build_class_performance_reports([job.params['class_id']])[job.params['class_id']]
+    job.data_hash = report_data_hash(report_data)
+    get_or_render_pdf(report_data, job.data_hash)
+    job.file_name = f"class_report_{report_data['class_name']}.pdf"
+    BackgroundJob.objects.filter(pk=job.pk).update(data_hash=job.data_hash)
+
+
+class ReportJobListView(generics.GenericAPIView):
+    """Постановка PDF отчета об успеваемости класса в очередь"""
+    permission_classes = [IsAuthenticated, IsDeputyDirector]
+    serializer_class = BackgroundJobSerializer
+
+    def post(self, request, *args, **kwargs):
+        class_id = request.data.get('class_id')
+        try:
+            class_id = int(class_id)
+        except (TypeError, ValueError):
+            return Response(
+                {"error": "Необходимо указать числовой class_id"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        reports = build_class_performance_reports([class_id])
+        if class_id not in reports:
             return Response(
                 {"error": "Класс не найден"},
                 status=status.HTTP_404_NOT_FOUND
             )
 
-    def generate_gender_statistics(self):
-        """Сколько мальчиков и девочек в каждом классе?"""
-        classes = SchoolClass.objects.all()
-        statistics = []
-
-        for school_class in classes:
-            boys_count = Student.objects.filter(
-                school_class=school_class,
-                gender='M'
-            ).count()
-
-            girls_count = Student.objects.filter(
-                school_class=school_class,
-                gender='F'
-            ).count()
-
-            statistics.append({
-                'class_name': school_class.class_name,
-                'boys_count': boys_count,
-                'girls_count': girls_count,
-                'total_students': boys_count + girls_count
-            })
+        report_data = reports[class_id]
+        data_hash = report_data_hash(report_data)
+        file_name = f"class_report_{report_data['class_name']}.pdf"
+
+        # Такой же отчет уже генерируется - возвращаем существующую задачу (кроме зависших)
+        jobs.expire_stale_jobs()
+        job = BackgroundJob.objects.filter(
+            kind='class_performance_pdf',
+            data_hash=data_hash,
+            status__in=['pending', 'running']
+        ).first()
+
+        if job is None:
+            job = BackgroundJob(
+                kind='class_performance_pdf',
+                params={'class_id': class_id},
+                data_hash=data_hash,
+                file_name=file_name,
+                created_by=request.user
+            )
+            if pdf_artifact_path(data_hash).exists():
+                # Данные не менялись - PDF уже на диске
+                job.status = 'done'
+                job.finished_at = timezone.now()
+                job.save()
+                return Response(self.get_serializer(job).data, status=status.HTTP_201_CREATED)
 
-        return Response(statistics)
+            job.save()
+            jobs.submit(job, _render_class_report_job)
 
-    def generate_classroom_statistics(self):
-        """Сколько кабинетов в школе для базовых и профильных дисциплин?"""
-        basic_count = Classroom.objects.filter(subject_type='basic').count()
-        profile_count = Classroom.objects.filter(subject_type='profile').count()
-
-        statistics = [
-            {
-                'subject_type': 'basic',
-                'subject_type_display': 'Базовая дисциплина',
-                'classroom_count': basic_count
-            },
-            {
-                'subject_type': 'profile',
-                'subject_type_display': 'Профильная дисциплина',
-                'classroom_count': profile_count
-            }
-        ]
+        return Response(self.get_serializer(job).data, status=status.HTTP_202_ACCEPTED)
 
-        return Response(statistics)
 
-    def generate_pdf_report(self, report_data):
-        """Генерация PDF отчета"""
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4)
-        elements = []
-
-        styles = getSampleStyleSheet()
-
-        # Заголовок
-        title = Paragraph(f"Отчет об успеваемости класса {report_data['class_name']}", styles['Title'])
-        elements.append(title)
-        elements.append(Spacer(1, 12))
-
-        # Информация о классе
-        class_info = [
-            f"Классный руководитель: {report_data['class_teacher']}",
-            f"Количество учеников: {report_data['total_students']}",
-            f"Средний балл по классу: {report_data['class_average']}"
-        ]
-
-        for info in class_info:
-            elements.append(Paragraph(info, styles['Normal']))
-
-        elements.append(Spacer(1, 24))
-
-        # Таблица с предметами
-        if report_data['subjects_data']:
-            table_data = [['Предмет', 'Средний балл', 'Количество оценок']]
-
-            for subject, data in report_data['subjects_data'].items():
-                table_data.append([
-                    subject,
-                    str(data['average_grade']),
-                    str(data['grades_count'])
-                ])
-
-            table = Table(table_data)
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 14),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black)
-            ]))
-
-            elements.append(table)
-
-        doc.build(elements)
-
-        buffer.seek(0)
-        response = HttpResponse(buffer, content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="class_report_{report_data["class_name"]}.pdf"'
-
-        return response
\ No newline at end of file
+class ReportJobDetailView(generics.RetrieveAPIView):
+    """Статус фоновой задачи"""
+    queryset = BackgroundJob.objects.all()
+    serializer_class = BackgroundJobSerializer
+    permission_classes = [IsAuthenticated, IsDeputyDirector]
+
+    def get_object(self):
+        # Зависшая задача отдается со статусом failed, а не опрашивается бесконечно
+        jobs.expire_stale_jobs()
+        return super().get_object()
+
+
+class ReportJobDownloadView(generics.GenericAPIView):
+    """Скачивание готового PDF отчета"""
+    queryset = BackgroundJob.objects.filter(kind='class_performance_pdf')
+    permission_classes = [IsAuthenticated, IsDeputyDirector]
+
+    def get(self, request, *args, **kwargs):
+        job = self.get_object()
+        path = pdf_artifact_path(job.data_hash)
+
+        if job.status != 'done' or not path.exists():
+            return Response(
+                {"error": "Отчет еще не готов", "status": job.status},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        return FileResponse(
+            open(path, 'rb'),
+            as_attachment=True,
+            filename=job.file_name,
+            content_type='application/pdf'
+        )
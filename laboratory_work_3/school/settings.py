@@ -33,6 +33,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api.middleware.RequestTimingMiddleware',
+    'api.middleware.MetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -63,12 +65,64 @@ TEMPLATES = [
 WSGI_APPLICATION = 'school.wsgi.application'
 
 # Database
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Профиль выбирается переменными окружения без изменения кода:
+# DATABASE_ENGINE=sqlite (по умолчанию) или postgresql
+DATABASE_ENGINE = os.environ.get('DATABASE_ENGINE', 'sqlite')
+# Время жизни постоянного соединения в секундах; 0 - новое соединение на каждый запрос
+DATABASE_CONN_MAX_AGE = int(os.environ.get('DATABASE_CONN_MAX_AGE', 600))
+
+# SQLite: WAL позволяет читать во время записи, synchronous=NORMAL в режиме WAL
+# не теряет данные при падении процесса, busy timeout ждет освобождения блокировки
+# вместо немедленной ошибки "database is locked"
+SQLITE_TUNING = os.environ.get('SQLITE_TUNING', '1') == '1'
+SQLITE_TIMEOUT = int(os.environ.get('SQLITE_TIMEOUT', 20))
+SQLITE_PRAGMAS = [
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    f"PRAGMA busy_timeout={SQLITE_TIMEOUT * 1000}",
+    f"PRAGMA mmap_size={int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))}",
+    f"PRAGMA cache_size=-{int(os.environ.get('SQLITE_CACHE_SIZE_KB', 64 * 1024))}",
+    'PRAGMA temp_store=MEMORY',
+]
+
+if DATABASE_ENGINE == 'postgresql':
+    # Пул соединений psycopg 3 (пакет psycopg[pool]) несовместим с CONN_MAX_AGE > 0
+    POSTGRES_POOL = os.environ.get('POSTGRES_POOL', '1') == '1'
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('POSTGRES_DB', 'school'),
+            'USER': os.environ.get('POSTGRES_USER', 'school'),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+            'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+            'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+            'CONN_MAX_AGE': 0 if POSTGRES_POOL else DATABASE_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'pool': {
+                    'min_size': int(os.environ.get('POSTGRES_POOL_MIN_SIZE', 2)),
+                    'max_size': int(os.environ.get('POSTGRES_POOL_MAX_SIZE', 10)),
+                    'timeout': int(os.environ.get('POSTGRES_POOL_TIMEOUT', 10)),
+                },
+            } if POSTGRES_POOL else {},
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': DATABASE_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'init_command': '; '.join(SQLITE_PRAGMAS),
+                'timeout': SQLITE_TIMEOUT,
+                # Блокировка записи берется в начале транзакции: повышение блокировки
+                # чтения до записи внутри транзакции падает сразу, без ожидания
+                'transaction_mode': 'IMMEDIATE',
+            } if SQLITE_TUNING else {},
+        }
     }
-}
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -96,6 +150,63 @@ USE_TZ = True
 # Static files (CSS, JavaScript, Images)
 STATIC_URL = '/static/'
 
+# Cache
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Версии таблиц должны быть общими для всех процессов сервера,
+    # поэтому по умолчанию хранятся в файловом кэше
+    'versions': {
+        'BACKEND': os.environ.get('VERSIONS_CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.environ.get('VERSIONS_CACHE_LOCATION', str(BASE_DIR / 'cache' / 'versions')),
+        'TIMEOUT': None,
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
+    },
+}
+TABLE_VERSIONS_CACHE = 'versions'
+
+# Кэш ответов API (включается RESPONSE_CACHE_ENABLED=1). Записи не удаляются при
+# изменении данных - в ключ входят версии таблиц, старые записи вытесняются
+# по TIMEOUT и MAX_ENTRIES
+RESPONSE_CACHE_ENABLED = os.environ.get('RESPONSE_CACHE_ENABLED', '0') == '1'
+RESPONSE_CACHE_ALIAS = 'responses'
+CACHES[RESPONSE_CACHE_ALIAS] = {
+    'BACKEND': os.environ.get('RESPONSE_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+    'LOCATION': os.environ.get('RESPONSE_CACHE_LOCATION', 'responses'),
+    'TIMEOUT': int(os.environ.get('RESPONSE_CACHE_TIMEOUT', 300)),
+    'OPTIONS': {
+        'MAX_ENTRIES': int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 1000)),
+    },
+}
+
+# Расписание звонков: (начало, конец) для уроков 1-8
+LESSON_BELLS = [
+    ('08:30', '09:15'),
+    ('09:25', '10:10'),
+    ('10:30', '11:15'),
+    ('11:35', '12:20'),
+    ('12:30', '13:15'),
+    ('13:25', '14:10'),
+    ('14:20', '15:05'),
+    ('15:15', '16:00'),
+]
+
+# Media files (готовые PDF отчеты)
+MEDIA_ROOT = BASE_DIR / 'media'
+
+# Фоновые задачи: готовые PDF хранятся на диске под хэшем данных отчета,
+# число одновременных генераций ограничено размером пула
+REPORT_ARTIFACTS_DIR = MEDIA_ROOT / 'reports'
+BACKGROUND_JOBS_MAX_WORKERS = int(os.environ.get('BACKGROUND_JOBS_MAX_WORKERS', 2))
+# Задачи хранятся только в пуле потоков процесса: после перезапуска сервера незавершенная
+# задача так и осталась бы "в очереди". Задача считается ошибкой, если выполняется дольше
+# BACKGROUND_JOBS_TIMEOUT или ждет в очереди дольше BACKGROUND_JOBS_QUEUE_TIMEOUT (секунд)
+BACKGROUND_JOBS_TIMEOUT = int(os.environ.get('BACKGROUND_JOBS_TIMEOUT', 1800))
+BACKGROUND_JOBS_QUEUE_TIMEOUT = int(os.environ.get('BACKGROUND_JOBS_QUEUE_TIMEOUT', 3600))
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -111,10 +222,39 @@ REST_FRAMEWORK = {
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.StandardPagination',
     'PAGE_SIZE': 10,
 }
 
+# Максимальный размер страницы для ?page_size= (постраничная и курсорная пагинация)
+API_MAX_PAGE_SIZE = int(os.environ.get('API_MAX_PAGE_SIZE', 1000))
+
+# Списки в JSON строятся из values() без сериализаторов (см. api/fastpath.py)
+FAST_LIST_ENABLED = os.environ.get('FAST_LIST_ENABLED', '1') == '1'
+
+# Замеры запросов (api/middleware.py): заголовок Server-Timing и журнал медленных запросов
+# с SLOW_REQUEST_TOP_SQL самыми долгими SQL
+REQUEST_TIMING_ENABLED = os.environ.get('REQUEST_TIMING_ENABLED', '1') == '1'
+SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', 500))
+SLOW_REQUEST_QUERIES = int(os.environ.get('SLOW_REQUEST_QUERIES', 50))
+SLOW_REQUEST_TOP_SQL = int(os.environ.get('SLOW_REQUEST_TOP_SQL', 5))
+
+# Метрики Prometheus (/metrics): процессы сервера сохраняют свои счетчики в METRICS_DIR,
+# /metrics их суммирует. Каталог общий для всех процессов; очищается при развертывании.
+# Доступ - по токену METRICS_TOKEN (заголовок Authorization: Bearer <токен>, как
+# bearer_token в Prometheus) или с адресов METRICS_ALLOWED_IPS ('*' - с любых). По умолчанию
+# не задано ни то, ни другое - /metrics закрыт. Список адресов проверяет REMOTE_ADDR: за
+# обратным прокси (nginx) это адрес прокси, поэтому там нужен токен или ограничение на прокси
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+METRICS_DIR = os.environ.get('METRICS_DIR', str(BASE_DIR / 'cache' / 'metrics'))
+METRICS_FLUSH_SECONDS = float(os.environ.get('METRICS_FLUSH_SECONDS', 1))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+METRICS_ALLOWED_IPS = [ip.strip() for ip in os.environ.get('METRICS_ALLOWED_IPS', '').split(',') if ip.strip()]
+
 # Djoser settings
 DJOSER = {
     'PASSWORD_RESET_CONFIRM_URL': '#/password/reset/confirm/{uid}/{token}',